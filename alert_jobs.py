@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Emergency Contact Application - Background Alert Jobs
+=====================================================
+Lets a web request start an alert without waiting for it to finish.
+
+submit() hands the alert to an AlertEngine running on a background
+event loop and returns an AlertJob straight away. The web page answers
+"202 Accepted" with the job id, and the job's progress (sent, failed,
+still pending, per contact) can be read at any time with status().
+
+subscribe(callback) calls callback('progress', job) after every
+delivery and once more when the job finishes.
+"""
+
+import asyncio
+import collections
+import threading
+import time
+import uuid
+
+from alerts import DEFAULT_MESSAGE
+from contact_store import StoreEvents
+
+# How many finished jobs to remember for status lookups
+MAX_JOBS = 200
+
+
+class AlertJob:
+    """One alert being delivered in the background"""
+
+    def __init__(self, total, message):
+        self.id = uuid.uuid4().hex
+        self.total = total
+        self.message = message
+        self.state = 'queued'      # 'queued', 'running', 'done' or 'error'
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.report = None
+        self.idempotency_key = None
+        self.results = []
+        self.sent = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def _record(self, result):
+        with self._lock:
+            self.state = 'running'
+            self.results.append(result)
+            if result.ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+
+    def _finish(self, report=None, error=None):
+        with self._lock:
+            self.report = report
+            self.error = error
+            self.state = 'error' if error else 'done'
+            self.finished_at = time.time()
+
+    @property
+    def done(self):
+        return self.state in ('done', 'error')
+
+    @property
+    def pending(self):
+        return max(self.total - self.sent - self.failed, 0)
+
+    @property
+    def time_to_first(self):
+        return self.report.time_to_first if self.report else None
+
+    @property
+    def time_to_last(self):
+        return self.report.time_to_last if self.report else None
+
+    def deliveries(self, offset=0, limit=500):
+        """Finished deliveries, in the order they completed"""
+        with self._lock:
+            return self.results[offset:offset + limit]
+
+    def status(self, offset=0, limit=500):
+        """JSON-friendly progress, with per-contact results[offset:offset + limit]"""
+        deliveries = self.deliveries(offset, limit)
+        with self._lock:
+            status = {
+                'job_id': self.id,
+                'state': self.state,
+                'total': self.total,
+                'sent': self.sent,
+                'failed': self.failed,
+                'pending': self.pending,
+                'created_at': self.created_at,
+                'finished_at': self.finished_at,
+                'error': self.error,
+                'deliveries': [
+                    {
+                        'name': result.contact['name'],
+                        'phone': result.contact['phone'],
+                        'status': result.status,
+                        'error': result.error,
+                        'seconds': round(result.seconds, 6),
+                    }
+                    for result in deliveries
+                ],
+                'offset': offset,
+                'time_to_first': self.time_to_first,
+                'time_to_last': self.time_to_last,
+            }
+        return status
+
+
+class AlertJobManager(StoreEvents):
+    """Runs alert jobs on a background asyncio loop"""
+
+    def __init__(self, engine, max_jobs=MAX_JOBS):
+        self.engine = engine
+        self.max_jobs = max_jobs
+        self._jobs = collections.OrderedDict()
+        self._keys = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever,
+                                                name='alert-jobs', daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def submit(self, contacts, total, message=DEFAULT_MESSAGE, idempotency_key=None):
+        """
+        Start sending `message` to `contacts` (about `total` of them), return the AlertJob.
+
+        A repeated idempotency key returns the earlier job instead.
+        """
+        job = AlertJob(total, message)
+        with self._lock:
+            if idempotency_key:
+                earlier = self._jobs.get(self._keys.get(idempotency_key))
+                if earlier is not None:
+                    return earlier
+                job.idempotency_key = idempotency_key
+                self._keys[idempotency_key] = job.id
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_jobs:
+                _, dropped = self._jobs.popitem(last=False)
+                self._keys.pop(dropped.idempotency_key, None)
+        asyncio.run_coroutine_threadsafe(self._run(job, contacts), self._ensure_loop())
+        return job
+
+    async def _run(self, job, contacts):
+        def on_result(result):
+            job._record(result)
+            self._notify('progress', job)
+
+        try:
+            report = await self.engine.dispatch(contacts, job.message, on_result=on_result)
+        except Exception as exc:
+            job._finish(error=str(exc))
+        else:
+            job._finish(report=report)
+        self._notify('progress', job)
+
+    def get(self, job_id):
+        """Return the AlertJob with this id, or None"""
+        with self._lock:
+            return self._jobs.get(job_id)
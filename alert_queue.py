@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+Emergency Contact Application - Persistent Alert Queue
+======================================================
+A durable queue of alert deliveries kept in SQLite, so no message is
+forgotten when a delivery fails or the server crashes.
+
+- submit() stores one row per entry. A number listed twice is messaged
+  once, under the first name: the later rows wait in state 'shared'
+  and take the first row's outcome when it is sent or dead-lettered,
+  so every entry still gets a result. An idempotency key makes a
+  repeated request (a double-clicked "Send" button) return the first
+  job instead of paging everybody twice.
+- A pool of worker threads claims due rows in batches, sends them
+  through the AlertEngine and records the outcome. Each row keeps the
+  contact's priority tier (see alert_scheduler.py) and claims take the
+  highest tier first, so 112 is not stuck behind the earlier rows of a
+  long list, or of another alert.
+- A failed send is retried with exponential backoff plus random jitter;
+  after MAX_ATTEMPTS it moves to the dead-letter list (state 'dead').
+- Claimed rows carry a lease. If a worker dies mid-send, the lease runs
+  out and another worker picks the row up again.
+- A worker that hits an error (for example "database is locked" while
+  several processes write) logs it, hands its claimed rows back and
+  carries on, so the queue never stops with alerts still waiting.
+
+Jobs returned by get() look like the in-memory ones in alert_jobs.py,
+so the web pages work with either. subscribe(callback) calls
+callback('progress', job) after each batch a worker finishes.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+import uuid
+
+from alert_scheduler import NORMAL, tier_of
+from alerts import DEFAULT_MESSAGE, DeliveryResult
+from phone_numbers import normalize_phone
+from contact_store import StoreEvents
+from sqlite_store import ConnectionPool
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS alert_jobs (
+    id              TEXT PRIMARY KEY,
+    idempotency_key TEXT UNIQUE,
+    message         TEXT NOT NULL,
+    total           INTEGER NOT NULL,
+    created_at      REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS alert_deliveries (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id          TEXT NOT NULL,
+    name            TEXT NOT NULL,
+    phone           TEXT NOT NULL,
+    tier            INTEGER NOT NULL DEFAULT 2,
+    state           TEXT NOT NULL DEFAULT 'pending',
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    lease_until     REAL,
+    last_error      TEXT,
+    seconds         REAL,
+    shared_with     INTEGER
+);
+CREATE INDEX IF NOT EXISTS alert_deliveries_due ON alert_deliveries (state, next_attempt_at);
+CREATE INDEX IF NOT EXISTS alert_deliveries_job ON alert_deliveries (job_id, id);
+CREATE INDEX IF NOT EXISTS alert_deliveries_tier ON alert_deliveries (state, tier, next_attempt_at);
+CREATE INDEX IF NOT EXISTS alert_deliveries_shared ON alert_deliveries (shared_with) WHERE shared_with IS NOT NULL;
+'''
+
+INSERT_JOB_SQL = 'INSERT INTO alert_jobs (id, idempotency_key, message, total, created_at) VALUES (?, ?, ?, ?, ?)'
+SELECT_JOB_SQL = 'SELECT id, message, total, created_at FROM alert_jobs WHERE id = ?'
+SELECT_JOB_BY_KEY_SQL = 'SELECT id FROM alert_jobs WHERE idempotency_key = ?'
+UPDATE_JOB_TOTAL_SQL = 'UPDATE alert_jobs SET total = ? WHERE id = ?'
+INSERT_DELIVERY_SQL = 'INSERT INTO alert_deliveries (job_id, name, phone, tier, next_attempt_at) VALUES (?, ?, ?, ?, ?)'
+INSERT_SHARED_SQL = '''
+INSERT INTO alert_deliveries (job_id, name, phone, tier, next_attempt_at, state, shared_with)
+VALUES (?, ?, ?, ?, ?, 'shared', ?)
+'''
+# Leases that ran out first (they have waited longest), then due rows by tier
+SELECT_EXPIRED_SQL = '''
+SELECT d.id, d.state, d.name, d.phone, d.attempts, j.message, j.created_at, d.job_id, d.tier
+FROM alert_deliveries d JOIN alert_jobs j ON j.id = d.job_id
+WHERE d.state = 'inflight' AND d.lease_until < ?
+LIMIT ?
+'''
+SELECT_DUE_SQL = '''
+SELECT d.id, d.state, d.name, d.phone, d.attempts, j.message, j.created_at, d.job_id, d.tier
+FROM alert_deliveries d JOIN alert_jobs j ON j.id = d.job_id
+WHERE d.state = 'pending' AND d.next_attempt_at <= ?
+ORDER BY d.tier, d.next_attempt_at
+LIMIT ?
+'''
+RELEASE_SQL = '''
+UPDATE alert_deliveries
+SET state = CASE WHEN attempts >= ? THEN 'dead' ELSE 'pending' END,
+    next_attempt_at = ?, last_error = ?, lease_until = NULL
+WHERE id = ? AND state = 'inflight'
+'''
+CLAIM_SQL = "UPDATE alert_deliveries SET state = 'inflight', attempts = attempts + 1, lease_until = ? WHERE id = ?"
+MARK_SENT_SQL = "UPDATE alert_deliveries SET state = 'sent', seconds = ?, last_error = NULL WHERE id = ?"
+MARK_RETRY_SQL = "UPDATE alert_deliveries SET state = 'pending', next_attempt_at = ?, last_error = ? WHERE id = ?"
+MARK_DEAD_SQL = "UPDATE alert_deliveries SET state = 'dead', last_error = ? WHERE id = ?"
+# Rows sharing a number take the outcome of the row that was sent, once it is final
+SHARE_OUTCOME_SQL = '''
+UPDATE alert_deliveries
+SET (state, last_error, seconds) = (
+    SELECT first.state, first.last_error, first.seconds FROM alert_deliveries AS first
+    WHERE first.id = alert_deliveries.shared_with)
+WHERE shared_with = ? AND state = 'shared'
+  AND (SELECT first.state FROM alert_deliveries AS first
+       WHERE first.id = alert_deliveries.shared_with) IN ('sent', 'dead')
+'''
+COUNT_BY_STATE_SQL = 'SELECT state, COUNT(*) FROM alert_deliveries WHERE job_id = ? GROUP BY state'
+TIMES_SQL = "SELECT MIN(seconds), MAX(seconds) FROM alert_deliveries WHERE job_id = ? AND state = 'sent'"
+SELECT_DELIVERIES_SQL = '''
+SELECT name, phone, state, last_error, seconds, shared_with FROM alert_deliveries
+WHERE job_id = ? AND state IN ('sent', 'dead') ORDER BY id LIMIT ? OFFSET ?
+'''
+SELECT_DEAD_SQL = '''
+SELECT job_id, name, phone, attempts, last_error FROM alert_deliveries
+WHERE state = 'dead' ORDER BY id DESC LIMIT ?
+'''
+STATS_SQL = 'SELECT state, COUNT(*) FROM alert_deliveries GROUP BY state'
+
+# Retry policy
+MAX_ATTEMPTS = 5
+BASE_DELAY = 0.5     # seconds before the first retry (before jitter)
+MAX_DELAY = 60.0     # longest wait between two attempts
+
+# A worker must finish a claimed batch within this many seconds,
+# otherwise the rows are handed to another worker
+LEASE_SECONDS = 30.0
+
+# Worker pool
+WORKERS = 4
+BATCH_SIZE = 200
+IDLE_POLL = 0.05     # seconds an idle worker sleeps before looking again
+ERROR_PAUSE = 1.0    # seconds a worker waits after an error before going on
+
+log = logging.getLogger(__name__)
+
+
+def backoff_delay(attempts, base=BASE_DELAY, cap=MAX_DELAY, rng=random):
+    """Exponential backoff with full jitter for the retry after `attempts` tries"""
+    return rng.uniform(0, min(cap, base * 2 ** (attempts - 1)))
+
+
+class QueuedAlertJob:
+    """Progress of one queued alert, read from the database"""
+
+    def __init__(self, queue, job_id, message, total, created_at, counts, times):
+        self._queue = queue
+        self.id = job_id
+        self.message = message
+        self.total = total
+        self.created_at = created_at
+        self.sent = counts.get('sent', 0)
+        self.failed = counts.get('dead', 0)
+        self.pending = counts.get('pending', 0) + counts.get('inflight', 0) + counts.get('shared', 0)
+        self.time_to_first, self.time_to_last = times
+        self.error = None
+        if not self.pending:
+            self.state = 'done'
+        elif self.sent or self.failed or counts.get('inflight'):
+            self.state = 'running'
+        else:
+            self.state = 'queued'
+
+    @property
+    def done(self):
+        return self.state == 'done'
+
+    def deliveries(self, offset=0, limit=500):
+        """Finished deliveries (sent or dead-lettered) as DeliveryResults"""
+        return self._queue._deliveries(self.id, offset, limit)
+
+    def status(self, offset=0, limit=500):
+        """JSON-friendly progress, with per-contact results"""
+        return {
+            'job_id': self.id,
+            'state': self.state,
+            'total': self.total,
+            'sent': self.sent,
+            'failed': self.failed,
+            'pending': self.pending,
+            'created_at': self.created_at,
+            'error': self.error,
+            'time_to_first': self.time_to_first,
+            'time_to_last': self.time_to_last,
+            'deliveries': [
+                {
+                    'name': result.contact['name'],
+                    'phone': result.contact['phone'],
+                    'status': result.status,
+                    'error': result.error,
+                    'seconds': result.seconds,
+                }
+                for result in self.deliveries(offset, limit)
+            ],
+            'offset': offset,
+        }
+
+
+class AlertQueue(StoreEvents):
+    """SQLite-backed alert delivery queue served by a pool of worker threads"""
+
+    def __init__(self, path, engine, workers=WORKERS, batch_size=BATCH_SIZE,
+                 max_attempts=MAX_ATTEMPTS, lease_seconds=LEASE_SECONDS):
+        self.engine = engine
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.pool = ConnectionPool(path)
+        conn = self.pool.connect()
+        # Queues made before priority tiers and shared rows get the columns
+        # first, since CREATE TABLE IF NOT EXISTS leaves an existing table as it is
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'alert_deliveries'").fetchone():
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(alert_deliveries)')]
+            if 'tier' not in columns:
+                conn.execute(f'ALTER TABLE alert_deliveries ADD COLUMN tier INTEGER NOT NULL DEFAULT {NORMAL}')
+            if 'shared_with' not in columns:
+                conn.execute('ALTER TABLE alert_deliveries ADD COLUMN shared_with INTEGER')
+        conn.executescript(SCHEMA)
+
+        self._threads = []
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._start_lock = threading.Lock()
+        self.started_at = None
+        self.recovered = 0   # rows taken over from an expired lease
+        self._recovered_lock = threading.Lock()
+
+    def submit(self, contacts, total=None, message=DEFAULT_MESSAGE, idempotency_key=None):
+        """
+        Queue `message` for every contact and return the job.
+
+        Rows are claimed in batches, so the engine alone would not notice
+        a number repeated far apart in a long list; it is merged here,
+        with a 'shared' row for every later entry of the number.
+
+        If a job with the same idempotency key exists, that job is
+        returned and nothing new is queued.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self.pool.write() as conn:
+            # The write lock is held from here on, so two requests with
+            # the same key cannot both get past this check
+            existing = None
+            if idempotency_key:
+                existing = conn.execute(SELECT_JOB_BY_KEY_SQL, (idempotency_key,)).fetchone()
+            if existing is not None:
+                job_id = existing[0]
+            else:
+                conn.execute(INSERT_JOB_SQL, (job_id, idempotency_key or None, message, total or 0, now))
+                before = conn.total_changes
+                first_rows = {}   # canonical number -> id of the row that is sent
+                for contact in contacts:
+                    key = normalize_phone(contact['phone'])
+                    row = (job_id, contact['name'], contact['phone'], tier_of(contact), now)
+                    if key in first_rows:
+                        conn.execute(INSERT_SHARED_SQL, row + (first_rows[key],))
+                    else:
+                        delivery_id = conn.execute(INSERT_DELIVERY_SQL, row).lastrowid
+                        # Entries without a usable number are never merged
+                        if key:
+                            first_rows[key] = delivery_id
+                conn.execute(UPDATE_JOB_TOTAL_SQL, (conn.total_changes - before, job_id))
+        self.start()
+        self._wake.set()
+        return self.get(job_id)
+
+    def get(self, job_id):
+        """Return the job's current progress, or None if the id is unknown"""
+        conn = self.pool.connect()
+        row = conn.execute(SELECT_JOB_SQL, (job_id,)).fetchone()
+        if row is None:
+            return None
+        counts = dict(conn.execute(COUNT_BY_STATE_SQL, (job_id,)).fetchall())
+        times = conn.execute(TIMES_SQL, (job_id,)).fetchone()
+        return QueuedAlertJob(self, row[0], row[1], row[2], row[3], counts, times)
+
+    def _deliveries(self, job_id, offset, limit):
+        rows = self.pool.connect().execute(SELECT_DELIVERIES_SQL, (job_id, limit, offset)).fetchall()
+        return [
+            DeliveryResult({'name': name, 'phone': phone}, 'sent' if state == 'sent' else 'failed',
+                           error, seconds or 0.0, shared=shared_with is not None)
+            for name, phone, state, error, seconds, shared_with in rows
+        ]
+
+    def dead_letters(self, limit=100):
+        """The most recent deliveries that gave up after MAX_ATTEMPTS"""
+        rows = self.pool.connect().execute(SELECT_DEAD_SQL, (limit,)).fetchall()
+        return [
+            {'job_id': job_id, 'name': name, 'phone': phone, 'attempts': attempts, 'error': error}
+            for job_id, name, phone, attempts, error in rows
+        ]
+
+    def stats(self):
+        """Row counts per state, plus recovered leases and uptime
+
+        'shared' rows wait for another row with the same number, so they
+        are not in 'pending'.
+        """
+        counts = dict(self.pool.connect().execute(STATS_SQL).fetchall())
+        uptime = time.time() - self.started_at if self.started_at else 0.0
+        return {
+            'pending': counts.get('pending', 0),
+            'inflight': counts.get('inflight', 0),
+            'sent': counts.get('sent', 0),
+            'dead': counts.get('dead', 0),
+            'shared': counts.get('shared', 0),
+            'recovered': self.recovered,
+            'uptime': uptime,
+        }
+
+    def start(self):
+        """Start the worker threads (safe to call more than once)"""
+        with self._start_lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            self.started_at = time.time()
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'alert-queue-{number}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        """Ask the workers to finish their current batch and exit"""
+        self._stopping.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _claim(self):
+        """Lease a batch of due rows to this worker"""
+        now = time.time()
+        with self.pool.write() as conn:
+            rows = conn.execute(SELECT_EXPIRED_SQL, (now, self.batch_size)).fetchall()
+            if len(rows) < self.batch_size:
+                rows += conn.execute(SELECT_DUE_SQL, (now, self.batch_size - len(rows))).fetchall()
+            lease_until = now + self.lease_seconds
+            conn.executemany(CLAIM_SQL, ((lease_until, row[0]) for row in rows))
+        return rows
+
+    def _work(self):
+        loop = asyncio.new_event_loop()
+        rng = random.Random()
+        try:
+            while not self._stopping.is_set():
+                rows = []
+                try:
+                    rows = self._claim()
+                    if not rows:
+                        self._wake.wait(IDLE_POLL)
+                        self._wake.clear()
+                        continue
+                    self._deliver(loop, rows, rng)
+                except Exception as exc:
+                    # One bad batch or a busy database must not end the worker
+                    log.exception('Alert queue worker error; carrying on')
+                    self._release(rows, exc)
+                    self._stopping.wait(ERROR_PAUSE)
+        finally:
+            loop.close()
+
+    def _release(self, rows, error):
+        """Hand rows still claimed by this worker back to the queue"""
+        if not rows:
+            return
+        retry_at = time.time() + ERROR_PAUSE
+        try:
+            with self.pool.write() as conn:
+                conn.executemany(RELEASE_SQL, ((self.max_attempts, retry_at, str(error), row[0]) for row in rows))
+                # Rows out of attempts are dead now, and so are the rows sharing their number
+                conn.executemany(SHARE_OUTCOME_SQL, ((row[0],) for row in rows))
+        except Exception:
+            # The lease runs out anyway, and then another worker takes them
+            log.exception('Could not release %d alert deliveries', len(rows))
+
+    def _deliver(self, loop, rows, rng):
+        # Rows of the same job share a message, so send them together
+        by_message = {}
+        attempts = {}
+        created = {}
+        job_ids = set()
+        for delivery_id, state, name, phone, tries, message, created_at, job_id, tier in rows:
+            job_ids.add(job_id)
+            if state == 'inflight':
+                # Its lease ran out: the worker holding it crashed or hung
+                with self._recovered_lock:
+                    self.recovered += 1
+            attempts[delivery_id] = tries + 1
+            created[delivery_id] = created_at
+            contact = {'delivery_id': delivery_id, 'name': name, 'phone': phone, 'tier': tier}
+            by_message.setdefault(message, []).append(contact)
+
+        results = []
+        for message, contacts in by_message.items():
+            report = loop.run_until_complete(self.engine.dispatch(contacts, message))
+            results.extend(report.results)
+
+        now = time.time()
+        sent, retry, dead = [], [], []
+        for result in results:
+            delivery_id = result.contact['delivery_id']
+            if result.ok:
+                sent.append((now - created[delivery_id], delivery_id))
+            elif attempts[delivery_id] >= self.max_attempts:
+                dead.append((result.error, delivery_id))
+            else:
+                delay = backoff_delay(attempts[delivery_id], rng=rng)
+                retry.append((now + delay, result.error, delivery_id))
+        with self.pool.write() as conn:
+            conn.executemany(MARK_SENT_SQL, sent)
+            conn.executemany(MARK_RETRY_SQL, retry)
+            conn.executemany(MARK_DEAD_SQL, dead)
+            conn.executemany(SHARE_OUTCOME_SQL, ((row[-1],) for row in sent + dead))
+        if getattr(self, '_listeners', ()):
+            for job_id in job_ids:
+                self._notify('progress', self.get(job_id))
+
+
+def open_alert_queue(spec, engine):
+    """
+    Open an alert queue from a short description:
+
+    - "memory"        -> AlertJobManager (jobs are lost on restart)
+    - "sqlite:PATH"   -> AlertQueue saved in the file PATH
+    """
+    kind, _, location = spec.partition(':')
+    if kind == 'memory':
+        from alert_jobs import AlertJobManager
+        return AlertJobManager(engine)
+    if kind == 'sqlite' and location:
+        queue = AlertQueue(location, engine)
+        # Pick up deliveries left over from before a restart
+        queue.start()
+        return queue
+    raise ValueError(f'Unknown alert queue: {spec!r}')
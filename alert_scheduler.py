@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Emergency Contact Application - Alert Scheduler
+===============================================
+Decides who hears about an alert first. Sending in the order contacts
+were saved could leave 112 waiting behind hundreds of personal
+contacts, so every contact gets a priority tier and a deadline:
+
+- CRITICAL: the national emergency numbers (112, 100, 101, 102, 108)
+- HIGH:     other emergency short codes and helplines (1091, 1098, ...)
+            and contacts tagged "priority"
+- NORMAL:   everyone else
+
+A contact's deadline is DEADLINES[tier] seconds after the alert starts,
+unless the contact brings its own "tier" or "deadline". Each time a
+sender is free, the scheduler hands it:
+
+1. the most overdue contact, if any deadline has already passed, so a
+   long list of higher tiers never keeps the rest waiting forever;
+2. otherwise the contact with the earliest deadline in the highest
+   tier that still has anyone waiting.
+
+The AlertEngine's senders share one scheduler, so the concurrency cap
+is shared fairly: critical numbers go out first, then everyone else in
+deadline order.
+
+Contacts that use their tier's deadline are already in deadline order,
+so they wait in a plain deque per tier (one reference each, even for a
+million contacts); only contacts with their own deadline go in a heap.
+"""
+
+import heapq
+import itertools
+import time
+from collections import deque
+
+from phone_numbers import NATIONAL_NUMBER_LENGTH, is_short_code, normalize_phone
+
+CRITICAL, HIGH, NORMAL = 0, 1, 2
+TIERS = (CRITICAL, HIGH, NORMAL)
+TIER_NAMES = ('critical', 'high', 'normal')
+
+# Seconds after the start of an alert by which each tier should be reached
+DEADLINES = (2.0, 10.0, 60.0)
+
+# Numbers that reach police, fire and ambulance directly
+EMERGENCY_NUMBERS = frozenset(('112', '100', '101', '102', '108'))
+
+# Contacts with this tag are moved up to the HIGH tier
+PRIORITY_TAG = 'priority'
+
+
+def tier_of(contact):
+    """The priority tier of a contact (CRITICAL, HIGH or NORMAL)"""
+    tier = contact.get('tier')
+    if tier is not None:
+        return tier
+    phone = str(contact['phone'])
+    # An ordinary number has at least 10 digits, so only shorter text can
+    # be a short code; most contacts are placed without parsing their number
+    if len(phone) < NATIONAL_NUMBER_LENGTH:
+        key = normalize_phone(phone)
+        if key in EMERGENCY_NUMBERS:
+            return CRITICAL
+        if is_short_code(key):
+            return HIGH
+    if PRIORITY_TAG in (contact.get('tags') or ()):
+        return HIGH
+    return NORMAL
+
+
+class AlertScheduler:
+    """Priority tiers with earliest-deadline-first inside and across them"""
+
+    def __init__(self, deadlines=DEADLINES, started=None, clock=time.perf_counter):
+        self.deadlines = deadlines
+        self.clock = clock
+        self.started = clock() if started is None else started
+        self._queues = [deque() for _ in TIERS]   # contacts with their tier's deadline
+        self._heaps = [[] for _ in TIERS]         # (deadline, order, contact) for the rest
+        self._order = itertools.count()
+        self._size = 0
+
+    @classmethod
+    def for_contacts(cls, contacts, **kwargs):
+        """A scheduler holding every contact, each in its own tier"""
+        scheduler = cls(**kwargs)
+        push = scheduler.push
+        for contact in contacts:
+            push(contact, tier_of(contact), contact.get('deadline'))
+        return scheduler
+
+    def push(self, contact, tier=NORMAL, deadline=None):
+        """Queue a contact; `deadline` is in seconds after the start (default: the tier's)"""
+        if deadline is None:
+            self._queues[tier].append(contact)
+        else:
+            heapq.heappush(self._heaps[tier], (self.started + deadline, next(self._order), contact))
+        self._size += 1
+
+    def __len__(self):
+        return self._size
+
+    def waiting(self):
+        """How many contacts are waiting in each tier"""
+        return [len(self._queues[tier]) + len(self._heaps[tier]) for tier in TIERS]
+
+    def _head(self, tier):
+        """(deadline, from_heap) of the first contact waiting in a tier, or None"""
+        queue, heap = self._queues[tier], self._heaps[tier]
+        due = self.started + self.deadlines[tier]
+        if heap and (not queue or heap[0][0] < due):
+            return heap[0][0], True
+        if queue:
+            return due, False
+        return None
+
+    def _choose(self):
+        """(tier, (deadline, from_heap)) of the contact whose turn it is"""
+        now = self.clock()
+        first = overdue = None
+        for tier in TIERS:
+            head = self._head(tier)
+            if head is None:
+                continue
+            if first is None:
+                first = tier, head
+            if head[0] <= now and (overdue is None or head[0] < overdue[1][0]):
+                overdue = tier, head
+        return overdue or first
+
+    def _take(self, tier, from_heap, deadline):
+        if from_heap:
+            contact = heapq.heappop(self._heaps[tier])[2]
+        else:
+            contact = self._queues[tier].popleft()
+        self._size -= 1
+        return contact, tier, deadline - self.started
+
+    def pop(self):
+        """
+        The next (contact, tier, deadline) to send, with the deadline in
+        seconds after the start, or None when nobody is left.
+        """
+        if not self._size:
+            return None
+        tier, (deadline, from_heap) = self._choose()
+        return self._take(tier, from_heap, deadline)
+
+    def pop_batch(self, limit):
+        """
+        Up to `limit` turns in pop() order, all from one tier (a batch
+        stops where the next turn belongs to another tier, so critical
+        numbers never share a gateway request with later ones).
+        """
+        turns = []
+        while self._size and len(turns) < limit:
+            tier, (deadline, from_heap) = self._choose()
+            if turns and tier != turns[0][1]:
+                break
+            turns.append(self._take(tier, from_heap, deadline))
+        return turns
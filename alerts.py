@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Emergency Contact Application - Alert Engine
+============================================
+Sends the emergency message to every contact at the same time instead
+of one after another.
+
+- A Notifier knows how to deliver a message (SMS gateway, voice call,
+  push service, ...): send() for one contact, send_bulk() for a batch
+  of contacts on one channel in a single request. StubGateway is a
+  local stand-in that only waits a little and records what it "sent".
+- AlertEngine sends batches of up to `batch_size` contacts, runs up to
+  `concurrency` gateway requests at once with asyncio, gives every
+  request `timeout` seconds, and returns an AlertReport. The cap holds
+  for the engine as a whole: alerts sent at the same time, even from
+  several threads each with its own event loop (the alert queue's
+  workers), share it.
+- An AlertScheduler (alert_scheduler.py) picks who goes next, so
+  emergency numbers such as 112 are sent first and every contact is
+  tried before its deadline where possible.
+- A number that appears more than once in the list (the same person
+  saved under two names, "+91 98765 43210" next to "9876543210") is
+  messaged once; the other entries share that delivery's result.
+- Short codes are phoned ("voice"), other numbers get an SMS; each
+  batch is split by channel before it goes to send_bulk().
+- The report records time-to-first and time-to-last delivery. In an
+  emergency the time until the LAST contact hears from us is what counts.
+"""
+
+import asyncio
+import collections
+import itertools
+import random
+import threading
+import time
+
+from alert_scheduler import AlertScheduler
+from phone_numbers import is_short_code, normalize_phone
+
+DEFAULT_MESSAGE = 'EMERGENCY ALERT: I need help. Please contact me as soon as possible.'
+
+# How many gateway requests may be in flight at once
+DEFAULT_CONCURRENCY = 50
+
+# Most contacts sent in one gateway request
+DEFAULT_BATCH_SIZE = 100
+
+# Seconds to wait for one send before giving up on it
+DEFAULT_TIMEOUT = 10.0
+
+
+class GatewayError(Exception):
+    """A notifier could not deliver a message"""
+
+
+def channel_of(contact, key=None):
+    """How to reach a contact: its own "channel", else "voice" for short codes and "sms" otherwise"""
+    channel = contact.get('channel')
+    if channel:
+        return channel
+    if key is None:
+        key = normalize_phone(contact['phone'])
+    # 112 and the helplines take calls, not text messages
+    return 'voice' if is_short_code(key) else 'sms'
+
+
+class Notifier:
+    """Delivers messages; subclass and override send(), and send_bulk() if the service has one"""
+
+    async def send(self, contact, message):
+        """Deliver `message` to `contact`, raise GatewayError on failure"""
+        raise NotImplementedError
+
+    async def send_bulk(self, contacts, message, channel='sms'):
+        """
+        Deliver `message` to several contacts on one channel. Returns one
+        error message per contact (None when it was delivered); raising
+        fails the whole batch.
+
+        This default calls send() for every contact at the same time;
+        gateways with a bulk API answer in one request instead.
+        """
+        outcomes = await asyncio.gather(*(self.send(contact, message) for contact in contacts),
+                                        return_exceptions=True)
+        return [str(outcome) if isinstance(outcome, BaseException) else None for outcome in outcomes]
+
+
+class StubGateway(Notifier):
+    """Pretend gateway for local runs and tests: waits, maybe fails, records each send"""
+
+    def __init__(self, latency=(0.001, 0.005), failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.sent = []
+        self.requests = 0    # round trips made, single or bulk
+
+    async def send(self, contact, message):
+        self.requests += 1
+        await asyncio.sleep(self.random.uniform(*self.latency))
+        if self.random.random() < self.failure_rate:
+            raise GatewayError(f"Gateway rejected message to {contact['phone']}")
+        self.sent.append((contact['phone'], message))
+
+    async def send_bulk(self, contacts, message, channel='sms'):
+        # One round trip for the whole batch; each message may still fail
+        self.requests += 1
+        await asyncio.sleep(self.random.uniform(*self.latency))
+        errors = []
+        for contact in contacts:
+            if self.random.random() < self.failure_rate:
+                errors.append(f"Gateway rejected message to {contact['phone']}")
+            else:
+                self.sent.append((contact['phone'], message))
+                errors.append(None)
+        return errors
+
+
+class DeliveryResult:
+    """What happened to the message for one contact"""
+
+    __slots__ = ('contact', 'status', 'error', 'seconds', 'tier', 'deadline', 'shared')
+
+    def __init__(self, contact, status, error=None, seconds=0.0, tier=None, deadline=None, shared=False):
+        self.contact = contact
+        self.status = status      # 'sent', 'failed' or 'timeout'
+        self.error = error
+        self.seconds = seconds    # time since the alert started
+        self.tier = tier          # priority tier from alert_scheduler (None if not scheduled)
+        self.deadline = deadline  # seconds after the start it should have been done by
+        self.shared = shared      # True when another entry with the same number was messaged
+
+    def shared_with(self, contact, tier=None, deadline=None):
+        """This result for another entry with the same number"""
+        return DeliveryResult(contact, self.status, self.error, self.seconds, tier, deadline, shared=True)
+
+    @property
+    def ok(self):
+        return self.status == 'sent'
+
+    @property
+    def late(self):
+        """True when the attempt finished after its deadline"""
+        return self.deadline is not None and self.seconds > self.deadline
+
+
+class AlertReport:
+    """Results of one alert, with delivery timings"""
+
+    def __init__(self, results, total_seconds, requests=None):
+        self.results = results
+        self.total_seconds = total_seconds
+        self.requests = requests    # gateway round trips made
+
+    @property
+    def messages(self):
+        """Messages actually sent out (entries sharing a number count once)"""
+        return sum(1 for result in self.results if not result.shared)
+
+    @property
+    def coalesced(self):
+        """Entries that shared another entry's message"""
+        return len(self.results) - self.messages
+
+    @property
+    def sent(self):
+        return sum(1 for result in self.results if result.ok)
+
+    @property
+    def failed(self):
+        return len(self.results) - self.sent
+
+    @property
+    def time_to_first(self):
+        """Seconds until the first contact was reached (None if nobody was)"""
+        times = [result.seconds for result in self.results if result.ok]
+        return min(times) if times else None
+
+    @property
+    def time_to_last(self):
+        """Seconds until the last successful delivery (None if nobody was reached)"""
+        times = [result.seconds for result in self.results if result.ok]
+        return max(times) if times else None
+
+    @property
+    def late(self):
+        """How many attempts finished after their deadline"""
+        return sum(1 for result in self.results if result.late)
+
+    def time_to_last_in(self, tier):
+        """Seconds until the last successful delivery in one priority tier (None if none)"""
+        times = [result.seconds for result in self.results if result.ok and result.tier == tier]
+        return max(times) if times else None
+
+
+class _RequestLimiter:
+    """
+    An async semaphore that works across threads and event loops.
+
+    asyncio.Semaphore belongs to one event loop, so each thread running
+    its own loop would get a cap of its own. Here a free slot is handed
+    straight to the longest waiter, whichever loop it is waiting on.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._waiters = collections.deque()   # (loop, future) in arrival order
+
+    async def __aenter__(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._in_use < self.limit and not self._waiters:
+                self._in_use += 1
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                waiting = waiter in self._waiters
+                if waiting:
+                    self._waiters.remove(waiter)
+            # A slot handed over just before the cancel is passed on
+            if not waiting and waiter[1].done() and not waiter[1].cancelled():
+                self._release()
+            raise
+
+    async def __aexit__(self, *exc_info):
+        self._release()
+
+    def _release(self):
+        with self._lock:
+            while self._waiters:
+                loop, future = self._waiters.popleft()
+                if not loop.is_closed():
+                    # The slot stays taken; it now belongs to the waiter
+                    loop.call_soon_threadsafe(self._grant, future)
+                    return
+            self._in_use -= 1
+
+    def _grant(self, future):
+        if future.cancelled():
+            self._release()
+        else:
+            future.set_result(None)
+
+
+class AlertEngine:
+    """Fans an alert out to many contacts concurrently"""
+
+    def __init__(self, notifier, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT, prioritize=True,
+                 batch_size=DEFAULT_BATCH_SIZE):
+        self.notifier = notifier
+        self.concurrency = concurrency
+        # Shared by every dispatch() of this engine, in any thread
+        self._limiter = _RequestLimiter(concurrency)
+        self.timeout = timeout
+        # False sends in list order without reading the whole list first
+        self.prioritize = prioritize
+        # 1 sends every contact in a request of its own
+        self.batch_size = batch_size
+
+    async def dispatch(self, contacts, message=DEFAULT_MESSAGE, on_result=None):
+        """
+        Send `message` to every contact and return an AlertReport.
+
+        `on_result(result)` is called after each delivery attempt, for
+        progress reporting.
+        """
+        started = time.perf_counter()
+        results = []
+        requests = 0
+        # Canonical number -> its DeliveryResult, or the list of entries
+        # waiting for it while the message is still on its way
+        delivered = {}
+        # A worker sends one request per channel of its batch at once, and
+        # other alerts may be sending too; the engine's limiter keeps the
+        # total at `concurrency`
+        limiter = self._limiter
+        if self.prioritize:
+            # Every contact has to be seen before the first send, or a 112
+            # at the end of the list would still go out last
+            take = AlertScheduler.for_contacts(contacts, started=started).pop_batch
+        else:
+            pending = iter(contacts)
+
+            def take(limit):
+                return [(contact, None, None) for contact in itertools.islice(pending, limit)]
+
+        def record(result):
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+
+        async def send(channel, batch):
+            nonlocal requests
+            requests += 1
+            try:
+                async with limiter:
+                    errors = await asyncio.wait_for(
+                        self.notifier.send_bulk([contact for _, contact, _, _ in batch], message, channel),
+                        self.timeout)
+                if len(errors) != len(batch):
+                    raise GatewayError(f'Gateway answered for {len(errors)} of {len(batch)} contacts')
+                outcomes = [('sent', None) if error is None else ('failed', error) for error in errors]
+            except asyncio.TimeoutError:
+                outcomes = [('timeout', f'No answer within {self.timeout}s')] * len(batch)
+            except Exception as exc:
+                outcomes = [('failed', str(exc))] * len(batch)
+            seconds = time.perf_counter() - started
+            for (key, contact, tier, deadline), (status, error) in zip(batch, outcomes):
+                result = DeliveryResult(contact, status, error, seconds, tier, deadline)
+                record(result)
+                if key:
+                    waiting, delivered[key] = delivered[key], result
+                    for other in waiting:
+                        record(result.shared_with(*other))
+
+        async def worker():
+            # A fixed set of workers takes turns at one scheduler, so the
+            # concurrency cap is shared in priority and deadline order
+            while True:
+                turns = take(self.batch_size)
+                if not turns:
+                    return
+                by_channel = {}
+                for contact, tier, deadline in turns:
+                    # Contacts without a usable number are never merged
+                    key = normalize_phone(contact['phone'])
+                    earlier = delivered.get(key) if key else None
+                    if earlier is None:
+                        if key:
+                            delivered[key] = []
+                        by_channel.setdefault(channel_of(contact, key), []).append((key, contact, tier, deadline))
+                    elif isinstance(earlier, list):
+                        earlier.append((contact, tier, deadline))
+                    else:
+                        record(earlier.shared_with(contact, tier, deadline))
+                await asyncio.gather(*(send(channel, batch) for channel, batch in by_channel.items()))
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        return AlertReport(results, time.perf_counter() - started, requests)
+
+    def send_alert(self, contacts, message=DEFAULT_MESSAGE, on_result=None):
+        """Blocking version of dispatch() for code that is not async"""
+        return asyncio.run(self.dispatch(contacts, message, on_result))
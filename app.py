@@ -8,416 +8,572 @@ To run:
 1. pip install flask
 2. python app.py
 3. Open http://localhost:5000
+
+Contacts are saved in emergency_contacts.db (SQLite). Set the
+CONTACT_STORE environment variable to change this, for example
+CONTACT_STORE=sqlite:/var/lib/contacts.db or CONTACT_STORE=memory.
+A single-process server that takes bursts of /add requests can use
+CONTACT_STORE=journal:/var/lib/contacts (group-committed journal).
+
+The "nearby helplines" lookups read data/regional_directory.csv; set
+REGIONAL_DIRECTORY to use a full directory file in the same format.
+The Quick Add lists come from data/presets.json (or PRESET_CATALOG);
+edits to that file are picked up without a restart.
+
+To see where a slow page spends its time, set PROFILE_DIR (and
+PROFILE_SAMPLE_RATE or PROFILE_TOKEN); see profiling.py.
 """
 
-from flask import Flask, render_template_string, request, redirect, url_for, flash
+import functools
+import hashlib
+import os
+import threading
+import time
+
+from flask import Flask, render_template, stream_template, request, redirect, url_for, flash, jsonify, session, g
+from flask.json.provider import DefaultJSONProvider
+
+from alert_queue import open_alert_queue
+from alerts import AlertEngine, StubGateway, DEFAULT_MESSAGE
+from contact_import import ContactImportError, detect_format, import_contacts, text_stream
+from contact_store import Contact, open_store
+from contact_tags import SelectorError, TagIndex
+from event_feed import EventFeed
+from metrics import Registry, instrument_engine, instrument_store
+from phone_numbers import normalize_phone
+from preset_catalog import get_catalog, load_pack
+from profiling import install as install_profiler
+from regional_directory import DEFAULT_NEAREST, MAX_NEAREST, DirectoryError, load_directory, parse_location, service_dict
+from search_index import SearchIndex
+
+
+
+class ContactJSONProvider(DefaultJSONProvider):
+    """Lets jsonify() send Contact records as {"id", "name", "phone"} objects"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, Contact):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
 
 # Create Flask app
 app = Flask(__name__)
+app.json = ContactJSONProvider(app)
 app.secret_key = 'emergency_contact_app_secret_key'
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 365 * 24 * 60 * 60
+
+with open(os.path.join(app.static_folder, 'style.css'), 'rb') as css_file:
+    app.jinja_env.globals['css_version'] = hashlib.sha1(css_file.read()).hexdigest()[:12]
+
+
+def _page_files_version():
+    """Hash and newest change time of the templates and stylesheet"""
+    digest = hashlib.sha1()
+    newest = 0.0
+    template_folder = os.path.join(app.root_path, app.template_folder)
+    paths = [os.path.join(template_folder, name) for name in sorted(os.listdir(template_folder))]
+    paths.append(os.path.join(app.static_folder, 'style.css'))
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+        newest = max(newest, os.path.getmtime(path))
+    return digest.hexdigest()[:12], newest
+
+
+# Part of every page ETag, so a new deployment never gets a stale 304
+PAGE_FILES_VERSION, PAGE_FILES_MODIFIED = _page_files_version()
+
+# Data storage - a SQLite file shared by every worker process
+contact_store = open_store(os.environ.get('CONTACT_STORE', 'sqlite:emergency_contacts.db'))
+
+# Search index - built on the first search, then kept up to date.
+# Like the tag index below, it is built again when another worker
+# process has changed the shared database since.
+search_index = None
+search_index_version = None
+search_index_lock = threading.Lock()
+
+# Tag index for alerts to a selection of contacts - built on first use.
+# tag_index_version is the store version it reflects; when another
+# worker process changes the shared database it moves on, and the
+# index is built again before it picks anyone.
+tag_index = None
+tag_index_version = None
+tag_index_lock = threading.Lock()
+
+# Alert delivery - swap StubGateway for a real Notifier (SMS, voice, ...)
+alert_engine = AlertEngine(StubGateway())
+
+# Alerts run in the background so a web request never waits for delivery.
+# They are queued in alert_queue.db and retried until delivered; set
+# ALERT_QUEUE=memory for a queue that does not survive a restart.
+alert_jobs = open_alert_queue(os.environ.get('ALERT_QUEUE', 'sqlite:alert_queue.db'), alert_engine)
+
+# Live changes for /events (Server-Sent Events)
+event_feed = EventFeed()
+event_feed.watch_store(contact_store)
+event_feed.watch_alerts(alert_jobs)
+
+# Monitoring, served in Prometheus text format at /metrics
+metrics = Registry()
+instrument_store(contact_store, metrics)
+instrument_engine(alert_engine, metrics)
+http_requests = metrics.counter('http_requests_total', 'HTTP requests served',
+                                ('method', 'route', 'status'))
+http_duration = metrics.histogram('http_request_duration_seconds',
+                                  'Time to produce a response (streamed bodies not included)',
+                                  ('method', 'route'))
+metrics.gauge('events_clients', 'Open /events connections', lambda: event_feed.clients)
+if hasattr(alert_jobs, 'stats'):
+    metrics.gauge('alert_queue_pending', 'Alert deliveries waiting to be sent',
+                  lambda: alert_jobs.stats()['pending'])
+    metrics.gauge('alert_queue_dead', 'Alert deliveries that gave up after all retries',
+                  lambda: alert_jobs.stats()['dead'])
+
+# Opt-in cProfile of sampled or token-marked requests; off unless PROFILE_DIR is set
+install_profiler(app)
+
+# How many per-contact results the alert status page lists
+STATUS_PAGE_DELIVERIES = 200
+
+# Pages are compiled once here and reused for every request.
+# The stylesheet lives in static/style.css; its URL carries a content
+# hash, so browsers may cache it for a year and still see every change.
+PAGE_TEMPLATES = {
+    page: app.jinja_env.get_template(f'{page}.html')
+    for page in ('home', 'contacts', 'emergency')
+}
+
+
+# Contacts are shown a page at a time; ?limit= may ask for up to MAX_PAGE_SIZE
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Streamed pages are sent in chunks of about this many bytes
+STREAM_CHUNK_SIZE = 16 * 1024
+
+
+def render_page(page, **context):
+    """Render one of the precompiled page templates"""
+    return render_template(PAGE_TEMPLATES[page], page=page, **context)
+
+
+def stream_page(page, **context):
+    """Render a page template as a streamed response, sent as it is rendered"""
+    # stream_template() must be called while the request is active;
+    # the generator it returns keeps that context for later
+    pieces = stream_template(PAGE_TEMPLATES[page], page=page, **context)
+
+    def chunks():
+        buffer = []
+        size = 0
+        for piece in pieces:
+            buffer.append(piece)
+            size += len(piece)
+            if size >= STREAM_CHUNK_SIZE:
+                yield ''.join(buffer)
+                buffer = []
+                size = 0
+        if buffer:
+            yield ''.join(buffer)
+    return app.response_class(chunks(), mimetype='text/html')
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # The route pattern (/emergency/<job_id>), not the URL, keeps the label set small
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        http_duration.observe(time.perf_counter() - started, request.method, route)
+        http_requests.inc(request.method, route, str(response.status_code))
+    return response
+
+
+def conditional_page(view):
+    """
+    Answer a GET with 304 Not Modified, without rendering anything, when
+    the browser's copy of the page is still current.
+
+    The ETag and Last-Modified headers come from the contact store's
+    version, which changes with every add, remove or clear, and from the
+    preset catalog, which may be edited while the server runs.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != 'GET' or session.get('_flashes'):
+            # A flashed message is shown only once, so that page is never cached
+            return view(*args, **kwargs)
+        version = contact_store.version()
+        presets = get_catalog()
+        etag = f'{version.epoch}-{version.number}-{PAGE_FILES_VERSION}-{presets.revision}'
+        last_modified = max(version.modified_at, PAGE_FILES_MODIFIED, presets.modified_at)
+        if request.if_none_match:
+            fresh = request.if_none_match.contains(etag)
+        elif request.if_modified_since:
+            fresh = int(last_modified) <= request.if_modified_since.timestamp()
+        else:
+            fresh = False
+        if fresh:
+            response = app.response_class(status=304)
+        else:
+            response = app.make_response(view(*args, **kwargs))
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        # The browser may keep the page but must ask again before showing it
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
+
+
+def page_args():
+    """Read the ?after= cursor and ?limit= page size from the query string"""
+    after = max(request.args.get('after', 0, type=int), 0)
+    limit = request.args.get('limit', PAGE_SIZE, type=int)
+    return after, min(max(limit, 1), MAX_PAGE_SIZE)
+
+
+def get_search_index():
+    """Return the search index, (re)building it when it does not reflect the store"""
+    global search_index, search_index_version
+    with search_index_lock:
+        version = contact_store.version()
+        if search_index is None or version != search_index_version:
+            if search_index is not None:
+                contact_store.unsubscribe(search_index.on_change)
+                contact_store.unsubscribe(_search_index_followed)
+            search_index = SearchIndex.for_store(contact_store)
+            search_index_version = version
+            contact_store.subscribe(_search_index_followed)
+        return search_index
+
+
+def _search_index_followed(event, contact):
+    # The index has just applied a change made here; remember the version it reached
+    global search_index_version
+    search_index_version = _followed_version(search_index_version)
+
+
+def get_tag_index():
+    """Return the tag index, (re)building it when it does not reflect the store"""
+    global tag_index, tag_index_version
+    with tag_index_lock:
+        version = contact_store.version()
+        if tag_index is None or version != tag_index_version:
+            if tag_index is not None:
+                contact_store.unsubscribe(tag_index.on_change)
+                contact_store.unsubscribe(_tag_index_followed)
+            tag_index = TagIndex.for_store(contact_store)
+            tag_index_version = version
+            contact_store.subscribe(_tag_index_followed)
+        return tag_index
+
+
+def _tag_index_followed(event, contact):
+    # The index has just applied a change made here; remember the version it reached
+    global tag_index_version
+    tag_index_version = _followed_version(tag_index_version)
+
+
+def _followed_version(known):
+    """
+    The store version an index reached by applying one change made here,
+    or None (rebuild on next use) when another process also wrote since
+    `known`: its change was not applied, so its version must not be taken.
+    One transaction may report several changes, hence "+0 or +1".
+    """
+    version = contact_store.version()
+    if known is not None and version.epoch == known.epoch and version.number - known.number in (0, 1):
+        return version
+    return None
+
+
+def alert_recipients(selector):
+    """
+    (contacts, how many) for an alert: everyone for an empty selector,
+    else the contacts a tag selector picks. Raises SelectorError.
+    """
+    if not selector or not selector.strip():
+        return contact_store, len(contact_store)
+    chosen = get_tag_index().select(selector)
+    return chosen, len(chosen)
+
+
+def nearby_services(lat, lon, limit=None, category=None):
+    """
+    The services nearest to (lat, lon) as (service, km) pairs, or [] when
+    no location was given. Raises ValueError for a location that makes no sense.
+    """
+    if not lat or not lon:
+        return []
+    lat, lon = parse_location(lat, lon)
+    try:
+        limit = int(limit) if limit else DEFAULT_NEAREST
+    except (TypeError, ValueError):
+        limit = DEFAULT_NEAREST
+    return load_directory().nearest(lat, lon, min(max(limit, 1), MAX_NEAREST), category or None)
+
+
+def emergency_location(source):
+    """Template values for the sender's location and the services nearest to it"""
+    lat, lon = source.get('lat', ''), source.get('lon', '')
+    try:
+        nearby = nearby_services(lat, lon)
+    except (ValueError, DirectoryError):
+        return {'nearby': [], 'lat': '', 'lon': ''}
+    return {'nearby': nearby, 'lat': lat, 'lon': lon}
+
+
+def fetch_page(after, limit):
+    """Return (contacts, next_after); next_after is None on the last page"""
+    contacts = contact_store.page(after, limit + 1)
+    if len(contacts) > limit:
+        return contacts[:limit], contacts[limit - 1]['id']
+    return contacts, None
 
-# Data storage - using a list of dictionaries
-contacts_list = []
-
-# Indian Government Emergency Contacts
-indian_emergency_contacts = [
-    {"name": "Police (All India)", "phone": "100"},
-    {"name": "Fire Service", "phone": "101"},
-    {"name": "Ambulance", "phone": "102"},
-    {"name": "Women Helpline", "phone": "1091"},
-    {"name": "Child Helpline", "phone": "1098"},
-    {"name": "Disaster Management", "phone": "1070"},
-    {"name": "National Emergency", "phone": "112"},
-    {"name": "Railway Police", "phone": "1512"},
-    {"name": "Road Safety", "phone": "1033"},
-    {"name": "Anti Terrorist Helpline", "phone": "1930"},
-]
-
-# HTML Template
-HTML_TEMPLATE = '''
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>🚨 Emergency Contact Application</title>
-    <style>
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-        
-        body {
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-            padding: 20px;
-        }
-        
-        .container {
-            max-width: 800px;
-            margin: 0 auto;
-        }
-        
-        .header {
-            text-align: center;
-            color: white;
-            margin-bottom: 30px;
-        }
-        
-        .header h1 {
-            font-size: 2.5em;
-            margin-bottom: 10px;
-        }
-        
-        .card {
-            background: white;
-            border-radius: 15px;
-            padding: 25px;
-            margin-bottom: 20px;
-            box-shadow: 0 10px 30px rgba(0,0,0,0.2);
-        }
-        
-        .card h2 {
-            color: #333;
-            margin-bottom: 20px;
-            border-bottom: 2px solid #667eea;
-            padding-bottom: 10px;
-        }
-        
-        .form-group {
-            margin-bottom: 15px;
-        }
-        
-        label {
-            display: block;
-            margin-bottom: 5px;
-            color: #555;
-            font-weight: bold;
-        }
-        
-        input[type="text"] {
-            width: 100%;
-            padding: 12px;
-            border: 2px solid #ddd;
-            border-radius: 8px;
-            font-size: 16px;
-            transition: border-color 0.3s;
-        }
-        
-        input[type="text"]:focus {
-            outline: none;
-            border-color: #667eea;
-        }
-        
-        .btn {
-            padding: 12px 25px;
-            border: none;
-            border-radius: 8px;
-            font-size: 16px;
-            cursor: pointer;
-            transition: transform 0.2s, box-shadow 0.2s;
-            display: inline-block;
-            text-decoration: none;
-            text-align: center;
-        }
-        
-        .btn:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 5px 15px rgba(0,0,0,0.2);
-        }
-        
-        .btn-success { background: #28a745; color: white; }
-        .btn-danger { background: #dc3545; color: white; }
-        .btn-warning { background: #ffc107; color: #333; }
-        .btn-info { background: #17a2b8; color: white; }
-        .btn-primary { background: #667eea; color: white; }
-        
-        .btn-group {
-            display: flex;
-            gap: 10px;
-            flex-wrap: wrap;
-            margin-top: 20px;
-        }
-        
-        table {
-            width: 100%;
-            border-collapse: collapse;
-            margin-top: 15px;
-        }
-        
-        th, td {
-            padding: 12px;
-            text-align: left;
-            border-bottom: 1px solid #ddd;
-        }
-        
-        th {
-            background: #667eea;
-            color: white;
-        }
-        
-        tr:hover {
-            background: #f5f5f5;
-        }
-        
-        .alert-box {
-            padding: 15px;
-            border-radius: 8px;
-            margin-bottom: 20px;
-        }
-        
-        .alert-success {
-            background: #d4edda;
-            border: 1px solid #c3e6cb;
-            color: #155724;
-        }
-        
-        .alert-danger {
-            background: #f8d7da;
-            border: 1px solid #f5c6cb;
-            color: #721c24;
-        }
-        
-        .alert-warning {
-            background: #fff3cd;
-            border: 1px solid #ffeaa7;
-            color: #856404;
-        }
-        
-        .emergency-alert {
-            background: linear-gradient(135deg, #ff416c 0%, #ff4b2b 100%);
-            color: white;
-            text-align: center;
-            padding: 30px;
-            border-radius: 15px;
-        }
-        
-        .emergency-alert h3 {
-            font-size: 2em;
-            margin-bottom: 15px;
-        }
-        
-        .emergency-alert .message {
-            font-size: 1.5em;
-            font-weight: bold;
-        }
-        
-        .nav-buttons {
-            display: flex;
-            gap: 10px;
-            margin-bottom: 20px;
-        }
-        
-        .nav-buttons a {
-            padding: 10px 20px;
-            background: rgba(255,255,255,0.2);
-            color: white;
-            text-decoration: none;
-            border-radius: 8px;
-            transition: background 0.3s;
-        }
-        
-        .nav-buttons a:hover {
-            background: rgba(255,255,255,0.3);
-        }
-        
-        .empty-state {
-            text-align: center;
-            padding: 40px;
-            color: #777;
-        }
-        
-        .indian-contacts {
-            background: #f8f9fa;
-            padding: 15px;
-            border-radius: 8px;
-            margin-top: 15px;
-        }
-        
-        .indian-contacts h3 {
-            color: #333;
-            margin-bottom: 10px;
-        }
-        
-        .indian-contacts ul {
-            list-style: none;
-            padding: 0;
-        }
-        
-        .indian-contacts li {
-            padding: 8px;
-            border-bottom: 1px solid #ddd;
-            display: flex;
-            justify-content: space-between;
-        }
-        
-        .indian-contacts li:last-child {
-            border-bottom: none;
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>🚨 Emergency Contact Application</h1>
-            <p>Manage your emergency contacts and send alerts</p>
-            <div class="nav-buttons">
-                <a href="/">Home</a>
-                <a href="/contacts">View Contacts</a>
-                <a href="/emergency">Emergency Alert</a>
-            </div>
-        </div>
-        
-        {% with messages = get_flashed_messages(with_categories=true) %}
-            {% if messages %}
-                {% for category, message in messages %}
-                    <div class="alert-box alert-{{ category }}">
-                        {{ message }}
-                    </div>
-                {% endfor %}
-            {% endif %}
-        {% endwith %}
-        
-        {% if page == 'home' %}
-        <div class="card">
-            <h2>📱 Add Emergency Contact</h2>
-            <form method="POST" action="/add">
-                <div class="form-group">
-                    <label for="name">Contact Name:</label>
-                    <input type="text" id="name" name="name" placeholder="Enter contact name" required>
-                </div>
-                <div class="form-group">
-                    <label for="phone">Phone Number:</label>
-                    <input type="text" id="phone" name="phone" placeholder="Enter phone number" required>
-                </div>
-                <button type="submit" class="btn btn-success">➕ Add Contact</button>
-            </form>
-        </div>
-        
-        <div class="card">
-            <h2>🇮🇳 Quick Add Indian Emergency Contacts</h2>
-            <p>One-click to add all Indian government emergency numbers:</p>
-            <form method="POST" action="/add_indian">
-                <button type="submit" class="btn btn-warning">🇮🇳 Load Indian Emergency Contacts</button>
-            </form>
-            
-            <div class="indian-contacts">
-                <h3>Available Indian Emergency Numbers:</h3>
-                <ul>
-                    <li><span>Police</span><strong>100</strong></li>
-                    <li><span>Fire Service</span><strong>101</strong></li>
-                    <li><span>Ambulance</span><strong>102</strong></li>
-                    <li><span>Women Helpline</span><strong>1091</strong></li>
-                    <li><span>Child Helpline</span><strong>1098</strong></li>
-                    <li><span>National Emergency</span><strong>112</strong></li>
-                </ul>
-            </div>
-        </div>
-        
-        {% elif page == 'contacts' %}
-        <div class="card">
-            <h2>📋 Saved Contacts</h2>
-            {% if contacts %}
-                <p>Total contacts: <strong>{{ contacts|length }}</strong></p>
-                <table>
-                    <thead>
-                        <tr>
-                            <th>#</th>
-                            <th>Name</th>
-                            <th>Phone</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-                        {% for contact in contacts %}
-                        <tr>
-                            <td>{{ loop.index }}</td>
-                            <td>{{ contact.name }}</td>
-                            <td>{{ contact.phone }}</td>
-                        </tr>
-                        {% endfor %}
-                    </tbody>
-                </table>
-            {% else %}
-                <div class="empty-state">
-                    <p>⚠️ No emergency contacts saved yet!</p>
-                    <p>Go to Home to add contacts.</p>
-                </div>
-            {% endif %}
-        </div>
-        
-        {% elif page == 'emergency' %}
-        <div class="card">
-            <div class="emergency-alert">
-                <h3>🚨 EMERGENCY ALERT 🚨</h3>
-                {% if contacts %}
-                    <p>Notifying {{ contacts|length }} contact(s)...</p>
-                    <ul style="list-style: none; padding: 20px; text-align: left;">
-                        {% for contact in contacts %}
-                        <li>📱 {{ contact.name }} - {{ contact.phone }}</li>
-                        {% endfor %}
-                    </ul>
-                    <p class="message">Emergency message sent</p>
-                    <p>✓ All contacts have been notified!</p>
-                {% else %}
-                    <p>⚠️ No contacts to notify!</p>
-                    <p>Please add emergency contacts first.</p>
-                {% endif %}
-            </div>
-        </div>
-        {% endif %}
-        
-        <div class="card">
-            <h2>📊 Statistics</h2>
-            <p>Total contacts saved: <strong>{{ contacts|length }}</strong></p>
-        </div>
-    </div>
-</body>
-</html>
-'''
 
 @app.route('/')
+@conditional_page
 def home():
     """Home page with add contact form"""
-    return render_template_string(HTML_TEMPLATE, page='home', contacts=contacts_list)
+    try:
+        categories = load_directory().categories
+    except DirectoryError:
+        categories = ()
+    return render_page('home', total=len(contact_store), categories=categories, presets=get_catalog())
 
 @app.route('/contacts')
+@conditional_page
 def contacts():
-    """View all contacts page"""
-    return render_template_string(HTML_TEMPLATE, page='contacts', contacts=contacts_list)
+    """View contacts page, one page at a time (or the whole list with ?stream=1)"""
+    total = len(contact_store)
+    if request.args.get('stream'):
+        return stream_page('contacts', contacts=iter(contact_store), total=total,
+                           start=1, limit=None, next_after=None)
+    after, limit = page_args()
+    page_contacts, next_after = fetch_page(after, limit)
+    return render_page('contacts', contacts=page_contacts, total=total,
+                       start=request.args.get('start', 1, type=int),
+                       limit=limit, next_after=next_after)
 
-@app.route('/emergency')
+@app.route('/api/contacts')
+def api_contacts():
+    """JSON list of contacts, paged with ?after=<last id>&limit=<n>"""
+    after, limit = page_args()
+    page_contacts, next_after = fetch_page(after, limit)
+    return jsonify(contacts=page_contacts, next_after=next_after)
+
+@app.route('/emergency', methods=['GET', 'POST'])
+@conditional_page
 def emergency():
-    """Emergency alert page"""
-    return render_template_string(HTML_TEMPLATE, page='emergency', contacts=contacts_list)
+    """Emergency alert page - POST starts the alert in the background"""
+    total = len(contact_store)
+    if request.method == 'GET':
+        return render_page('emergency', job=None, total=total)
+    if not total:
+        flash('⚠ No contacts to notify!', 'warning')
+        return redirect(url_for('emergency'))
+    selector = request.form.get('select', '').strip()
+    try:
+        recipients, total = alert_recipients(selector)
+    except SelectorError as exc:
+        flash(f'⚠ {exc}', 'danger')
+        return redirect(url_for('emergency'))
+    if not total:
+        flash(f'⚠ No contacts match "{selector}"!', 'warning')
+        return redirect(url_for('emergency'))
+    job = alert_jobs.submit(recipients, total, idempotency_key=request.form.get('idempotency_key'))
+    return render_page('emergency', job=job, deliveries=[], total=total, **emergency_location(request.form)), 202
+
+@app.route('/emergency/<job_id>')
+def emergency_status(job_id):
+    """Progress page for an alert started from /emergency"""
+    job = alert_jobs.get(job_id)
+    if job is None:
+        flash('⚠ That alert is no longer available.', 'warning')
+        return redirect(url_for('emergency'))
+    deliveries = job.deliveries(0, STATUS_PAGE_DELIVERIES)
+    return render_page('emergency', job=job, deliveries=deliveries, total=len(contact_store),
+                       **emergency_location(request.args))
+
+@app.route('/api/alerts', methods=['POST'])
+def api_start_alert():
+    """Start an alert; answers 202 with the job id right away"""
+    total = len(contact_store)
+    if not total:
+        return jsonify(error='No contacts to notify'), 400
+    data = request.get_json(silent=True) or request.form
+    message = data.get('message') or DEFAULT_MESSAGE
+    try:
+        recipients, total = alert_recipients(data.get('select'))
+    except SelectorError as exc:
+        return jsonify(error=str(exc)), 400
+    if not total:
+        return jsonify(error='No contacts match the selector',
+                       unknown_tags=get_tag_index().unknown(data['select'])), 400
+    try:
+        nearby = nearby_services(data.get('lat'), data.get('lon'), data.get('nearest'))
+    except DirectoryError as exc:
+        # Never hold up an alert because the directory file is missing
+        app.logger.warning('Regional directory unavailable: %s', exc)
+        nearby = []
+    except ValueError as exc:
+        return jsonify(error=str(exc)), 400
+    job = alert_jobs.submit(recipients, total, message,
+                            idempotency_key=request.headers.get('Idempotency-Key'))
+    status_url = url_for('api_alert_status', job_id=job.id)
+    return (jsonify(job_id=job.id, state=job.state, status_url=status_url,
+                    nearby=[service_dict(service, km) for service, km in nearby]),
+            202, {'Location': status_url})
+
+@app.route('/api/alerts/<job_id>')
+def api_alert_status(job_id):
+    """Delivery progress of an alert, with per-contact results paged by ?offset=&limit="""
+    job = alert_jobs.get(job_id)
+    if job is None:
+        return jsonify(error='Unknown alert job'), 404
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 500, type=int), 1), MAX_PAGE_SIZE)
+    return jsonify(job.status(offset, limit))
+
+@app.route('/api/tags')
+def api_tags():
+    """Every tag with the number of contacts that have it"""
+    return jsonify(tags=get_tag_index().tags())
+
+@app.route('/api/contacts/<int:contact_id>/tags', methods=['PUT', 'POST'])
+def api_set_tags(contact_id):
+    """Replace a contact's tags: send {"tags": ["family", "neighbours"]} (or "family, neighbours")"""
+    data = request.get_json(silent=True) or request.form
+    tags = data.get('tags')
+    if tags is not None and not isinstance(tags, (str, list)):
+        return jsonify(error='tags must be a list or comma-separated text'), 400
+    contact = contact_store.set_tags(contact_id, tags)
+    if contact is None:
+        return jsonify(error='Unknown contact'), 404
+    return jsonify(contact)
+
+@app.route('/events')
+def events():
+    """Server-Sent Events: contact-added, contact-removed, contacts-cleared, alert-progress"""
+    stream = event_feed.stream(request.headers.get('Last-Event-ID'))
+    return app.response_class(stream, mimetype='text/event-stream',
+                              headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/metrics')
+def metrics_page():
+    """Counters, gauges and histograms in Prometheus text format"""
+    return app.response_class(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/search')
+def search():
+    """Type-ahead search: /search?q=<name or phone prefix>&limit=<n>"""
+    query = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+    return jsonify(query=query, results=get_search_index().search(query, limit))
+
+@app.route('/nearby')
+def nearby():
+    """Nearest services: /nearby?lat=<lat>&lon=<lon>&limit=<n>&category=<police|fire|...>"""
+    args = request.args
+    if not args.get('lat') or not args.get('lon'):
+        return jsonify(error='Give lat and lon'), 400
+    try:
+        found = nearby_services(args['lat'], args['lon'], args.get('limit'), args.get('category'))
+    except DirectoryError as exc:
+        return jsonify(error=str(exc)), 503
+    except ValueError as exc:
+        return jsonify(error=str(exc)), 400
+    return jsonify(results=[service_dict(service, km) for service, km in found])
 
 @app.route('/add', methods=['POST'])
 def add_contact():
     """Add new contact"""
     name = request.form.get('name', '').strip()
     phone = request.form.get('phone', '').strip()
+    tags = request.form.get('tags', '')
     
-    if name and phone:
-        contacts_list.append({'name': name, 'phone': phone})
+    if not name or not phone:
+        flash('⚠ ERROR: Name and phone cannot be empty!', 'danger')
+    elif not normalize_phone(phone):
+        flash(f'⚠ ERROR: {phone} is not a phone number!', 'danger')
+    elif contact_store.add(name, phone, tags) is not None:
         flash(f'✓ SUCCESS: Contact "{name}" added with phone {phone}!', 'success')
     else:
-        flash('⚠ ERROR: Name and phone cannot be empty!', 'danger')
+        flash(f'⚠ Phone {phone} is already saved!', 'warning')
     
     return redirect(url_for('home'))
 
+@app.route('/tags', methods=['POST'])
+def set_contact_tags():
+    """Save the tags typed for one contact on the contacts page"""
+    contact = contact_store.set_tags(request.form.get('contact_id', 0, type=int), request.form.get('tags', ''))
+    if contact is None:
+        flash('⚠ That contact no longer exists.', 'warning')
+    else:
+        flash(f'✓ Tags of "{contact.name}" saved: {", ".join(contact.tags) or "none"}', 'success')
+    # Only go back to a page of this site
+    back = request.form.get('next', '')
+    return redirect(back if back.startswith('/') and not back.startswith('//') else url_for('contacts'))
+
+@app.route('/api/contacts/import', methods=['POST'])
+def api_import_contacts():
+    """Bulk import: POST a CSV or NDJSON body, get a per-row report back"""
+    fmt = request.args.get('format') or detect_format(content_type=request.content_type)
+    if fmt is None:
+        return jsonify(error='Send Content-Type text/csv or application/x-ndjson, or ?format='), 415
+    try:
+        report = import_contacts(contact_store, text_stream(request.stream), fmt)
+    except (ContactImportError, UnicodeDecodeError) as exc:
+        return jsonify(error=str(exc)), 400
+    return jsonify(report.to_dict())
+
 @app.route('/add_indian', methods=['POST'])
 def add_indian_contacts():
-    """Add Indian emergency contacts"""
-    count = 0
-    for contact in indian_emergency_contacts:
-        if contact not in contacts_list:
-            contacts_list.append(contact)
-            count += 1
+    """Add Indian emergency contacts (the default preset pack)"""
+    _, count = load_pack(contact_store)
     
     flash(f'✓ Added {count} Indian emergency contacts!', 'success')
     return redirect(url_for('home'))
 
+@app.route('/add_preset', methods=['POST'])
+def add_preset_contacts():
+    """Add every contact of one preset pack"""
+    try:
+        pack, count = load_pack(contact_store, request.form.get('pack', '').strip())
+    except KeyError:
+        flash('⚠ Unknown preset list!', 'danger')
+        return redirect(url_for('home'))
+    
+    flash(f'✓ Added {count} contacts from {pack.title}!', 'success')
+    return redirect(url_for('home'))
+
+@app.route('/add_nearby', methods=['POST'])
+def add_nearby_contacts():
+    """Quick Add the services nearest to the location in the form"""
+    form = request.form
+    try:
+        found = nearby_services(form.get('lat', '').strip(), form.get('lon', '').strip(),
+                                form.get('limit'), form.get('category'))
+    except (ValueError, DirectoryError) as exc:
+        flash(f'⚠ {exc}', 'danger')
+        return redirect(url_for('home'))
+    if not found:
+        flash('⚠ Enter your location (latitude and longitude) first!', 'warning')
+        return redirect(url_for('home'))
+    count = contact_store.add_many({'name': service.name, 'phone': service.phone} for service, _ in found)
+    nearest = found[0][0]
+    flash(f'✓ Added {count} of the {len(found)} nearest services '
+          f'(closest: {nearest.name}, {found[0][1]:.1f} km)!', 'success')
+    return redirect(url_for('home'))
+
 if __name__ == '__main__':
     print("="*50)
     print("  🚨 Emergency Contact App Starting...")
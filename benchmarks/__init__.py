@@ -0,0 +1,16 @@
+"""
+Emergency Contact Application - Benchmarks
+==========================================
+Scripts that measure speed and memory. Run them from the project
+folder:
+
+    python -m benchmarks                  # the main suite (see suite.py)
+    python -m benchmarks.memory           # dicts vs Contact records
+    python -m benchmarks.stress_store     # concurrent writers
+    python -m benchmarks.sse_subscribers  # many /events clients
+    python -m benchmarks.cold_start       # console program on a 10^6 snapshot
+    python -m benchmarks.nearest          # nearest services in a big directory
+    python -m benchmarks.selectors        # tag selectors over 10^6 contacts
+    python -m benchmarks.alert_priority   # 112 first in long alerts
+    python -m benchmarks.alert_batching   # gateway round trips per alert
+"""
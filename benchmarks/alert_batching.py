@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Gateway round trips with coalescing and bulk sends
+==================================================
+Sends one alert through the StubGateway to N contacts of which a share
+repeat an earlier number in another format ("+91 98765 43210" next to
+"9876543210"), once per batch size, and reports gateway requests,
+messages sent and the time the whole alert took. A naive fan-out makes
+one request per entry.
+
+Run from the project folder (exits with status 1 if any number is
+messaged twice or any entry is left without a result):
+    python -m benchmarks.alert_batching
+    python -m benchmarks.alert_batching --contacts 200000 --batch-sizes 1 100 1000
+"""
+
+import argparse
+import random
+import sys
+from collections import Counter
+
+from alerts import AlertEngine, StubGateway
+from phone_numbers import normalize_phone
+
+
+def make_contacts(count, duplicates, rng):
+    contacts = []
+    for i in range(count):
+        if contacts and rng.random() < duplicates:
+            # The same number as an earlier contact, written another way
+            earlier = rng.choice(contacts)['phone']
+            contacts.append({'name': f'Contact {i}', 'phone': '+91 ' + earlier[-10:-5] + ' ' + earlier[-5:]})
+        else:
+            contacts.append({'name': f'Contact {i}', 'phone': f'9{i:09d}'})
+    return contacts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Count gateway round trips of one alert')
+    parser.add_argument('--contacts', type=int, default=50000, help='entries in the alert (default 50,000)')
+    parser.add_argument('--duplicates', type=float, default=0.1,
+                        help='share of entries repeating an earlier number (default 0.1)')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 10, 100, 500],
+                        help='contacts per gateway request (default 1 10 100 500)')
+    parser.add_argument('--concurrency', type=int, default=50, help='requests in flight (default 50)')
+    args = parser.parse_args(argv)
+
+    contacts = make_contacts(args.contacts, args.duplicates, random.Random(42))
+    numbers = len({normalize_phone(contact['phone']) for contact in contacts})
+    print(f'{len(contacts)} entries, {numbers} different numbers; a naive fan-out makes {len(contacts)} requests')
+    print(f"{'batch':>6} {'requests':>9} {'messages':>9} {'shared':>7} {'alert took':>11}")
+
+    wrong = False
+    for batch_size in args.batch_sizes:
+        gateway = StubGateway(seed=7)
+        engine = AlertEngine(gateway, concurrency=args.concurrency, batch_size=batch_size)
+        report = engine.send_alert(contacts)
+        repeated = [key for key, count in Counter(normalize_phone(phone) for phone, _ in gateway.sent).items()
+                    if count > 1]
+        if repeated or len(report.results) != len(contacts) or report.messages != numbers:
+            print(f'WRONG at batch size {batch_size}: {len(repeated)} numbers messaged twice, '
+                  f'{len(report.results)} results, {report.messages} messages')
+            wrong = True
+        print(f'{batch_size:>6} {gateway.requests:>9} {report.messages:>9} {report.coalesced:>7} '
+              f'{report.total_seconds:10.2f}s')
+    return 1 if wrong else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Delivery time of the critical tier in long alerts
+=================================================
+Sends an alert through the StubGateway to N personal contacts with the
+national emergency numbers (112, 100, 101, 102, 108) saved LAST, and
+reports when the last of them was reached: once in list order and
+once with the AlertScheduler. Also times building the scheduler.
+
+Run from the project folder (exits with status 1 if the scheduler does
+not hand out every critical number before any normal contact):
+    python -m benchmarks.alert_priority
+    python -m benchmarks.alert_priority --sizes 1000 100000 --concurrency 100
+"""
+
+import argparse
+import sys
+import time
+
+from alert_scheduler import CRITICAL, EMERGENCY_NUMBERS, NORMAL, AlertScheduler
+from alerts import AlertEngine, StubGateway
+
+
+def make_contacts(count):
+    contacts = [{'name': f'Contact {i}', 'phone': f'9{i:09d}'} for i in range(count)]
+    contacts += [{'name': f'Emergency {number}', 'phone': number} for number in sorted(EMERGENCY_NUMBERS)]
+    return contacts
+
+
+def run(contacts, prioritize, concurrency, latency):
+    engine = AlertEngine(StubGateway(latency=latency, seed=7), concurrency=concurrency, prioritize=prioritize)
+    report = engine.send_alert(contacts)
+    critical = [result.seconds for result in report.results if result.contact['phone'] in EMERGENCY_NUMBERS]
+    return max(critical), report.time_to_last
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the critical tier of long alerts')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='personal contacts per alert (default 1,000 10,000 100,000)')
+    parser.add_argument('--concurrency', type=int, default=50, help='sends in flight (default 50)')
+    parser.add_argument('--latency', type=float, nargs=2, default=(0.001, 0.005),
+                        metavar=('MIN', 'MAX'), help='stub gateway seconds per send (default 0.001 0.005)')
+    args = parser.parse_args(argv)
+
+    failed = False
+    print(f"{'contacts':>9} {'build':>9} {'critical, list order':>21} {'critical, scheduled':>20} {'whole alert':>12}")
+    for size in args.sizes:
+        contacts = make_contacts(size)
+
+        started = time.perf_counter()
+        scheduler = AlertScheduler.for_contacts(contacts)
+        build = time.perf_counter() - started
+        first = [scheduler.pop()[1] for _ in EMERGENCY_NUMBERS]
+        if first != [CRITICAL] * len(EMERGENCY_NUMBERS) or scheduler.waiting()[NORMAL] != size:
+            print(f'WRONG order for {size} contacts: first turns {first}, waiting {scheduler.waiting()}')
+            failed = True
+
+        in_order, _ = run(contacts, False, args.concurrency, args.latency)
+        scheduled, whole = run(contacts, True, args.concurrency, args.latency)
+        print(f'{size:>9} {build * 1e3:7.1f}ms {in_order * 1e3:19.1f}ms '
+              f'{scheduled * 1e3:18.1f}ms {whole:11.2f}s')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
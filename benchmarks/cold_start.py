@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Cold start of the console program on a large snapshot
+=====================================================
+Writes a snapshot file of N contacts, then starts the console program
+on it again and again (a new Python process each time) and reports how
+long a command takes, next to how long Python itself takes to start.
+
+Run from the project folder (exits with status 1 over the budget):
+    python -m benchmarks.cold_start                 # 10^6 contacts
+    python -m benchmarks.cold_start --contacts 100000
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from contact_snapshot import encode_record, write_snapshot
+from phone_numbers import normalize_phone
+
+# Time the program may add to Python's own startup, in milliseconds
+BUDGET_MS = 100.0
+
+PROGRAM = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       'emergency_contact_app.py')
+
+
+def build(path, count):
+    phones = [f'9{i:09d}' for i in range(count)]
+    records = [(i + 1, encode_record(i + 1, f'Contact {i}', phone)) for i, phone in enumerate(phones)]
+    keys = sorted((normalize_phone(phone), i) for i, phone in enumerate(phones))
+    write_snapshot(path, records, keys, count + 1)
+
+
+def best_ms(command, runs):
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        ms = (time.perf_counter() - started) * 1000
+        best = ms if best is None else min(best, ms)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the console program starting on a big snapshot')
+    parser.add_argument('--contacts', type=int, default=10 ** 6, help='contacts in the snapshot (default 10^6)')
+    parser.add_argument('--runs', type=int, default=10, help='starts per command; the best counts (default 10)')
+    parser.add_argument('--budget', type=float, default=BUDGET_MS,
+                        help=f'allowed milliseconds on top of Python startup (default {BUDGET_MS:g})')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'cold.snap')
+        started = time.perf_counter()
+        build(path, args.contacts)
+        print(f'wrote {args.contacts} contacts ({os.path.getsize(path) / 1e6:.1f} MB) '
+              f'in {time.perf_counter() - started:.1f}s')
+
+        store = ['--store', f'snapshot:{path}']
+        python = best_ms([sys.executable, '-c', 'pass'], args.runs)
+        print(f"{'python -c pass':<40} {python:8.1f} ms")
+        # Adding numbers that are already saved is a lookup by phone
+        batch = os.path.join(folder, 'batch.txt')
+        with open(batch, 'w', encoding='utf-8') as f:
+            f.write('add Again 9000000000\nadd Again 9000999999\n')
+        commands = {
+            'list --limit 10': ['list', '--limit', '10', '--format', 'csv'],
+            'add (one new contact)': ['add', 'Cold Start', '8000000000'],
+            'batch (two duplicate adds)': ['batch', batch],
+        }
+        worst = 0.0
+        for label, command in commands.items():
+            ms = best_ms([sys.executable, PROGRAM] + store + command, args.runs)
+            worst = max(worst, ms - python)
+            print(f'{label:<40} {ms:8.1f} ms   (+{ms - python:.1f} ms over Python)')
+
+    if worst > args.budget:
+        print(f'slower than the budget of {args.budget:g} ms')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
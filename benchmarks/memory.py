@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark: list of dicts vs Contact records
+==================================================
+Builds N contacts both ways and reports the memory each one takes,
+measured with tracemalloc.
+
+Run from the project folder:
+    python -m benchmarks.memory                 # 10^4, 10^5 and 10^6 contacts
+    python -m benchmarks.memory 10000 250000    # your own sizes
+"""
+
+import gc
+import sys
+import tracemalloc
+
+from contact_store import Contact, ContactStore
+
+SIZES = (10 ** 4, 10 ** 5, 10 ** 6)
+
+
+def make_rows(n):
+    """Name and phone strings shared by both layouts, so only the containers differ"""
+    return [(f'Contact {i}', f'98{i:08d}') for i in range(n)]
+
+
+def measure(build):
+    """Bytes still allocated after build() returns (the result is kept alive)"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def build_dicts(rows):
+    return [{'id': i, 'name': name, 'phone': phone} for i, (name, phone) in enumerate(rows, 1)]
+
+
+def build_contacts(rows):
+    return [Contact(i, name, phone) for i, (name, phone) in enumerate(rows, 1)]
+
+
+def build_store(rows):
+    # The whole store: Contact records plus the id and phone indexes
+    return ContactStore([{'name': name, 'phone': phone} for name, phone in rows])
+
+
+def main(argv=None):
+    sizes = [int(arg) for arg in (argv or sys.argv[1:])] or SIZES
+    print(f"{'contacts':>10} {'dicts':>10} {'Contact':>10} {'saved':>7} {'store':>10}")
+    for n in sizes:
+        rows = make_rows(n)
+        dicts = measure(lambda: build_dicts(rows))
+        records = measure(lambda: build_contacts(rows))
+        store = measure(lambda: build_store(rows))
+        saved = 1 - records / dicts
+        print(f'{n:>10} {dicts / 2**20:>8.1f}MB {records / 2**20:>8.1f}MB {saved:>6.0%} {store / 2**20:>8.1f}MB')
+
+
+if __name__ == '__main__':
+    main()
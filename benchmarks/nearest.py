@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Nearest-service lookup in a large regional directory
+====================================================
+Builds a made-up directory of N services spread over India, checks the
+k-d tree against a brute-force scan and times nearest-N queries.
+
+Run from the project folder (exits with status 1 on a wrong answer):
+    python -m benchmarks.nearest                      # 50,000 services
+    python -m benchmarks.nearest --services 200000 --nearest 10
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from regional_directory import RegionalDirectory, Service, unit_vector
+
+CATEGORIES = ('police', 'fire', 'ambulance', 'hospital', 'disaster')
+
+# Roughly the mainland of India
+LAT_RANGE = (8.0, 35.0)
+LON_RANGE = (68.0, 97.0)
+
+
+def make_services(count, rng):
+    services = []
+    for i in range(count):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        services.append(Service(f'{category.title()} {i}', f'0{rng.randrange(10 ** 9, 10 ** 10)}', category,
+                                'State', 'District', 'City',
+                                rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)))
+    return services
+
+
+def brute_force(services, lat, lon, count, category=None):
+    qx, qy, qz = unit_vector(lat, lon)
+    scored = []
+    for service in services:
+        if category is not None and service.category != category:
+            continue
+        x, y, z = unit_vector(service.lat, service.lon)
+        scored.append(((x - qx) ** 2 + (y - qy) ** 2 + (z - qz) ** 2, service))
+    scored.sort(key=lambda pair: pair[0])
+    return [service for _, service in scored[:count]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time nearest-N lookups in a big regional directory')
+    parser.add_argument('--services', type=int, default=50000, help='directory size (default 50,000)')
+    parser.add_argument('--nearest', type=int, default=5, help='services per query (default 5)')
+    parser.add_argument('--queries', type=int, default=20000, help='timed queries (default 20,000)')
+    parser.add_argument('--check', type=int, default=200, help='queries checked by brute force (default 200)')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(42)
+    services = make_services(args.services, rng)
+    started = time.perf_counter()
+    directory = RegionalDirectory(services)
+    print(f'built trees for {len(directory)} services in {time.perf_counter() - started:.2f}s')
+
+    places = [(rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)) for _ in range(args.queries)]
+
+    wrong = 0
+    for lat, lon in places[:args.check]:
+        for category in (None, 'hospital'):
+            found = [service for service, _ in directory.nearest(lat, lon, args.nearest, category)]
+            if found != brute_force(services, lat, lon, args.nearest, category):
+                wrong += 1
+    print(f'checked {args.check * 2} queries against a full scan: {wrong} wrong')
+
+    for category in (None, 'hospital'):
+        started = time.perf_counter()
+        for lat, lon in places:
+            directory.nearest(lat, lon, args.nearest, category)
+        per_query = (time.perf_counter() - started) / len(places) * 1e6
+        print(f"nearest {args.nearest} ({category or 'any category'}): {per_query:.1f} us/query")
+    return 1 if wrong else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tag selectors over a large contact list
+=======================================
+Builds N made-up contacts with random tags, checks TagIndex answers
+against a plain scan with Python sets and times selector evaluation.
+
+Run from the project folder (exits with status 1 on a wrong answer):
+    python -m benchmarks.selectors                    # 1,000,000 contacts
+    python -m benchmarks.selectors --contacts 200000
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from contact_store import Contact
+from contact_tags import TagIndex
+
+# (tag, share of contacts that have it): common, medium and rare tags
+TAGS = (('family', 0.30), ('neighbours', 0.20), ('work', 0.40),
+        ('on-call', 0.05), ('doctor', 0.01), ('night-shift', 0.002))
+
+SELECTORS = (
+    'family',
+    'family OR neighbours',
+    'on-call AND NOT work',
+    'family OR neighbours AND NOT work',
+    '(family, neighbours) & !work',
+    'doctor | night-shift',
+    'NOT family',
+    'all AND NOT (work OR family)',
+)
+
+
+def make_contacts(count, rng):
+    contacts = []
+    for i in range(1, count + 1):
+        tags = tuple(sorted(tag for tag, share in TAGS if rng.random() < share))
+        contacts.append(Contact(i, f'Contact {i}', f'9{i:09d}', tags))
+    return contacts
+
+
+def scan(contacts, selector):
+    """The same selections as SELECTORS, written out with Python sets"""
+    having = {tag: {c.id for c in contacts if tag in c.tags} for tag, _ in TAGS}
+    everyone = {c.id for c in contacts}
+    return {
+        'family': having['family'],
+        'family OR neighbours': having['family'] | having['neighbours'],
+        'on-call AND NOT work': having['on-call'] - having['work'],
+        'family OR neighbours AND NOT work': having['family'] | (having['neighbours'] - having['work']),
+        '(family, neighbours) & !work': (having['family'] | having['neighbours']) - having['work'],
+        'doctor | night-shift': having['doctor'] | having['night-shift'],
+        'NOT family': everyone - having['family'],
+        'all AND NOT (work OR family)': everyone - having['work'] - having['family'],
+    }[selector]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time tag selectors over a big contact list')
+    parser.add_argument('--contacts', type=int, default=1000000, help='contacts (default 1,000,000)')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per selector (default 20)')
+    args = parser.parse_args(argv)
+
+    contacts = make_contacts(args.contacts, random.Random(42))
+    started = time.perf_counter()
+    index = TagIndex(contacts)
+    print(f'indexed {len(index)} contacts in {time.perf_counter() - started:.2f}s')
+
+    wrong = 0
+    for selector in SELECTORS:
+        expected = scan(contacts, selector)
+        found = index.ids(selector)
+        if set(found) != expected:
+            wrong += 1
+            print(f'WRONG: {selector}')
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            matched = index.ids(selector)
+        per_run = (time.perf_counter() - started) / args.repeat * 1e6
+        print(f'{selector:36} {len(matched):>9} contacts  {per_run:10.1f} us')
+    # For comparison: the same kind of question answered by looking at every contact
+    started = time.perf_counter()
+    found = [c for c in contacts if ('family' in c.tags or 'neighbours' in c.tags) and 'work' not in c.tags]
+    print(f'full scan for "(family, neighbours) & !work": {(time.perf_counter() - started) * 1e6:.1f} us')
+    print(f'checked {len(SELECTORS)} selectors against a full scan: {wrong} wrong')
+    return 1 if wrong else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Harness: many subscribers on the /events feed
+=============================================
+Starts the Flask app in a separate process (threaded server, in-memory
+stores), opens many Server-Sent Events connections to it, adds contacts
+through POST /add, and checks that every subscriber received every
+contact-added event, in order, and how long the fan-out took.
+
+Run from the project folder (exits with status 1 if events went missing):
+    python -m benchmarks.sse_subscribers
+    python -m benchmarks.sse_subscribers --subscribers 2000 --events 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.parse
+import urllib.request
+
+
+class Subscriber:
+    """One /events connection, recording the contact-added events it sees"""
+
+    def __init__(self, sent_at):
+        self.sent_at = sent_at
+        self.phones = []
+        self.latencies = []
+        self.resyncs = 0
+        self.connected = asyncio.Event()
+        self.writer = None
+
+    async def run(self, port):
+        reader, self.writer = await asyncio.open_connection('127.0.0.1', port)
+        # HTTP/1.0 keeps the body plain (no chunked encoding) until the server closes it
+        self.writer.write(b'GET /events HTTP/1.0\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n')
+        await self.writer.drain()
+        # Headers arrive with the first chunk, once the feed knows this client
+        await reader.readuntil(b'\r\n\r\n')
+        self.connected.set()
+        event = None
+        async for raw in reader:
+            line = raw.decode().rstrip('\n')
+            if line.startswith('event: '):
+                event = line[7:]
+            elif line.startswith('data: ') and event == 'contact-added':
+                phone = json.loads(line[6:])['phone']
+                self.latencies.append(time.perf_counter() - self.sent_at[phone])
+                self.phones.append(phone)
+            elif line.startswith('data: ') and event == 'resync':
+                self.resyncs += 1
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def add_contact(port, name, phone):
+    data = urllib.parse.urlencode({'name': name, 'phone': phone}).encode()
+    request = urllib.request.Request(f'http://127.0.0.1:{port}/add', data=data)
+    # The redirect back to / is followed too, which keeps the test honest
+    with urllib.request.urlopen(request) as response:
+        response.read()
+
+
+async def main_async(args, port):
+    sent_at = {}
+    subscribers = [Subscriber(sent_at) for _ in range(args.subscribers)]
+
+    started = time.perf_counter()
+    tasks = []
+    for subscriber in subscribers:
+        tasks.append(asyncio.create_task(subscriber.run(port)))
+        await asyncio.sleep(0)   # let connections open gradually
+    try:
+        await asyncio.wait_for(asyncio.gather(*(s.connected.wait() for s in subscribers)), args.timeout)
+    except asyncio.TimeoutError:
+        connected = sum(s.connected.is_set() for s in subscribers)
+        print(f'only {connected} of {args.subscribers} subscribers connected')
+        return 1
+    print(f'{args.subscribers} subscribers connected in {time.perf_counter() - started:.2f}s')
+
+    phones = [f'98{i:08d}' for i in range(args.events)]
+
+    def add_contacts():
+        for i, phone in enumerate(phones):
+            sent_at[phone] = time.perf_counter()
+            add_contact(port, f'Harness {i}', phone)
+            time.sleep(args.interval)
+
+    started = time.perf_counter()
+    await asyncio.to_thread(add_contacts)
+    while any(len(subscriber.phones) < args.events for subscriber in subscribers):
+        await asyncio.sleep(0.05)
+        if time.perf_counter() - started > args.timeout:
+            break
+    seconds = time.perf_counter() - started
+
+    for subscriber in subscribers:
+        subscriber.close()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    complete = sum(subscriber.phones == phones for subscriber in subscribers)
+    latencies = [latency for subscriber in subscribers for latency in subscriber.latencies]
+    resyncs = sum(subscriber.resyncs for subscriber in subscribers)
+    print(f'{args.events} events x {args.subscribers} subscribers '
+          f'= {len(latencies)} deliveries in {seconds:.2f}s')
+    print(f'complete and in order: {complete}/{args.subscribers}   resyncs: {resyncs}')
+    print(f'latency p50 {percentile(latencies, 0.5) * 1000:.1f}ms  '
+          f'p99 {percentile(latencies, 0.99) * 1000:.1f}ms  '
+          f'max {max(latencies, default=0) * 1000:.1f}ms')
+    return 0 if complete == args.subscribers else 1
+
+
+def serve(backlog):
+    """Run the app on a free port and print the port (the --serve child process)"""
+    import logging
+    from werkzeug.serving import make_server
+
+    os.environ['CONTACT_STORE'] = 'memory'
+    os.environ['ALERT_QUEUE'] = 'memory'
+    import app as web
+
+    # One access-log line per connection would drown the results
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, web.app, threaded=True)
+    # Each connection gets a server thread; the default listen backlog is too small
+    server.socket.listen(backlog)
+    print(server.server_port, flush=True)
+    server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate many /events subscribers')
+    parser.add_argument('--subscribers', type=int, default=500, help='open connections (default 500)')
+    parser.add_argument('--events', type=int, default=100, help='contacts to add (default 100)')
+    parser.add_argument('--interval', type=float, default=0.01, help='seconds between adds (default 0.01)')
+    parser.add_argument('--timeout', type=float, default=60.0, help='give up after this many seconds')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        return serve(args.subscribers)
+    # The server gets its own process, so the clients do not compete with it for the GIL
+    server = subprocess.Popen([sys.executable, '-m', 'benchmarks.sse_subscribers', '--serve',
+                               '--subscribers', str(args.subscribers)],
+                              stdout=subprocess.PIPE, text=True)
+    try:
+        port = int(server.stdout.readline())
+        return asyncio.run(main_async(args, port))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Stress test: many threads writing to one contact store
+======================================================
+Starts writer threads that all add the SAME shared numbers (in different
+orders and spellings) plus numbers of their own, while reader threads
+page through and search the store. Afterwards it checks that:
+
+- every shared number was saved exactly once (no duplicates)
+- every thread's own numbers were all saved (no lost inserts)
+- ids are unique and the id order used for paging is intact
+- readers never crashed or saw a half-added contact
+
+Run from the project folder (exits with status 1 if a check fails):
+    python -m benchmarks.stress_store
+    python -m benchmarks.stress_store --store sqlite:/tmp/stress.db --threads 16
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from contact_store import open_store
+from phone_numbers import normalize_phone
+
+# The same number written three ways; all must count as one contact
+SPELLINGS = ('98{:08d}', '+91 98{:08d}', '098{:08d}')
+
+
+def writer(store, worker, shared, own, barrier, added):
+    rng = random.Random(worker)
+    numbers = list(range(shared))
+    rng.shuffle(numbers)
+    barrier.wait()
+    count = 0
+    for i in numbers:
+        spelling = SPELLINGS[(i + worker) % len(SPELLINGS)]
+        if store.add(f'Shared {i}', spelling.format(i)) is not None:
+            count += 1
+    # Own numbers live in a range no other thread uses
+    batch = [{'name': f'Worker {worker} #{i}', 'phone': f'7{worker:03d}{i:06d}'} for i in range(own)]
+    count += store.add_many(batch)
+    added[worker] = count
+
+
+def reader(store, stop, problems):
+    while not stop.is_set():
+        try:
+            after = 0
+            while True:
+                page = store.page(after, 500)
+                if not page:
+                    break
+                ids = [contact['id'] for contact in page]
+                if ids != sorted(ids) or ids[0] <= after:
+                    problems.append(f'page after {after} out of order')
+                    return
+                if any(not contact['name'] or not contact['phone'] for contact in page):
+                    problems.append('reader saw an incomplete contact')
+                    return
+                after = ids[-1]
+            len(store)
+            store.find_by_phone('9800000001')
+        except Exception as exc:    # anything at all is a failure here
+            problems.append(f'reader crashed: {exc!r}')
+            return
+
+
+def check(store, threads, shared, own, added):
+    problems = []
+    contacts = list(store)
+    expected = shared + threads * own
+    if len(contacts) != expected:
+        problems.append(f'{len(contacts)} contacts saved, expected {expected}')
+    if len(store) != len(contacts):
+        problems.append(f'len(store) is {len(store)} but iteration gave {len(contacts)}')
+    if sum(added.values()) != expected:
+        problems.append(f'add() reported {sum(added.values())} new contacts, expected {expected}')
+    keys = [normalize_phone(contact['phone']) for contact in contacts]
+    if len(set(keys)) != len(keys):
+        problems.append(f'{len(keys) - len(set(keys))} duplicated phone numbers')
+    ids = [contact['id'] for contact in contacts]
+    if len(set(ids)) != len(ids):
+        problems.append(f'{len(ids) - len(set(ids))} duplicated ids')
+    paged = []
+    after = 0
+    while True:
+        page = store.page(after, 1000)
+        if not page:
+            break
+        paged.extend(contact['id'] for contact in page)
+        after = page[-1]['id']
+    if paged != sorted(ids):
+        problems.append('paging does not return every id exactly once, in order')
+    return problems
+
+
+def run(spec, threads, readers, shared, own):
+    store = open_store(spec)
+    added = {}
+    problems = []
+    barrier = threading.Barrier(threads)
+    stop = threading.Event()
+    workers = [threading.Thread(target=writer, args=(store, n, shared, own, barrier, added))
+               for n in range(threads)]
+    watchers = [threading.Thread(target=reader, args=(store, stop, problems)) for _ in range(readers)]
+    started = time.perf_counter()
+    for thread in watchers + workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    seconds = time.perf_counter() - started
+    stop.set()
+    for thread in watchers:
+        thread.join()
+    problems += check(store, threads, shared, own, added)
+    if hasattr(store, 'close'):
+        store.close()
+    return seconds, problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Concurrent add/read stress test for a contact store')
+    parser.add_argument('--store', action='append',
+                        help='store spec to test (repeatable); default: memory, sqlite and journal in a temp folder')
+    parser.add_argument('--threads', type=int, default=8, help='writer threads (default 8)')
+    parser.add_argument('--readers', type=int, default=2, help='reader threads (default 2)')
+    parser.add_argument('--shared', type=int, default=2000, help='numbers every writer tries to add')
+    parser.add_argument('--own', type=int, default=2000, help='numbers only one writer adds')
+    args = parser.parse_args(argv)
+
+    folder = tempfile.mkdtemp(prefix='contact-stress-')
+    specs = args.store or ['memory', f'sqlite:{os.path.join(folder, "stress.db")}',
+                           f'journal:{os.path.join(folder, "journal")}']
+    failed = False
+    try:
+        for spec in specs:
+            seconds, problems = run(spec, args.threads, args.readers, args.shared, args.own)
+            attempts = args.threads * (args.shared + args.own)
+            verdict = 'FAIL' if problems else 'ok'
+            print(f'{spec:<45} {verdict:<4} {attempts} adds in {seconds:.2f}s')
+            for problem in problems:
+                print(f'    - {problem}')
+            failed = failed or bool(problems)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
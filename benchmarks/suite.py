@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite
+===============
+One command that times the paths a change is most likely to slow down:
+
+- store:  add (new number), lookup (find_by_phone) and dedupe (adding a
+          number that is already saved) on stores of 10^2 ... 10^6 contacts
+- routes: /, /contacts, /emergency and POST /add through Flask's test client
+- cli:    view_contacts() printing the whole list (output thrown away)
+
+Results are written as JSON. Give --baseline an earlier results file to
+see what got faster or slower; the exit status is 1 when something is
+slower than the baseline by more than --threshold.
+
+Run from the project folder:
+    python -m benchmarks                        # full run, writes benchmarks/results.json
+    python -m benchmarks --quick                # sizes up to 10^4 only
+    python -m benchmarks --baseline old.json    # compare against a saved run
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+SIZES = (10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+QUICK_SIZES = (10 ** 2, 10 ** 3, 10 ** 4)
+
+# Store operations timed per round, and rounds per measurement (best one counts)
+OPS = 1000
+ROUNDS = 5
+
+# Stores up to this size are filled several times, so add_many is timed like the rest
+REFILL_MAX_SIZE = 10 ** 4
+
+# Contacts in the web app's store while its routes are timed, and requests per route
+ROUTE_CONTACTS = 10 ** 4
+ROUTE_REQUESTS = 500
+
+# view_contacts() prints five lines per contact, so it stops at this size
+CLI_MAX_SIZE = 10 ** 5
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(__file__), 'results.json')
+
+# Slower than the baseline by more than this share counts as a regression
+THRESHOLD = 0.25
+
+
+def phone(i):
+    """A distinct 10-digit mobile number for contact i"""
+    return f'9{i:09d}'
+
+
+def contacts(start, count):
+    return [{'name': f'Contact {i}', 'phone': phone(i)} for i in range(start, start + count)]
+
+
+def best_per_op(run, rounds=ROUNDS):
+    """Microseconds per operation, best of `rounds`; run(round) returns how many ops it did"""
+    best = None
+    gc.collect()
+    gc.disable()   # a collection in the middle of one round is pure noise
+    try:
+        for round_number in range(rounds):
+            started = time.perf_counter()
+            ops = run(round_number)
+            per_op = (time.perf_counter() - started) / max(ops, 1) * 1e6
+            best = per_op if best is None else min(best, per_op)
+    finally:
+        gc.enable()
+    return best
+
+
+# ------------------------------------------------------------------- store
+
+def bench_store(spec, size, folder):
+    """Time add, lookup and dedupe on a `spec` store already holding `size` contacts"""
+    from contact_store import open_store
+
+    def new_store():
+        if spec != 'sqlite':
+            return open_store(spec)
+        path = os.path.join(folder, f'bench-{size}.db')
+        for suffix in ('', '-wal', '-shm'):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path + suffix)
+        return open_store(f'sqlite:{path}')
+
+    rows = contacts(0, size)
+    store = None
+
+    def fill(round_number):
+        nonlocal store
+        if store is not None and hasattr(store, 'close'):
+            store.close()
+        store = new_store()
+        return store.add_many(rows)
+
+    fill_time = best_per_op(fill, ROUNDS if size <= REFILL_MAX_SIZE else 1)
+
+    ops = min(OPS, size)
+
+    def add(round_number):
+        first = size + round_number * ops
+        for i in range(first, first + ops):
+            store.add(f'New {i}', phone(i))
+        return ops
+
+    def lookup(round_number):
+        step = max(size // ops, 1)
+        for i in range(0, size, step)[:ops]:
+            store.find_by_phone(phone(i))
+        return ops
+
+    def dedupe(round_number):
+        # The same numbers written another way, so normalizing is part of the work
+        step = max(size // ops, 1)
+        for i in range(0, size, step)[:ops]:
+            store.add('Again', '+91 ' + phone(i))
+        return ops
+
+    results = {
+        'add_many': fill_time,
+        'add': best_per_op(add),
+        'lookup': best_per_op(lookup),
+        'dedupe': best_per_op(dedupe),
+    }
+    if hasattr(store, 'close'):
+        store.close()
+    return {f'store.{spec}.{op}.n={size}': {'value': value, 'unit': 'us/op'}
+            for op, value in results.items()}
+
+
+# ------------------------------------------------------------------ routes
+
+def bench_routes(size, requests):
+    """Latency of the main pages through the Flask test client"""
+    os.environ['CONTACT_STORE'] = 'memory'
+    os.environ['ALERT_QUEUE'] = 'memory'
+    import app as web
+
+    web.contact_store.clear()
+    web.contact_store.add_many(contacts(0, size))
+
+    def timed(call):
+        samples = []
+        for i in range(requests):
+            started = time.perf_counter()
+            response = call(i)
+            samples.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise RuntimeError(f'benchmark request failed with {response.status_code}')
+        return samples
+
+    client = web.app.test_client()
+    add_client = web.app.test_client()   # its flashed messages stay out of the GET pages
+    routes = {
+        'GET /': lambda i: client.get('/'),
+        'GET /contacts': lambda i: client.get('/contacts'),
+        'GET /emergency': lambda i: client.get('/emergency'),
+        'POST /add': lambda i: add_client.post('/add', data={'name': f'Route {i}',
+                                                             'phone': phone(size + i)}),
+    }
+    results = {}
+    for route, call in routes.items():
+        call(-1)   # warm up (first render, caches)
+        gc.collect()
+        samples = timed(call)
+        samples.sort()
+        results[f'route.{route}.p50.n={size}'] = {'value': statistics.median(samples), 'unit': 'ms'}
+        results[f'route.{route}.p95.n={size}'] = {'value': samples[int(len(samples) * 0.95) - 1],
+                                                  'unit': 'ms'}
+    web.contact_store.clear()
+    return results
+
+
+# --------------------------------------------------------------------- cli
+
+def bench_cli(size):
+    """Time the console program's view_contacts() for `size` contacts"""
+    import emergency_contact_app as cli
+    from contact_store import ContactStore
+
+    saved = cli.contact_store
+    cli.contact_store = ContactStore(contacts(0, size))
+    try:
+        with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+            seconds = best_per_op(lambda round_number: cli.view_contacts() or 1) / 1e6
+    finally:
+        cli.contact_store = saved
+    return {f'cli.view_contacts.n={size}': {'value': seconds * 1000, 'unit': 'ms'}}
+
+
+# ------------------------------------------------------------- comparison
+
+def compare(results, baseline, threshold):
+    """Print each metric next to the baseline; return the names that got slower"""
+    regressions = []
+    print(f"\n{'metric':<45} {'baseline':>12} {'now':>12} {'change':>8}")
+    for name, metric in results.items():
+        old = baseline.get(name)
+        if old is None:
+            print(f"{name:<45} {'-':>12} {metric['value']:>12.2f} {'new':>8}")
+            continue
+        change = metric['value'] / old['value'] - 1 if old['value'] else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  SLOWER'
+            regressions.append(name)
+        elif change < -threshold:
+            flag = '  faster'
+        print(f"{name:<45} {old['value']:>12.2f} {metric['value']:>12.2f} {change:>+7.0%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='Benchmark stores, web routes and the CLI')
+    parser.add_argument('--quick', action='store_true', help='only sizes up to 10^4')
+    parser.add_argument('--sizes', type=int, nargs='+', help='store sizes to test (overrides --quick)')
+    parser.add_argument('--stores', default='memory,sqlite', help='comma-separated: memory, sqlite')
+    parser.add_argument('--only', choices=('store', 'routes', 'cli'), action='append',
+                        help='run only these groups (repeatable)')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='where to write the JSON results')
+    parser.add_argument('--baseline', help='earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='slowdown that counts as a regression (default 0.25 = 25%%)')
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes or (QUICK_SIZES if args.quick else SIZES)
+    groups = args.only or ['store', 'routes', 'cli']
+    folder = os.path.dirname(os.path.abspath(args.output))
+    os.makedirs(folder, exist_ok=True)
+
+    results = {}
+
+    def record(new):
+        for name, metric in new.items():
+            print(f"{name:<45} {metric['value']:>12.2f} {metric['unit']}", flush=True)
+        results.update(new)
+
+    if 'store' in groups:
+        for spec in args.stores.split(','):
+            for size in sizes:
+                record(bench_store(spec.strip(), size, folder))
+    if 'routes' in groups:
+        record(bench_routes(min(ROUTE_CONTACTS, max(sizes)), ROUTE_REQUESTS))
+    if 'cli' in groups:
+        for size in sizes:
+            if size <= CLI_MAX_SIZE:
+                record(bench_cli(size))
+
+    report = {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sizes': list(sizes),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nResults written to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} metric(s) slower than the baseline by more than {args.threshold:.0%}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
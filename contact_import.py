@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Emergency Contact Application - Bulk Import
+===========================================
+Adds a whole file of contacts at once (for example a department list).
+
+Two file formats are understood:
+
+- CSV with a header row containing "name" and "phone" columns
+  (and optionally "tags", e.g. "family;neighbours")
+- NDJSON: one JSON object per line, e.g. {"name": "Asha", "phone": "98765 43210"}
+  (and optionally "tags": ["family", "neighbours"])
+
+The file is read line by line, so memory use stays the same for ten
+contacts or ten million. Valid rows are saved in batches (one
+transaction per batch), and every rejected row is listed in the
+ImportReport with its line number and the reason.
+"""
+
+import csv
+import io
+import json
+
+from contact_tags import normalize_tags
+from phone_numbers import normalize_many, normalize_phone
+
+# Rows saved per store transaction
+BATCH_SIZE = 5000
+
+# Longest name we accept
+MAX_NAME_LENGTH = 200
+
+# Only this many row errors are kept in the report (all are counted)
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = ('csv', 'ndjson')
+
+
+class ContactImportError(ValueError):
+    """The import file cannot be read at all (bad format, missing columns)"""
+
+
+class ImportReport:
+    """Summary of one import run"""
+
+    def __init__(self):
+        self.rows = 0
+        self.added = 0
+        self.duplicates = 0
+        self.error_count = 0
+        self.errors = []   # (line number, message), at most MAX_REPORTED_ERRORS
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'added': self.added,
+            'duplicates': self.duplicates,
+            'error_count': self.error_count,
+            'errors': [{'line': line, 'error': message} for line, message in self.errors],
+        }
+
+
+def detect_format(filename=None, content_type=None):
+    """Guess 'csv' or 'ndjson' from a file name or a Content-Type header"""
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in ('text/csv', 'application/csv'):
+        return 'csv'
+    if content_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+        return 'ndjson'
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return None
+
+
+def iter_csv(lines):
+    """Yield (line number, row dictionary or None, error or None) from CSV text"""
+    reader = csv.DictReader(lines)
+    fields = [field.strip().lower() for field in (reader.fieldnames or [])]
+    if 'name' not in fields or 'phone' not in fields:
+        raise ContactImportError('CSV header must contain "name" and "phone" columns')
+    reader.fieldnames = fields
+    for row in reader:
+        yield reader.line_num, row, None
+
+
+def iter_ndjson(lines):
+    """Yield (line number, row dictionary or None, error or None) from NDJSON text"""
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield number, None, f'Invalid JSON: {exc}'
+            continue
+        if not isinstance(row, dict):
+            yield number, None, 'Each line must be a JSON object'
+            continue
+        yield number, row, None
+
+
+def clean_row(row):
+    """Return a {"name", "phone", "tags"} contact from a raw row, or raise ValueError"""
+    name = str(row.get('name') or '').strip()
+    phone = str(row.get('phone') or '').strip()
+    if not name:
+        raise ValueError('Name cannot be empty')
+    if len(name) > MAX_NAME_LENGTH:
+        raise ValueError(f'Name is longer than {MAX_NAME_LENGTH} characters')
+    if not phone:
+        raise ValueError('Phone number cannot be empty')
+    if not normalize_phone(phone):
+        raise ValueError(f'{phone} is not a phone number')
+    tags = row.get('tags')
+    if tags and not isinstance(tags, (str, list, tuple)):
+        raise ValueError('Tags must be text or a list')
+    return {'name': name, 'phone': phone, 'tags': normalize_tags(tags)}
+
+
+def import_contacts(store, stream, fmt, batch_size=BATCH_SIZE):
+    """
+    Import contacts from a text stream into `store`.
+
+    `fmt` is 'csv' or 'ndjson'. Returns an ImportReport.
+    """
+    if fmt == 'csv':
+        rows = iter_csv(stream)
+    elif fmt == 'ndjson':
+        rows = iter_ndjson(stream)
+    else:
+        raise ContactImportError(f'Unknown import format: {fmt!r} (use csv or ndjson)')
+    return import_rows(store, rows, batch_size)
+
+
+def import_rows(store, rows, batch_size=BATCH_SIZE):
+    """
+    Import (line number, row, error) triples like those of iter_csv().
+
+    Rows come from any source (the command line's batch files use this);
+    returns an ImportReport.
+    """
+    report = ImportReport()
+    batch = []
+    lines = []
+    for line, row, error in rows:
+        report.rows += 1
+        if error is None:
+            try:
+                batch.append(clean_row(row))
+                lines.append(line)
+            except ValueError as exc:
+                error = str(exc)
+        if error is not None:
+            report.error(line, error)
+        if len(batch) >= batch_size:
+            _save_batch(store, batch, lines, report)
+            batch = []
+            lines = []
+    if batch:
+        _save_batch(store, batch, lines, report)
+    return report
+
+
+def _save_batch(store, batch, lines, report):
+    # Normalize the whole batch at once; the store then finds every
+    # number already in the phone_numbers cache
+    keys = normalize_many(contact['phone'] for contact in batch)
+    valid = []
+    for contact, key, line in zip(batch, keys, lines):
+        if key:
+            valid.append(contact)
+        else:
+            report.error(line, f"Phone number {contact['phone']!r} has no digits")
+    added = store.add_many(valid)
+    report.added += added
+    report.duplicates += len(valid) - added
+
+
+def import_file(store, path, fmt=None, batch_size=BATCH_SIZE):
+    """Import a CSV or NDJSON file by path; the format is guessed from the extension if not given"""
+    fmt = fmt or detect_format(filename=path)
+    if fmt is None:
+        raise ContactImportError(f'Cannot tell the format of {path}; use a .csv or .ndjson file')
+    with open(path, encoding='utf-8', newline='') as f:
+        return import_contacts(store, f, fmt, batch_size)
+
+
+def text_stream(binary_stream):
+    """Wrap a binary stream (like a web request body) as UTF-8 text"""
+    return io.TextIOWrapper(binary_stream, encoding='utf-8', newline='')
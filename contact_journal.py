@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Emergency Contact Application - Contact Journal
+===============================================
+An append-only log of contact changes that survives a crash, built
+for bursts of writes (for example hundreds of people pressing "Add"
+during a drill).
+
+- Every change is one JSON line appended to "contacts.journal".
+- Group commit: a background writer collects all changes that arrive
+  within a short window (COMMIT_WINDOW seconds), writes them together
+  and calls fsync ONCE for the whole batch. Each caller waits until its
+  batch is on disk before it gets its answer.
+- A batch whose write or fsync fails is cut off the end of the journal
+  again before anything else is written, so a change reported as failed
+  never comes back when the journal is replayed.
+- Every SNAPSHOT_EVERY changes the full contact list is written to
+  "contacts.snapshot" and the journal starts again from empty, so
+  replaying the journal at startup never takes long.
+
+The journal belongs to one process. Use the SQLite store when several
+worker processes need to share contacts.
+"""
+
+import itertools
+import json
+import os
+import threading
+import time
+
+from contact_store import Contact, ContactStore
+from phone_numbers import normalize_phone
+
+JOURNAL_FILE = 'contacts.journal'
+SNAPSHOT_FILE = 'contacts.snapshot'
+
+# Changes arriving this close together share one fsync
+COMMIT_WINDOW = 0.002
+
+# Write a compacted snapshot after this many journal records
+SNAPSHOT_EVERY = 10000
+
+
+def _fsync_directory(directory):
+    """Make a rename inside `directory` durable (no-op where unsupported)"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class _Pending:
+    """One queued item plus the event its caller waits on"""
+
+    __slots__ = ('record', 'snapshot', 'done', 'error')
+
+    def __init__(self, record=None, snapshot=None):
+        self.record = record
+        self.snapshot = snapshot
+        self.done = threading.Event()
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+
+
+class ContactJournal:
+    """Append-only journal with group commit and compacted snapshots"""
+
+    def __init__(self, directory, commit_window=COMMIT_WINDOW):
+        self.directory = directory
+        self.commit_window = commit_window
+        self.journal_path = os.path.join(directory, JOURNAL_FILE)
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        os.makedirs(directory, exist_ok=True)
+
+        self.generation = 0
+        self.records_since_snapshot = 0
+        self._queue = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._file = None
+        self._writer = None
+        # Bytes of the journal known to be on disk, and whether anything
+        # after them still has to be cut off
+        self._good_size = 0
+        self._torn = False
+
+    def load(self):
+        """
+        Read the snapshot and replay the journal.
+
+        Returns (snapshot, records): the snapshot dictionary (or None) and
+        the journal records written after it. Call once, before append().
+        """
+        snapshot = None
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                snapshot = json.load(f)
+            self.generation = snapshot['generation']
+
+        records = []
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding='utf-8') as f:
+                lines = f.read().split('\n')
+            header = _parse_line(lines[0]) if lines else None
+            # A journal older than the snapshot is already included in it
+            if header is not None and header.get('generation') == self.generation:
+                for line in lines[1:]:
+                    record = _parse_line(line)
+                    if record is None:
+                        # A crash mid-write leaves a torn last line; stop there
+                        break
+                    records.append(record)
+
+        self.records_since_snapshot = len(records)
+        self._open_journal(truncate=not records)
+        self._writer = threading.Thread(target=self._run, name='contact-journal', daemon=True)
+        self._writer.start()
+        return snapshot, records
+
+    def _open_journal(self, truncate):
+        if self._file is not None:
+            self._file.close()
+        if truncate:
+            self._file = open(self.journal_path, 'w', encoding='utf-8')
+            self._file.write(json.dumps({'generation': self.generation}) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            _fsync_directory(self.directory)
+        else:
+            self._file = open(self.journal_path, 'a', encoding='utf-8')
+        self._good_size = os.fstat(self._file.fileno()).st_size
+        self._torn = False
+
+    def _rewind(self):
+        """Cut the journal back to its last durable record and reopen it"""
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass   # the unwritten rest of a failed batch; it is cut off below
+            self._file = None
+        with open(self.journal_path, 'r+b') as f:
+            f.truncate(self._good_size)
+            f.flush()
+            os.fsync(f.fileno())
+        self._file = open(self.journal_path, 'a', encoding='utf-8')
+        self._torn = False
+
+    def append(self, record):
+        """Queue a record and wait until it is safely on disk"""
+        self.submit(record).wait()
+
+    def submit(self, record):
+        """Queue a record without waiting; call .wait() on the result for durability"""
+        return self._enqueue(_Pending(record=record))
+
+    def snapshot(self, state):
+        """
+        Queue a compacted snapshot of `state` (a JSON-friendly dictionary).
+
+        The snapshot is written in queue order: every record submitted
+        before it goes into the old journal, every record after it into
+        the new one, so `state` must reflect exactly the earlier records.
+        """
+        return self._enqueue(_Pending(snapshot=state))
+
+    def _enqueue(self, pending):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Contact journal is closed')
+            self._queue.append(pending)
+            if pending.record is not None:
+                self.records_since_snapshot += 1
+            else:
+                self.records_since_snapshot = 0
+            self._cond.notify()
+        return pending
+
+    def close(self):
+        """Flush everything still queued and stop the writer"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._writer is not None:
+            self._writer.join()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue and self._closed:
+                    return
+            # Give other writers a moment to join this batch
+            if self.commit_window:
+                time.sleep(self.commit_window)
+            with self._cond:
+                batch, self._queue = self._queue, []
+            self._commit(batch)
+
+    def _commit(self, batch):
+        """Write a batch: records go out with one fsync, snapshots split the batch"""
+        group = []
+        for pending in batch:
+            if pending.snapshot is None:
+                group.append(pending)
+                continue
+            self._flush(group)
+            group = []
+            self._write_snapshot(pending)
+        self._flush(group)
+
+    def _flush(self, group):
+        if not group:
+            return
+        try:
+            if self._torn:
+                self._rewind()
+            self._file.write(''.join(json.dumps(p.record) + '\n' for p in group))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._good_size = os.fstat(self._file.fileno()).st_size
+        except OSError as error:
+            # Part of the batch may be in the file (or still buffered) even
+            # though its callers are told it failed: cut it off again
+            self._torn = True
+            for pending in group:
+                pending.error = error
+            try:
+                self._rewind()
+            except OSError:
+                pass   # tried again before the next batch is written
+        for pending in group:
+            pending.done.set()
+
+    def _write_snapshot(self, pending):
+        try:
+            state = dict(pending.snapshot, generation=self.generation + 1)
+            temp_path = self.snapshot_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.snapshot_path)
+            _fsync_directory(self.directory)
+            self.generation += 1
+            self._open_journal(truncate=True)
+        except OSError as error:
+            pending.error = error
+        pending.done.set()
+
+
+def _parse_line(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+class JournaledContactStore(ContactStore):
+    """In-memory ContactStore whose changes are made durable by a ContactJournal"""
+
+    def __init__(self, directory, commit_window=COMMIT_WINDOW, snapshot_every=SNAPSHOT_EVERY):
+        self.snapshot_every = snapshot_every
+        self._lock = threading.Lock()
+        super().__init__()
+        self.journal = ContactJournal(directory, commit_window=commit_window)
+        snapshot, records = self.journal.load()
+
+        self._last_id = 0
+        if snapshot is not None:
+            # Snapshots written before tags existed have three fields per contact
+            for contact_id, name, phone, *tags in snapshot['contacts']:
+                key = normalize_phone(phone)
+                # Skip numbers that only became duplicates under newer phone rules
+                if key not in self._by_phone:
+                    self._insert(Contact(contact_id, name, phone, tuple(tags[0]) if tags else ()), key)
+            self._last_id = snapshot['last_id']
+        for record in records:
+            self._last_id = max(self._last_id, self._replay(record))
+        self._next_id = itertools.count(self._last_id + 1)
+
+        # Fold the replayed journal into a fresh snapshot right away, so the
+        # next start is fast and any torn last line is dropped from disk
+        if records:
+            self.compact()
+
+    def _replay(self, record):
+        op = record['op']
+        if op == 'add':
+            key = normalize_phone(record['phone'])
+            if key not in self._by_phone:
+                self._insert(Contact(record['id'], record['name'], record['phone'],
+                                     tuple(record.get('tags', ()))), key)
+            return record['id']
+        if op == 'tags':
+            super().set_tags(record['id'], record['tags'])
+        elif op == 'remove':
+            super().remove(record['id'])
+        elif op == 'clear':
+            super().clear()
+        return 0
+
+    def add(self, name, phone, tags=()):
+        """Add a contact and return it once it is on disk, or None if the phone is already saved"""
+        with self._lock:
+            contact = super().add(name, phone, tags)
+            if contact is None:
+                return None
+            self._last_id = contact['id']
+            pending = self.journal.submit({'op': 'add', **contact})
+        try:
+            self._wait(pending)
+        except OSError:
+            # Never report a contact as saved when it did not reach the disk
+            with self._lock:
+                super().remove(contact['id'])
+            raise
+        return contact
+
+    def add_many(self, contacts):
+        """Add several contacts; they share one group commit"""
+        added = []
+        with self._lock:
+            for contact in contacts:
+                new_contact = super().add(contact['name'], contact['phone'], contact.get('tags'))
+                if new_contact is not None:
+                    self._last_id = new_contact['id']
+                    added.append((new_contact, self.journal.submit({'op': 'add', **new_contact})))
+        # Wait for every write, even after one fails, so none is left unchecked
+        failed = []
+        error = None
+        for new_contact, pending in added:
+            try:
+                pending.wait()
+            except OSError as exc:
+                failed.append(new_contact)
+                error = error or exc
+        if failed:
+            # Never report contacts as saved when they did not reach the disk
+            with self._lock:
+                for new_contact in failed:
+                    super().remove(new_contact['id'])
+            raise error
+        if added and self.journal.records_since_snapshot >= self.snapshot_every:
+            self.compact()
+        return len(added)
+
+    def set_tags(self, contact_id, tags):
+        """Replace a contact's tags once the change is on disk"""
+        with self._lock:
+            before = self._by_id.get(contact_id)
+            contact = super().set_tags(contact_id, tags)
+            if contact is None or contact is before:
+                return contact
+            pending = self.journal.submit({'op': 'tags', 'id': contact_id, 'tags': list(contact.tags)})
+        self._wait(pending)
+        return contact
+
+    def remove(self, contact_id):
+        """Delete a contact by id once the deletion is on disk"""
+        with self._lock:
+            contact = super().remove(contact_id)
+            if contact is None:
+                return None
+            pending = self.journal.submit({'op': 'remove', 'id': contact_id})
+        self._wait(pending)
+        return contact
+
+    def clear(self):
+        """Delete every contact"""
+        with self._lock:
+            super().clear()
+            pending = self.journal.submit({'op': 'clear'})
+        self._wait(pending)
+
+    def _wait(self, pending):
+        pending.wait()
+        if self.journal.records_since_snapshot >= self.snapshot_every:
+            self.compact()
+
+    def compact(self):
+        """Write a snapshot of the current contacts and start a fresh journal"""
+        with self._lock:
+            if self.journal.records_since_snapshot == 0:
+                return
+            state = {
+                'last_id': self._last_id,
+                'contacts': [[c.id, c.name, c.phone, list(c.tags)] for c in self._by_id.values()],
+            }
+            pending = self.journal.snapshot(state)
+        pending.wait()
+
+    def close(self):
+        """Flush the journal and stop its writer thread"""
+        self.journal.close()
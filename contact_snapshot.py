@@ -0,0 +1,632 @@
+#!/usr/bin/env python3
+"""
+Emergency Contact Application - Binary Snapshot Store
+=====================================================
+A contact store saved as one compact binary file that opens instantly,
+whatever its size. It is made for the console program, which starts
+fresh for every command and cannot spend seconds loading contacts.
+
+Opening the file maps it into memory (mmap) and reads only its header.
+Nothing else is read until it is needed:
+
+- Records are decoded one at a time, when they are viewed or searched.
+- find_by_phone() is a binary search over a sorted key section, so it
+  touches about twenty entries out of a million.
+- get() and page() binary-search the id table in the same way.
+
+File layout (all numbers little-endian):
+
+    header    magic, format version, phone key version, counts and
+              section offsets (formats 1 and 2 have no key version)
+    records   per contact: id, name, phone and tags lengths, UTF-8 text
+              (format 1 files, from before tags, have no tags length;
+              they are still read, and rewritten as format 3)
+    ids       per contact, in id order: (id, offset of its record)
+    keys      per contact, sorted: UTF-8 phone key padded with zero bytes
+              to a fixed width, then the contact's position in the id table
+
+Changes are kept in memory on top of the file until save() (close()
+saves too). Saving appends them to a small log file, PATH.log, which is
+replayed when the snapshot is opened; rewriting a million records for
+every added contact would take seconds. Once the log holds COMPACT_AFTER
+changes, a new snapshot is written next to the old one and renamed over
+it, so a crash leaves either the old or the new snapshot, never half of
+one. The file belongs to one process at a time.
+
+The key section holds normalize_phone() keys. A file whose keys were
+made under other phone rules (its key version is not
+phone_numbers.KEY_VERSION) gets new keys when it is opened, once, the
+same way sqlite_store.py rebuilds its phone_key column. A number that
+only became a duplicate under the new rules is dropped, keeping the
+oldest contact.
+
+Turn any other store into a snapshot, e.g. the web app's database:
+
+    python contact_snapshot.py sqlite:emergency_contacts.db emergency_contacts.snap
+"""
+
+import contextlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+from contact_store import Contact, StoreEvents, StoreVersion, new_epoch, open_store
+from contact_tags import join_tags, normalize_tags, split_tags
+from phone_numbers import KEY_VERSION, normalize_phone
+
+MAGIC = b'ECSNAP\r\n'
+FORMAT_VERSION = 3
+
+# magic, format version, key version, key width, epoch, contact count,
+# next id, offsets of the id table and the key section
+HEADER = struct.Struct('<8sIII12sQQQQ')
+HEADER_V2 = struct.Struct('<8sII12sQQQQ')   # formats 1 and 2: no key version
+RECORD = struct.Struct('<QIII')     # id, name bytes, phone bytes, tags bytes
+RECORD_V1 = struct.Struct('<QII')   # format 1: id, name bytes, phone bytes
+ID_ENTRY = struct.Struct('<QQ')     # id, record offset
+POSITION = struct.Struct('<I')      # after each padded key: position in the id table
+
+# Saved changes go to a small log next to the snapshot (PATH.log); after
+# this many the snapshot is written anew and the log starts over
+LOG_SUFFIX = '.log'
+COMPACT_AFTER = 1000
+
+
+class SnapshotError(ValueError):
+    """The file is not a contact snapshot, or not one this version can read"""
+
+
+class SnapshotFile:
+    """Read-only view of one snapshot file; decodes only what is asked for"""
+
+    def __init__(self, path=None):
+        self.count = 0
+        self.version = FORMAT_VERSION
+        self.next_id = 1
+        self.epoch = new_epoch()
+        self.key_version = KEY_VERSION
+        self._map = None
+        if path is None or not os.path.exists(path) or os.path.getsize(path) == 0:
+            return
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            raise SnapshotError(f'{path} is too short to be a contact snapshot')
+        magic, version = struct.unpack_from('<8sI', self._map)
+        if magic != MAGIC:
+            raise SnapshotError(f'{path} is not a contact snapshot')
+        if version not in (1, 2, FORMAT_VERSION):
+            raise SnapshotError(f'{path} has snapshot format {version}, expected {FORMAT_VERSION}')
+        if version == FORMAT_VERSION:
+            (_, _, self.key_version, self.key_width, epoch, self.count, self.next_id,
+             self._ids_at, self._keys_at) = HEADER.unpack_from(self._map)
+        else:
+            (_, _, self.key_width, epoch, self.count, self.next_id,
+             self._ids_at, self._keys_at) = HEADER_V2.unpack_from(self._map)
+            self.key_version = 0   # unknown: made before key versions were saved
+        self.version = version
+        self.epoch = epoch.decode('ascii')
+        self._key_entry = self.key_width + POSITION.size
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    # -------------------------------------------------------------- records
+
+    def entry(self, position):
+        """(id, record offset) of the contact at this position in id order"""
+        return ID_ENTRY.unpack_from(self._map, self._ids_at + position * ID_ENTRY.size)
+
+    def contact_at(self, position):
+        """Decode the contact at this position in id order"""
+        offset = self.entry(position)[1]
+        if self.version == 1:
+            contact_id, name_size, phone_size = RECORD_V1.unpack_from(self._map, offset)
+            tags_size = 0
+            start = offset + RECORD_V1.size
+        else:
+            contact_id, name_size, phone_size, tags_size = RECORD.unpack_from(self._map, offset)
+            start = offset + RECORD.size
+        middle = start + name_size
+        end = middle + phone_size
+        return Contact(contact_id,
+                       self._map[start:middle].decode('utf-8'),
+                       self._map[middle:end].decode('utf-8'),
+                       split_tags(self._map[end:end + tags_size].decode('utf-8')) if tags_size else ())
+
+    def record_bytes(self, position):
+        """The encoded record at this position, for copying into a new file"""
+        if self.version == 1:
+            contact = self.contact_at(position)
+            return encode_record(contact.id, contact.name, contact.phone)
+        offset = self.entry(position)[1]
+        _, name_size, phone_size, tags_size = RECORD.unpack_from(self._map, offset)
+        return self._map[offset:offset + RECORD.size + name_size + phone_size + tags_size]
+
+    def position_of(self, contact_id):
+        """Position of the contact with this id, or None (binary search over the id table)"""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.entry(middle)[0] < contact_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self.entry(low)[0] == contact_id:
+            return low
+        return None
+
+    def first_after(self, contact_id):
+        """Position of the first contact whose id is greater than `contact_id`"""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.entry(middle)[0] <= contact_id:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    # ----------------------------------------------------------------- keys
+
+    def key_at(self, index):
+        """(padded phone key, position) of the index-th key in sorted order"""
+        start = self._keys_at + index * self._key_entry
+        end = start + self.key_width
+        return self._map[start:end], POSITION.unpack_from(self._map, end)[0]
+
+    def find_key(self, key):
+        """Position of the contact saved under this phone key, or None"""
+        if not self.count:
+            return None
+        encoded = key.encode('utf-8')
+        # A key wider than every saved key cannot be among them
+        if len(encoded) > self.key_width:
+            return None
+        # Keys are padded with zero bytes, which sort before any digit or
+        # '+', so the padded keys sort exactly like the keys themselves
+        padded = encoded.ljust(self.key_width, b'\0')
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.key_at(middle)[0] < padded:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count:
+            found, position = self.key_at(low)
+            if found == padded:
+                return position
+        return None
+
+    def keys(self):
+        """Every (key, position) in key order"""
+        for index in range(self.count):
+            padded, position = self.key_at(index)
+            yield padded.rstrip(b'\0').decode('utf-8'), position
+
+
+def write_snapshot(path, records, keys, next_id, epoch=None):
+    """
+    Write a snapshot file atomically.
+
+    `records` is a list of (id, encoded record) in id order, `keys` a
+    list of (phone key, position in records) sorted by key. If writing
+    fails, the file at `path` is left as it was.
+    """
+    epoch = epoch or new_epoch()
+    # UTF-8 keeps code point order, so keys sorted as text are sorted as bytes
+    encoded_keys = [(key.encode('utf-8'), position) for key, position in keys]
+    key_width = max((len(key) for key, _ in encoded_keys), default=0)
+    temporary = f'{path}.tmp'
+    try:
+        _write_file(temporary, records, encoded_keys, key_width, next_id, epoch)
+        os.replace(temporary, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temporary)
+        raise
+    return epoch
+
+
+def _write_file(temporary, records, encoded_keys, key_width, next_id, epoch):
+    with open(temporary, 'wb') as f:
+        f.write(b'\0' * HEADER.size)
+        offset = HEADER.size
+        table = bytearray()
+        for contact_id, record in records:
+            table += ID_ENTRY.pack(contact_id, offset)
+            f.write(record)
+            offset += len(record)
+        ids_at = offset
+        f.write(table)
+        keys_at = ids_at + len(table)
+        section = bytearray()
+        for key, position in encoded_keys:
+            section += key.ljust(key_width, b'\0')
+            section += POSITION.pack(position)
+        f.write(section)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, KEY_VERSION, key_width, epoch.encode('ascii'),
+                            len(records), next_id, ids_at, keys_at))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def encode_record(contact_id, name, phone, tags=()):
+    name = name.encode('utf-8')
+    phone = phone.encode('utf-8')
+    tags = join_tags(tags).encode('utf-8')
+    return RECORD.pack(contact_id, len(name), len(phone), len(tags)) + name + phone + tags
+
+
+class SnapshotContactStore(StoreEvents):
+    """
+    Contact store backed by a snapshot file, with unsaved changes in memory.
+
+    Works like ContactStore; call save() (or close()) to write changes.
+    """
+
+    def __init__(self, path, compact_after=COMPACT_AFTER):
+        self.path = path
+        self.log_path = path + LOG_SUFFIX
+        self.compact_after = compact_after
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        self._file = SnapshotFile(self.path)
+        self._next_id = self._file.next_id
+        self._added = {}           # id -> Contact added since the file was written
+        self._added_keys = {}      # phone key -> id, for those contacts
+        self._removed = set()      # ids of file contacts removed since
+        self._removed_keys = set()
+        self._retagged = {}        # id -> Contact with new tags, for file contacts
+        self._logged = 0           # changes in the log file
+        self._unsaved = []         # changes not in the log file yet
+        self._version = StoreVersion(self._file.epoch, 0, time.time())
+        if self._file.count and self._file.key_version != KEY_VERSION:
+            self._rekey()
+        self._replay_log()
+
+    def _rekey(self):
+        """Rewrite the file with keys from the current phone rules, dropping new duplicates"""
+        snapshot = self._file
+        records = []
+        keys = []
+        seen = set()
+        for position in range(snapshot.count):
+            contact = snapshot.contact_at(position)
+            key = normalize_phone(contact.phone)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            keys.append((key, len(records)))
+            records.append((contact.id, snapshot.record_bytes(position)))
+        keys.sort()
+        # The same epoch keeps the log valid: it names contacts by id
+        write_snapshot(self.path, records, keys, snapshot.next_id, snapshot.epoch)
+        snapshot.close()
+        self._file = SnapshotFile(self.path)
+
+    def _replay_log(self):
+        """Apply the changes saved in the log since the snapshot was written"""
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, encoding='utf-8') as f:
+            lines = f.read().split('\n')
+        # A log written for an older snapshot is already part of this one
+        if _parse_line(lines[0]) != {'epoch': self._file.epoch}:
+            return
+        for line in lines[1:]:
+            change = _parse_line(line)
+            if change is None:
+                # A crash mid-write leaves a torn last line; stop there
+                break
+            if change['op'] == 'add':
+                contact = Contact(change['id'], change['name'], change['phone'], tuple(change.get('tags', ())))
+                self._apply_add(contact, normalize_phone(contact.phone))
+            elif change['op'] == 'tags':
+                contact = self.get(change['id'])
+                if contact is not None:
+                    self._apply_tags(Contact(contact.id, contact.name, contact.phone, tuple(change['tags'])))
+            elif change['op'] == 'remove':
+                self._apply_remove(change['id'])
+            elif change['op'] == 'clear':
+                self._apply_clear()
+            self._logged += 1
+            self._bump()
+
+    @property
+    def dirty(self):
+        """True when there are changes save() has not written yet"""
+        return bool(self._unsaved)
+
+    def version(self):
+        """Return the StoreVersion; its number changes whenever the contacts do"""
+        return self._version
+
+    def _bump(self):
+        version = self._version
+        self._version = StoreVersion(version.epoch, version.number + 1, time.time())
+
+    def _changed(self, change):
+        # Called with _lock held, after the change was applied
+        self._unsaved.append(change)
+        self._bump()
+
+    # The _apply_* methods change the in-memory state only; they are
+    # shared by the public methods and by _replay_log()
+
+    def _apply_add(self, contact, key):
+        self._added[contact.id] = contact
+        self._added_keys[key] = contact.id
+        self._next_id = max(self._next_id, contact.id + 1)
+
+    def _apply_tags(self, contact):
+        if contact.id in self._added:
+            self._added[contact.id] = contact
+        else:
+            self._retagged[contact.id] = contact
+
+    def _apply_remove(self, contact_id):
+        contact = self._added.pop(contact_id, None)
+        if contact is not None:
+            del self._added_keys[normalize_phone(contact.phone)]
+            return contact
+        contact = self.get(contact_id)
+        if contact is not None:
+            self._removed.add(contact_id)
+            self._removed_keys.add(normalize_phone(contact.phone))
+            self._retagged.pop(contact_id, None)
+        return contact
+
+    def _apply_clear(self):
+        # An empty view stands in for the file until the next compaction
+        epoch = self._file.epoch
+        self._file = SnapshotFile()
+        self._file.epoch = epoch
+        self._added = {}
+        self._added_keys = {}
+        self._removed = set()
+        self._removed_keys = set()
+        self._retagged = {}
+
+    def _file_contact_at(self, position):
+        """The contact at this position in the file, with its tags as changed since"""
+        contact = self._file.contact_at(position)
+        return self._retagged.get(contact.id, contact) if self._retagged else contact
+
+    def _file_contact(self, key):
+        """The contact saved in the file under this key, unless it was removed"""
+        if key in self._removed_keys:
+            return None
+        position = self._file.find_key(key)
+        return None if position is None else self._file_contact_at(position)
+
+    def add(self, name, phone, tags=()):
+        """Add a contact and return it, or return None if the phone is already saved"""
+        key = normalize_phone(phone)
+        if not key:
+            return None
+        tags = normalize_tags(tags)
+        with self._lock:
+            if key in self._added_keys or self._file_contact(key) is not None:
+                return None
+            contact = Contact(self._next_id, name, phone, tags)
+            self._apply_add(contact, key)
+            change = {'op': 'add', 'id': contact.id, 'name': name, 'phone': phone}
+            if tags:
+                change['tags'] = list(tags)
+            self._changed(change)
+        self._notify('add', contact)
+        return contact
+
+    def add_many(self, contacts):
+        """Add several {"name", "phone"} dictionaries (with optional "tags"), return how many were new"""
+        count = 0
+        for contact in contacts:
+            if self.add(contact['name'], contact['phone'], contact.get('tags')) is not None:
+                count += 1
+        return count
+
+    def set_tags(self, contact_id, tags):
+        """Replace a contact's tags; return the updated contact, or None if there is no such contact"""
+        tags = normalize_tags(tags)
+        with self._lock:
+            contact = self.get(contact_id)
+            if contact is None or contact.tags == tags:
+                return contact
+            contact = Contact(contact.id, contact.name, contact.phone, tags)
+            self._apply_tags(contact)
+            self._changed({'op': 'tags', 'id': contact_id, 'tags': list(tags)})
+        self._notify('tags', contact)
+        return contact
+
+    def get(self, contact_id):
+        """Return the contact with this id, or None"""
+        contact = self._added.get(contact_id)
+        if contact is not None or contact_id in self._removed:
+            return contact
+        contact = self._retagged.get(contact_id)
+        if contact is not None:
+            return contact
+        position = self._file.position_of(contact_id)
+        return None if position is None else self._file.contact_at(position)
+
+    def find_by_phone(self, phone):
+        """Return the contact saved under this phone number, or None"""
+        key = normalize_phone(phone)
+        if not key:
+            return None
+        contact_id = self._added_keys.get(key)
+        if contact_id is not None:
+            return self._added.get(contact_id)
+        return self._file_contact(key)
+
+    def remove(self, contact_id):
+        """Delete a contact by id, return the removed contact or None"""
+        with self._lock:
+            contact = self._apply_remove(contact_id)
+            if contact is None:
+                return None
+            self._changed({'op': 'remove', 'id': contact_id})
+        self._notify('remove', contact)
+        return contact
+
+    def page(self, after=0, limit=100):
+        """Return up to `limit` contacts whose id is greater than `after`, in id order"""
+        contacts = []
+        snapshot = self._file
+        position = snapshot.first_after(after)
+        while len(contacts) < limit and position < snapshot.count:
+            contact_id = snapshot.entry(position)[0]
+            if contact_id not in self._removed:
+                contacts.append(self._file_contact_at(position))
+            position += 1
+        # Contacts added since the file was written all have higher ids
+        for contact in list(self._added.values()):
+            if len(contacts) >= limit:
+                break
+            if contact.id > after:
+                contacts.append(contact)
+        return contacts
+
+    def clear(self):
+        """Delete every contact"""
+        with self._lock:
+            self._apply_clear()
+            self._changed({'op': 'clear'})
+        self._notify('clear')
+
+    def __contains__(self, phone):
+        return self.find_by_phone(phone) is not None
+
+    def __len__(self):
+        return self._file.count - len(self._removed) + len(self._added)
+
+    def __iter__(self):
+        # Contacts come out in id order, decoded one at a time
+        snapshot = self._file
+        removed = self._removed
+        contact_at = self._file_contact_at if self._retagged else snapshot.contact_at
+        for position in range(snapshot.count):
+            if removed and snapshot.entry(position)[0] in removed:
+                continue
+            yield contact_at(position)
+        yield from list(self._added.values())
+
+    def save(self):
+        """
+        Make the changes durable. They are appended to the log file; once
+        the log holds compact_after changes, the snapshot is written anew.
+        Returns False when there was nothing to save.
+        """
+        with self._lock:
+            if not self._unsaved:
+                return False
+            # A log only makes sense next to the snapshot it belongs to
+            if (self._logged + len(self._unsaved) >= self.compact_after
+                    or not os.path.exists(self.path)):
+                self._compact()
+                return True
+            new_log = self._logged == 0
+            with open(self.log_path, 'w' if new_log else 'a', encoding='utf-8') as f:
+                if new_log:
+                    f.write(json.dumps({'epoch': self._file.epoch}) + '\n')
+                f.write(''.join(json.dumps(change, ensure_ascii=False) + '\n' for change in self._unsaved))
+                f.flush()
+                os.fsync(f.fileno())
+            self._logged += len(self._unsaved)
+            self._unsaved = []
+        return True
+
+    def _compact(self):
+        """Write all contacts into a new snapshot file and start an empty log"""
+        snapshot = self._file
+        # Unchanged records are copied as they are, without decoding
+        records = []
+        new_position = {}
+        for position in range(snapshot.count):
+            contact_id = snapshot.entry(position)[0]
+            if contact_id in self._removed:
+                continue
+            new_position[position] = len(records)
+            retagged = self._retagged.get(contact_id)
+            if retagged is None:
+                records.append((contact_id, snapshot.record_bytes(position)))
+            else:
+                records.append((contact_id, encode_record(contact_id, retagged.name, retagged.phone, retagged.tags)))
+        keys = [(key, new_position[position]) for key, position in snapshot.keys()
+                if position in new_position]
+        for key, contact_id in self._added_keys.items():
+            contact = self._added[contact_id]
+            keys.append((key, len(records)))
+            records.append((contact_id, encode_record(contact_id, contact.name, contact.phone, contact.tags)))
+        # New contacts have the highest ids, so records stay in id order.
+        # The file's keys are already sorted; only the new ones need placing
+        keys.sort()
+        # The new file is complete before the old mapping is let go; if
+        # writing it fails, the store keeps working from the old file
+        write_snapshot(self.path, records, keys, self._next_id)
+        snapshot.close()
+        # The log belongs to the old snapshot's epoch, so even if removing
+        # it fails it will not be replayed on top of the new file
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.log_path)
+        self._open()
+
+    def compact(self):
+        """Save every change straight into a new snapshot file"""
+        with self._lock:
+            if self._unsaved or self._logged:
+                self._compact()
+
+    def close(self):
+        """Save any changes and release the file"""
+        try:
+            self.save()
+        finally:
+            self._file.close()
+
+
+def _parse_line(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def main(argv=None):
+    """Write a snapshot of another store: contact_snapshot.py SOURCE_SPEC PATH"""
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print('usage: contact_snapshot.py SOURCE_STORE SNAPSHOT_FILE   '
+              '(e.g. sqlite:emergency_contacts.db emergency_contacts.snap)', file=sys.stderr)
+        return 2
+    source = open_store(argv[0])
+    records = []
+    keys = []
+    next_id = 1
+    for contact in sorted(source, key=lambda contact: contact['id']):
+        key = normalize_phone(contact['phone'])
+        keys.append((key, len(records)))
+        records.append((contact['id'], encode_record(contact['id'], contact['name'], contact['phone'],
+                                                     contact.get('tags') or ())))
+        next_id = max(next_id, contact['id'] + 1)
+    keys.sort()
+    write_snapshot(argv[1], records, keys, next_id)
+    if hasattr(source, 'close'):
+        source.close()
+    print(f'Wrote {len(records)} contact(s) to {argv[1]}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
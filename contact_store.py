@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Emergency Contact Application - Contact Store
+=============================================
+One place to keep emergency contacts, shared by the Flask app,
+the Streamlit app and the console program.
+
+Each contact is a small Contact record with "id", "name", "phone" and
+"tags" (a sorted tuple such as ("family", "neighbours"); see
+contact_tags.py).
+It can be read like a dictionary (contact["name"]) or like an object
+(contact.name), but takes far less memory than a dict. Next to the
+contacts the store keeps two indexes:
+
+- by id:    contact id  -> contact
+- by phone: phone key   -> contact id
+
+The phone key is the canonical form of the number (see phone_numbers.py),
+so "+91 98765 43210", "098765 43210" and "9876543210" count as the same
+contact, and so do "+91 100", "0100" and "100". Thanks to
+the indexes, adding, de-duplicating, looking up and deleting a contact
+take the same time whether the store holds ten contacts or a million.
+
+The store is safe to share between threads (Flask's threaded server,
+gunicorn threads, ...):
+
+- Writers lock only the "stripe" their phone key falls in, so two
+  threads adding different numbers rarely wait for each other, while
+  two threads adding the SAME number can never both succeed.
+- A short order lock hands out ids and keeps the id list sorted.
+- Readers never take a lock. Every change is made with single
+  dictionary or list operations, which Python performs atomically, so
+  a reader sees each contact either fully added or not at all.
+
+Every change also bumps the store's version (see version()), which
+lets web pages answer "304 Not Modified" when nothing has changed.
+"""
+
+import bisect
+import collections
+import itertools
+import threading
+import time
+import uuid
+
+from contact_tags import normalize_tags
+from phone_numbers import normalize_phone
+
+# Number of locks the phone keys are spread over
+LOCK_STRIPES = 64
+
+# What version() returns:
+# - epoch:       random id of this store's history; it changes when the
+#                counter starts again (a new in-memory store, a new file)
+# - number:      goes up by one with every add, remove or clear
+# - modified_at: time.time() of the last change
+StoreVersion = collections.namedtuple('StoreVersion', 'epoch number modified_at')
+
+
+def new_epoch():
+    """A fresh random epoch for StoreVersion"""
+    return uuid.uuid4().hex[:12]
+
+
+class Contact:
+    """
+    One contact. Uses __slots__ instead of a per-contact dictionary,
+    which matters when a store holds millions of them.
+
+    Works like a read-only dict too: contact["name"], contact.get("phone"),
+    dict(contact) and {**contact} all behave as they did for dicts.
+    """
+
+    __slots__ = ('id', 'name', 'phone', 'tags')
+
+    FIELDS = ('id', 'name', 'phone', 'tags')
+
+    def __init__(self, id, name, phone, tags=()):
+        self.id = id
+        self.name = name
+        self.phone = phone
+        self.tags = tags
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        if key not in self.FIELDS:
+            return default
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.FIELDS
+
+    def keys(self):
+        return self.FIELDS
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.FIELDS]
+
+    def to_dict(self):
+        """A plain dictionary copy, e.g. for JSON"""
+        return {'id': self.id, 'name': self.name, 'phone': self.phone, 'tags': list(self.tags)}
+
+    def __eq__(self, other):
+        if isinstance(other, Contact):
+            return (self.id == other.id and self.name == other.name and self.phone == other.phone
+                    and self.tags == other.tags)
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None   # mutable, like the dictionaries it replaces
+
+    def __repr__(self):
+        return f'Contact(id={self.id!r}, name={self.name!r}, phone={self.phone!r}, tags={self.tags!r})'
+
+
+class StoreEvents:
+    """
+    Lets other parts of the program follow changes to a store.
+
+    subscribe(callback) registers callback(event, contact), called after
+    every change made through this store object. `event` is 'add',
+    'remove', 'tags' (the contact's tags changed; `contact` is the
+    updated record) or 'clear' (contact is None for 'clear').
+    """
+
+    def subscribe(self, callback):
+        """Call `callback(event, contact)` after every change"""
+        self._listeners = getattr(self, '_listeners', ()) + (callback,)
+
+    def unsubscribe(self, callback):
+        """Stop calling `callback`"""
+        self._listeners = tuple(cb for cb in getattr(self, '_listeners', ()) if cb is not callback)
+
+    def _notify(self, event, contact=None):
+        for callback in getattr(self, '_listeners', ()):
+            callback(event, contact)
+
+
+class ContactStore(StoreEvents):
+    """In-memory contact store indexed by id and by phone key"""
+
+    def __init__(self, contacts=()):
+        self._by_id = {}
+        self._by_phone = {}
+        self._ids = []  # every id in ascending order, for paging
+        self._next_id = itertools.count(1)
+        self._stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._order_lock = threading.Lock()
+        self._version = StoreVersion(new_epoch(), 0, time.time())
+        self.add_many(contacts)
+
+    def version(self):
+        """Return the StoreVersion; its number changes whenever the contacts do"""
+        return self._version
+
+    def _bump(self):
+        # Called with _order_lock held; the whole tuple is replaced at
+        # once, so readers never see a number without its time
+        version = self._version
+        self._version = StoreVersion(version.epoch, version.number + 1, time.time())
+
+    def _stripe(self, key):
+        """The lock guarding this phone key"""
+        return self._stripes[hash(key) % LOCK_STRIPES]
+
+    def add(self, name, phone, tags=()):
+        """
+        Add a contact and return it, or return None if the phone is already
+        saved or has no digits at all (check with normalize_phone() first
+        to tell the two apart).
+        """
+        key = normalize_phone(phone)
+        if not key:
+            return None
+        tags = normalize_tags(tags)
+        with self._stripe(key):
+            # Check and insert under the same lock, so two threads adding
+            # the same number cannot both see it missing
+            if key in self._by_phone:
+                return None
+            with self._order_lock:
+                contact = Contact(next(self._next_id), name, phone, tags)
+                self._insert(contact, key)
+        self._notify('add', contact)
+        return contact
+
+    def _insert(self, contact, key):
+        # The contact goes into _by_id before its id shows up anywhere
+        # else, so a lock-free reader never finds an id without a contact
+        self._by_id[contact.id] = contact
+        self._by_phone[key] = contact.id
+        if not self._ids or contact.id > self._ids[-1]:
+            self._ids.append(contact.id)
+        else:
+            bisect.insort(self._ids, contact.id)
+        self._bump()
+
+    def add_many(self, contacts):
+        """Add several {"name", "phone"} dictionaries (with optional "tags"), return how many were new"""
+        count = 0
+        for contact in contacts:
+            if self.add(contact['name'], contact['phone'], contact.get('tags')) is not None:
+                count += 1
+        return count
+
+    def set_tags(self, contact_id, tags):
+        """Replace a contact's tags; return the updated contact, or None if there is no such contact"""
+        contact = self._by_id.get(contact_id)
+        if contact is None:
+            return None
+        tags = normalize_tags(tags)
+        if tags == contact.tags:
+            return contact
+        with self._stripe(normalize_phone(contact.phone)):
+            with self._order_lock:
+                current = self._by_id.get(contact_id)
+                if current is None:
+                    return None   # another thread removed it first
+                # A new record, swapped in with one assignment, so a
+                # lock-free reader sees the old tags or the new ones
+                contact = Contact(contact_id, current.name, current.phone, tags)
+                self._by_id[contact_id] = contact
+                self._bump()
+        self._notify('tags', contact)
+        return contact
+
+    def get(self, contact_id):
+        """Return the contact with this id, or None"""
+        return self._by_id.get(contact_id)
+
+    def find_by_phone(self, phone):
+        """Return the contact saved under this phone number, or None"""
+        contact_id = self._by_phone.get(normalize_phone(phone))
+        if contact_id is None:
+            return None
+        # May have been removed a moment ago by another thread
+        return self._by_id.get(contact_id)
+
+    def remove(self, contact_id):
+        """Delete a contact by id, return the removed contact or None"""
+        contact = self._by_id.get(contact_id)
+        if contact is None:
+            return None
+        key = normalize_phone(contact.phone)
+        with self._stripe(key):
+            with self._order_lock:
+                if self._by_id.pop(contact_id, None) is None:
+                    return None   # another thread removed it first
+                ids = self._ids
+                del ids[bisect.bisect_left(ids, contact_id)]
+                self._bump()
+            del self._by_phone[key]
+        self._notify('remove', contact)
+        return contact
+
+    def page(self, after=0, limit=100):
+        """Return up to `limit` contacts whose id is greater than `after`, in id order"""
+        ids = self._ids
+        by_id = self._by_id
+        start = bisect.bisect_right(ids, after)
+        # Slicing copies the ids in one step; skip any removed since
+        return [contact for contact in map(by_id.get, ids[start:start + limit])
+                if contact is not None]
+
+    def clear(self):
+        """Delete every contact"""
+        for stripe in self._stripes:
+            stripe.acquire()
+        try:
+            with self._order_lock:
+                # New, empty containers: readers still holding the old ones
+                # finish their walk over the contacts they started with
+                self._by_id = {}
+                self._by_phone = {}
+                self._ids = []
+                self._bump()
+        finally:
+            for stripe in self._stripes:
+                stripe.release()
+        self._notify('clear')
+
+    def __contains__(self, phone):
+        return normalize_phone(phone) in self._by_phone
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self):
+        # Dictionaries remember insertion order, so contacts come out
+        # in the order they were added
+        return iter(list(self._by_id.values()))
+
+
+def open_store(spec):
+    """
+    Open a contact store from a short description:
+
+    - "memory"          -> ContactStore (lost when the program stops)
+    - "sqlite:PATH"     -> SqliteContactStore saved in the file PATH
+    - "journal:DIR"     -> JournaledContactStore saved in the folder DIR
+    - "snapshot:PATH"   -> SnapshotContactStore saved in the file PATH
+                           (opens instantly; changes are written by save())
+    """
+    kind, _, location = spec.partition(':')
+    if kind == 'memory':
+        return ContactStore()
+    if kind == 'journal' and location:
+        from contact_journal import JournaledContactStore
+        return JournaledContactStore(location)
+    if kind == 'snapshot' and location:
+        from contact_snapshot import SnapshotContactStore
+        return SnapshotContactStore(location)
+    if kind == 'sqlite' and location:
+        from sqlite_store import SqliteContactStore
+        return SqliteContactStore(location)
+    raise ValueError(f'Unknown contact store: {spec!r}')
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Emergency Contact Application - Tags and Selectors
+==================================================
+Contacts can carry tags such as "family", "neighbours" or "on-call"
+(a group is simply a tag several contacts share). An alert can then go
+to a selection of contacts instead of everyone, written as a selector:
+
+    family                              everyone tagged family
+    family OR neighbours                either tag
+    on-call AND NOT work                on-call, leaving out work
+    (family, neighbours) & !work        the same words as symbols
+    all                                 every contact (like no selector)
+
+NOT binds tightest, then AND, then OR, so "family OR neighbours AND NOT
+work" means family OR (neighbours AND NOT work); use brackets for
+anything else. OR may be written "|" or ",", AND "&", NOT "!" or "-".
+Tag names that are not in use simply match nobody.
+
+Tags are lower case letters, digits, "_" and "-"; "Night Shift" is
+saved as "night-shift". The words and, or, not and all cannot be tags.
+
+TagIndex keeps one compressed bitmap of contact ids per tag (see
+bitmap.py) and follows the store through StoreEvents, so a selector
+over a million contacts is answered with a few dozen integer
+operations instead of a walk through every contact.
+"""
+
+import functools
+import re
+import threading
+
+from bitmap import Bitmap
+
+# Longest tag we keep (longer ones are cut)
+MAX_TAG_LENGTH = 40
+
+# Words of the selector language, which therefore cannot be tags
+RESERVED = frozenset(('and', 'or', 'not', 'all'))
+
+# Tags are saved joined with this (never part of a tag)
+SEPARATOR = ','
+
+_SPLIT_RE = re.compile(r'[,;]')
+_INVALID_RE = re.compile(r'[^a-z0-9_-]+')
+_TOKEN_RE = re.compile(r'\s*(?:([()|&!,*-])|([A-Za-z0-9_][A-Za-z0-9_-]*))')
+
+
+class SelectorError(ValueError):
+    """A selector expression that cannot be read"""
+
+
+def normalize_tag(tag):
+    """The saved form of one tag ('' when nothing usable is left)"""
+    tag = _INVALID_RE.sub('-', str(tag).strip().lower()).strip('-')[:MAX_TAG_LENGTH]
+    return '' if tag in RESERVED else tag
+
+
+def normalize_tags(tags):
+    """
+    Sorted tuple of unique saved tags, from a list or from text such as
+    "family, neighbours" (commas or semicolons between tags).
+    """
+    if not tags:
+        return ()
+    if isinstance(tags, str):
+        tags = _SPLIT_RE.split(tags)
+    return tuple(sorted({tag for tag in map(normalize_tag, tags) if tag}))
+
+
+def join_tags(tags):
+    """Saved tags as one string, for a database column or file"""
+    return SEPARATOR.join(tags)
+
+
+def split_tags(text):
+    """The tags saved by join_tags()"""
+    return tuple(text.split(SEPARATOR)) if text else ()
+
+
+# ------------------------------------------------------------- selectors
+
+def _tokens(text):
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN_RE.match(text, position)
+        if match is None:
+            raise SelectorError(f'Unexpected {text[position:].strip()[:1]!r} in selector at position {position + 1}')
+        symbol, word = match.groups()
+        if word is not None:
+            lowered = word.lower()
+            if lowered in ('and', 'or', 'not'):
+                yield {'and': '&', 'or': '|', 'not': '!'}[lowered], match.start(2)
+            else:
+                yield lowered, match.start(2)
+        else:
+            yield {',': '|', '-': '!', '*': 'all'}.get(symbol, symbol), match.start(1)
+        position = match.end()
+
+
+class _Parser:
+    """Recursive-descent parser: or := and ('|' and)* ; and := not ('&' not)* ; not := '!' not | atom"""
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = list(_tokens(text))
+        self.index = 0
+
+    def peek(self):
+        return self.tokens[self.index][0] if self.index < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def fail(self, expected):
+        if self.index < len(self.tokens):
+            token, position = self.tokens[self.index]
+            raise SelectorError(f'Expected {expected} at position {position + 1}, found {token!r}')
+        raise SelectorError(f'Expected {expected} at the end of the selector')
+
+    def parse(self):
+        node = self.parse_or()
+        if self.peek() is not None:
+            self.fail('AND, OR or the end')
+        return node
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.peek() == '|':
+            self.take()
+            node = ('or', node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while self.peek() == '&':
+            self.take()
+            node = ('and', node, self.parse_not())
+        return node
+
+    def parse_not(self):
+        if self.peek() == '!':
+            self.take()
+            return ('not', self.parse_not())
+        return self.parse_atom()
+
+    def parse_atom(self):
+        token = self.peek()
+        if token == '(':
+            self.take()
+            node = self.parse_or()
+            if self.peek() != ')':
+                self.fail("')'")
+            self.take()
+            return node
+        if token is None or token in ('|', '&', ')'):
+            self.fail('a tag')
+        self.take()
+        return ('all',) if token == 'all' else ('tag', token)
+
+
+@functools.lru_cache(maxsize=256)
+def parse_selector(text):
+    """
+    Parse a selector into a tree of tuples: ('tag', name), ('all',),
+    ('not', x), ('and', x, y), ('or', x, y). Raises SelectorError.
+    """
+    if not text or not text.strip():
+        raise SelectorError('The selector is empty')
+    return _Parser(text).parse()
+
+
+def selector_tags(node):
+    """Every tag a parsed selector mentions"""
+    if node[0] == 'tag':
+        return {node[1]}
+    return set().union(*(selector_tags(child) for child in node[1:]))
+
+
+# ------------------------------------------------------------------ index
+
+class TagIndex:
+    """Compressed bitmaps of contact ids per tag, plus one of every id"""
+
+    def __init__(self, contacts=()):
+        self._lock = threading.Lock()
+        self._contacts = {}   # id -> contact
+        self._all = Bitmap()
+        self._tags = {}       # tag -> Bitmap of ids
+        self._build(contacts)
+
+    @classmethod
+    def for_store(cls, store):
+        """Build an index of `store` and keep it up to date as the store changes"""
+        index = cls(store)
+        store.subscribe(index.on_change)
+        return index
+
+    def _build(self, contacts):
+        ids = []
+        tagged = {}
+        for contact in contacts:
+            contact_id = contact['id']
+            self._contacts[contact_id] = contact
+            ids.append(contact_id)
+            for tag in contact.get('tags') or ():
+                tagged.setdefault(tag, []).append(contact_id)
+        # Whole lists at once are much faster than adding ids one by one
+        self._all.update(ids)
+        for tag, tag_ids in tagged.items():
+            self._tags.setdefault(tag, Bitmap()).update(tag_ids)
+
+    def on_change(self, event, contact):
+        """StoreEvents callback"""
+        if event == 'add':
+            self.add(contact)
+        elif event == 'remove':
+            self.remove(contact)
+        elif event == 'tags':
+            self.retag(contact)
+        elif event == 'clear':
+            self.clear()
+
+    def add(self, contact):
+        """Index one new contact"""
+        with self._lock:
+            self._add(contact)
+
+    def _add(self, contact):
+        contact_id = contact['id']
+        self._contacts[contact_id] = contact
+        self._all.add(contact_id)
+        for tag in contact.get('tags') or ():
+            bitmap = self._tags.get(tag)
+            if bitmap is None:
+                self._tags[tag] = bitmap = Bitmap()
+            bitmap.add(contact_id)
+
+    def remove(self, contact):
+        """Forget one contact"""
+        with self._lock:
+            self._remove(contact['id'])
+
+    def _remove(self, contact_id):
+        old = self._contacts.pop(contact_id, None)
+        if old is None:
+            return
+        self._all.discard(contact_id)
+        for tag in old.get('tags') or ():
+            bitmap = self._tags.get(tag)
+            if bitmap is not None:
+                bitmap.discard(contact_id)
+                if not bitmap:
+                    del self._tags[tag]
+
+    def retag(self, contact):
+        """Follow a change of one contact's tags"""
+        with self._lock:
+            self._remove(contact['id'])
+            self._add(contact)
+
+    def clear(self):
+        """Forget every contact"""
+        with self._lock:
+            self._contacts = {}
+            self._all = Bitmap()
+            self._tags = {}
+
+    def __len__(self):
+        return len(self._contacts)
+
+    def tags(self):
+        """{tag: number of contacts}, sorted by tag"""
+        with self._lock:
+            return {tag: len(self._tags[tag]) for tag in sorted(self._tags)}
+
+    def _evaluate(self, node):
+        kind = node[0]
+        if kind == 'tag':
+            return self._tags.get(node[1]) or Bitmap()
+        if kind == 'all':
+            return self._all
+        if kind == 'not':
+            return self._all - self._evaluate(node[1])
+        left, right = node[1], node[2]
+        if kind == 'or':
+            return self._evaluate(left) | self._evaluate(right)
+        # x AND NOT y is one AND NOT, without building the complement of y
+        if right[0] == 'not':
+            return self._evaluate(left) - self._evaluate(right[1])
+        if left[0] == 'not':
+            return self._evaluate(right) - self._evaluate(left[1])
+        return self._evaluate(left) & self._evaluate(right)
+
+    def ids(self, selector):
+        """Bitmap of the ids matching a selector (text or parsed); raises SelectorError"""
+        node = parse_selector(selector) if isinstance(selector, str) else selector
+        with self._lock:
+            return self._evaluate(node).copy()
+
+    def unknown(self, selector):
+        """Tags a selector mentions that no contact has, sorted (to point out typos)"""
+        node = parse_selector(selector) if isinstance(selector, str) else selector
+        with self._lock:
+            return sorted(tag for tag in selector_tags(node) if tag not in self._tags)
+
+    def count(self, selector):
+        """How many contacts match a selector"""
+        return len(self.ids(selector))
+
+    def select(self, selector, limit=None):
+        """The contacts matching a selector, in id order; raises SelectorError"""
+        node = parse_selector(selector) if isinstance(selector, str) else selector
+        with self._lock:
+            contacts = self._contacts
+            found = []
+            for contact_id in self._evaluate(node):
+                if limit is not None and len(found) >= limit:
+                    break
+                found.append(contacts[contact_id])
+            return found
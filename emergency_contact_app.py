@@ -11,57 +11,187 @@ Level: Beginner
 ===========================================
 """
 
+import argparse
+import csv
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+
+from contact_import import FORMATS, ContactImportError, import_file, import_rows
+from contact_store import ContactStore, open_store
+from contact_tags import SelectorError, TagIndex
+from phone_numbers import normalize_phone
+from regional_directory import DEFAULT_NEAREST, load_directory, parse_location
+from search_index import SearchIndex
+
+
 # ===========================================
 # DATA STORAGE
 # ===========================================
-# We use a LIST to store all emergency contacts
-# Each contact is a DICTIONARY with 'name' and 'phone' keys
-# Example: [{"name": "John", "phone": "1234567890"}, ...]
+# We use a CONTACT STORE to keep all emergency contacts
+# Each contact can be read like a DICTIONARY with 'id', 'name' and 'phone' keys
+# Example: contact["name"] -> "John", contact["phone"] -> "1234567890"
+# The store remembers every phone number it has seen, so the
+# same number is never saved twice.
+
+contact_store = ContactStore()  # Empty store to start - main() opens the saved one
+
+# The console program shares its saved contacts with the web app.
+# Set CONTACT_STORE, or use --store, to work on another store, e.g.
+# snapshot:emergency_contacts.snap, which opens in a few milliseconds
+# even with a million contacts because contacts are only read from it
+# when they are shown or searched (see contact_snapshot.py)
+DEFAULT_STORE = "sqlite:emergency_contacts.db"
 
-contacts_list = []  # Empty list to start - will hold our contacts
+# The alert engine sends the message to all contacts at the same time
+# It is only created when the first alert is sent (see get_alert_engine),
+# because loading it takes longer than everything else at startup
+alert_engine = None
+
+
+def get_alert_engine():
+    """Creates the alert engine the first time it is needed"""
+    global alert_engine
+    if alert_engine is None:
+        from alerts import AlertEngine, StubGateway
+        # StubGateway only pretends to send - replace it with a real SMS gateway
+        alert_engine = AlertEngine(StubGateway())
+    return alert_engine
 
 
 # ===========================================
-# INDIAN GOVERNMENT EMERGENCY CONTACTS
+# OUTPUT: Write text in big pieces
 # ===========================================
-# These are official emergency contact numbers provided by Government of India
+# Every print() is a separate write to the screen or file. For a list
+# of 100,000 contacts that is half a million small writes, which takes
+# far longer than the work itself. So long outputs are collected in an
+# OutputBuffer and written in one go (or in pieces of OUTPUT_CHUNK_SIZE
+# characters, so a huge list does not have to fit in memory at once).
+
+OUTPUT_CHUNK_SIZE = 64 * 1024
+
+# The pager used for lists longer than the screen (PAGER overrides it)
+# -F quits at once when the text fits, -R keeps colours, -X keeps the
+# text on the screen afterwards
+DEFAULT_PAGER = "less -FRX"
+
+# Formats the "list" command can write; csv and ndjson can be imported again
+LIST_FORMATS = ("text", "csv", "ndjson")
+
+
+class OutputBuffer:
+    """
+    Collects text and writes it to a stream in large pieces.
+    Use write() like a file, line() like print(), and flush() at the end.
+    """
+
+    def __init__(self, stream=None, chunk_size=OUTPUT_CHUNK_SIZE):
+        self.stream = sys.stdout if stream is None else stream
+        self.chunk_size = chunk_size
+        self.parts = []
+        self.size = 0
+
+    def write(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.chunk_size:
+            self.flush()
+
+    def line(self, text=""):
+        self.write(text + "\n")
+
+    def flush(self):
+        if self.parts:
+            self.stream.write("".join(self.parts))
+            self.parts = []
+            self.size = 0
+        self.stream.flush()
+
 
-indian_emergency_contacts = [
-    {"name": "Police (All India)", "phone": "100"},
-    {"name": "Fire Service", "phone": "101"},
-    {"name": "Ambulance", "phone": "102"},
-    {"name": "Women Helpline", "phone": "1091"},
-    {"name": "Child Helpline", "phone": "1098"},
-    {"name": "Disaster Management", "phone": "1070"},
-    {"name": "National Emergency (Police/Fire/Ambulance)", "phone": "112"},
-    {"name": "Railway Police", "phone": "1512"},
-    {"name": "Road Safety", "phone": "1033"},
-    {"name": "Anti Terrorist Helpline", "phone": "1930"},
-]
+def open_pager():
+    """Start the pager program and return it, or None if it cannot be started"""
+    command = os.environ.get("PAGER") or DEFAULT_PAGER
+    try:
+        return subprocess.Popen(shlex.split(command), stdin=subprocess.PIPE,
+                                text=True, encoding="utf-8")
+    except (OSError, ValueError):
+        return None
+
+
+def paged_output(write, line_count, use_pager=None):
+    """
+    Calls write(out) with an OutputBuffer and returns what it returns.
+    The text goes through the pager when it is longer than the screen
+    and the output is a screen (not a file or another program).
+    use_pager=True or False decides it instead.
+    """
+    if use_pager is None:
+        use_pager = sys.stdout.isatty() and line_count > shutil.get_terminal_size().lines
+    pager = open_pager() if use_pager else None
+    
+    if pager is None:
+        out = OutputBuffer()
+        try:
+            return write(out)
+        finally:
+            out.flush()
+    
+    out = OutputBuffer(pager.stdin)
+    try:
+        result = write(out)
+        out.flush()
+        return result
+    except BrokenPipeError:
+        # The user quit the pager before the end - that is fine
+        return True
+    finally:
+        try:
+            pager.stdin.close()
+        except BrokenPipeError:
+            pass
+        pager.wait()
 
 
 # ===========================================
 # FUNCTION: Load Indian Government Emergency Contacts
 # ===========================================
-def load_indian_emergency_contacts():
+def load_indian_emergency_contacts(pack_id=None):
     """
     This function loads the Indian government emergency contact numbers.
     These are preset contacts that users can add with one click.
-    """
-    global contacts_list  # Allow modifying the global contacts list
     
+    The numbers come from data/presets.json, the same list the web
+    apps use (see preset_catalog.py).
+    """
+    # Imported here, not at the top, so commands that never use the
+    # preset lists start faster
+    from preset_catalog import get_catalog, load_pack
+    try:
+        pack = get_catalog().pack(pack_id)
+    except ValueError as error:
+        # The preset file is missing or broken
+        print(f"\n⚠ ERROR: {error}")
+        return
     print("\n" + "="*50)
-    print("   INDIAN GOVERNMENT EMERGENCY CONTACTS")
+    print(f"   {pack.title.upper()}")
     print("="*50)
     print("\nAdding the following emergency contacts:\n")
     
-    # Add all Indian emergency contacts to the list
-    for contact in indian_emergency_contacts:
-        print(f"  ✓ {contact['name']} - {contact['phone']}")
-        contacts_list.append(contact)
+    # Note which numbers are saved already, then add the whole list in
+    # one add_many() call (one transaction instead of one per contact)
+    saved = [contact_store.find_by_phone(contact['phone']) is not None for contact in pack.contacts]
+    _, count = load_pack(contact_store, pack.id)
+    for contact, was_saved in zip(pack.contacts, saved):
+        if was_saved:
+            print(f"  - {contact['name']} - {contact['phone']} (already saved)")
+        else:
+            print(f"  ✓ {contact['name']} - {contact['phone']}")
     
     print("\n" + "="*50)
-    print(f"✓ Successfully added {len(indian_emergency_contacts)} Indian emergency contacts!")
+    print(f"✓ Successfully added {count} Indian emergency contacts!")
     print("="*50)
 
 
@@ -93,19 +223,28 @@ def add_contact():
         print("ERROR: Phone number cannot be empty!")
         return
     
-    # Create a dictionary for this contact
-    # We use a dictionary because we have two pieces of info: name and phone
-    contact = {
-        "name": name,
-        "phone": phone
-    }
+    # Check if there is a number in it at all ("abc" has no digits)
+    if not normalize_phone(phone):
+        print(f"ERROR: {phone} is not a phone number!")
+        return
+    
+    # Tags are optional; they let an alert go to some contacts only
+    tags = input("Enter tags (optional, e.g. family, neighbours): ").strip()
     
-    # Add the contact to our list
-    contacts_list.append(contact)
+    # Add the contact to our store
+    # The store creates the contact for us, with an id, the name and the phone
+    # It returns None if this phone number is already saved
+    contact = contact_store.add(name, phone, tags)
+    
+    if contact is None:
+        print(f"ERROR: Phone number {phone} is already saved!")
+        return
     
     # Confirm to user
     print(f"\n✓ SUCCESS: Contact '{name}' added successfully!")
     print(f"  Phone: {phone}")
+    if contact.tags:
+        print(f"  Tags : {', '.join(contact.tags)}")
 
 
 # ===========================================
@@ -121,27 +260,55 @@ def view_contacts():
     print("="*40)
     
     # Check if we have any contacts
-    if len(contacts_list) == 0:
+    if len(contact_store) == 0:
         print("\n⚠ No emergency contacts saved yet!")
         print("  Use option 1 to add a contact.")
         return
     
-    # We have contacts, so display them
-    print(f"\nTotal contacts: {len(contacts_list)}\n")
+    # Long lists are shown through the pager, page by page
+    paged_output(lambda out: write_contacts(contact_store, out), 5 * len(contact_store) + 2)
+
+
+# ===========================================
+# FUNCTION: Write a list of contacts
+# ===========================================
+def write_contacts(store, out, fmt="text", limit=None):
+    """
+    This function writes the contacts of a store to an OutputBuffer.
+    fmt "text" is for people to read; "csv" and "ndjson" are for
+    other programs (and can be imported again).
+    `store` may also be a list of contacts, e.g. those a selector picked.
+    """
+    if fmt == "csv":
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(["name", "phone", "tags"])
+    elif fmt == "text":
+        out.write(f"\nTotal contacts: {len(store)}\n\n")
     
-    # Loop through each contact in the list
+    # Loop through each contact in the store
     # enumerate() gives us both index and the contact
-    for index, contact in enumerate(contacts_list, start=1):
+    for index, contact in enumerate(store, start=1):
+        if limit is not None and index > limit:
+            break
         # Access dictionary values using keys
         name = contact["name"]
         phone = contact["phone"]
+        tags = contact["tags"]
         
-        # Display contact information
-        print(f"  Contact #{index}")
-        print(f"  ─────────────")
-        print(f"  Name : {name}")
-        print(f"  Phone: {phone}")
-        print()
+        if fmt == "csv":
+            # Tags share one column, separated by semicolons
+            writer.writerow([name, phone, ";".join(tags)])
+        elif fmt == "ndjson":
+            out.write(json.dumps({"name": name, "phone": phone, "tags": list(tags)}, ensure_ascii=False) + "\n")
+        else:
+            # All five lines of one contact in a single piece of text
+            # (six when it has tags)
+            tag_line = f"  Tags : {', '.join(tags)}\n" if tags else ""
+            out.write(f"  Contact #{index}\n"
+                      f"  ─────────────\n"
+                      f"  Name : {name}\n"
+                      f"  Phone: {phone}\n"
+                      f"{tag_line}\n")
 
 
 # ===========================================
@@ -149,32 +316,138 @@ def view_contacts():
 # ===========================================
 def emergency_alert():
     """
-    This function simulates sending an emergency alert.
-    It prints a message to indicate the alert was sent.
+    This function sends an emergency alert to every contact.
+    All messages go out at the same time, and each contact's
+    result is printed as soon as it is known.
+    Emergency numbers like 112 are always sent first.
     """
     print("\n" + "!"*40)
     print("       🚨 EMERGENCY ALERT 🚨")
     print("!"*40)
     
     # Check if there are contacts to notify
-    if len(contacts_list) == 0:
+    if len(contact_store) == 0:
         print("\n⚠ WARNING: No contacts to notify!")
         print("  Please add emergency contacts first.")
         return
     
+    # The alert can go to everyone or only to some tags
+    selector = input("Who to alert? Press Enter for everyone, "
+                     "or type tags like: family OR neighbours AND NOT work\n> ").strip()
+    try:
+        recipients, total = select_contacts(contact_store, selector)
+    except SelectorError as error:
+        print(f"\n⚠ ERROR: {error}")
+        return
+    if total == 0:
+        print(f"\n⚠ No contacts match '{selector}'.")
+        return
+    
     # Show how many people will be notified
-    print(f"\nNotifying {len(contacts_list)} emergency contact(s)...")
+    print(f"\nNotifying {total} emergency contact(s)...")
     
-    # List all contacts that will be notified
+    # This small function is called once for every contact,
+    # right after we know whether their message got through
+    def show_result(result):
+        contact = result.contact
+        if result.ok:
+            print(f"  - {contact['name']} ({contact['phone']})")
+        else:
+            print(f"  ⚠ {contact['name']} ({contact['phone']}) - {result.error}")
+    
+    # Send the alert to all contacts
     print("\nContacts being notified:")
-    for contact in contacts_list:
-        print(f"  - {contact['name']} ({contact['phone']})")
+    report = get_alert_engine().send_alert(recipients, on_result=show_result)
     
     # THE MAIN OUTPUT - This is the required output!
     print("\n" + "*"*40)
     print("   Emergency message sent")
     print("*"*40)
-    print("\n✓ All contacts have been notified successfully!")
+    
+    if report.failed == 0:
+        print("\n✓ All contacts have been notified successfully!")
+    else:
+        print(f"\n⚠ {report.sent} contact(s) notified, {report.failed} could not be reached!")
+    
+    # Show how fast the alert reached people
+    if report.time_to_last is not None:
+        print(f"  First contact reached after {report.time_to_first:.3f}s")
+        print(f"  Last contact reached after {report.time_to_last:.3f}s")
+    if report.late:
+        print(f"  ⚠ {report.late} contact(s) were tried after their deadline")
+    
+    # The same number saved twice only gets the message once
+    if report.coalesced:
+        print(f"  {report.coalesced} contact(s) share a number with another contact and were messaged once")
+
+
+# ===========================================
+# FUNCTION: Pick contacts by their tags
+# ===========================================
+def select_contacts(store, selector, index=None):
+    """
+    This function returns the contacts a selector such as
+    "family OR neighbours" picks, and how many there are.
+    An empty selector picks every contact.
+    Raises SelectorError when the selector cannot be read.
+    """
+    if not selector or not selector.strip():
+        return store, len(store)
+    if index is None:
+        index = TagIndex(store)
+    chosen = index.select(selector)
+    return chosen, len(chosen)
+
+
+# ===========================================
+# FUNCTION: Import contacts from a file
+# ===========================================
+def import_contacts_file(store, path, fmt=None, out=None):
+    """
+    This function adds every contact from a CSV or NDJSON file.
+    Bad rows are skipped and reported with their line number.
+    """
+    out = OutputBuffer() if out is None else out
+    try:
+        report = import_file(store, path, fmt)
+    except (OSError, ContactImportError, UnicodeDecodeError) as error:
+        out.line(f"ERROR: {error}")
+        return False
+    
+    out.line(f"✓ Read {report.rows} row(s): {report.added} added, "
+             f"{report.duplicates} already saved, {report.error_count} rejected")
+    write_import_errors(report, out)
+    return True
+
+
+def write_import_errors(report, out):
+    """Lists the rejected rows of an ImportReport"""
+    for line, message in report.errors:
+        out.line(f"  line {line}: {message}")
+    if report.error_count > len(report.errors):
+        out.line(f"  ... and {report.error_count - len(report.errors)} more")
+
+
+# ===========================================
+# FUNCTION: Search contacts
+# ===========================================
+def search_contacts(store, query, limit=10, out=None, index=None):
+    """
+    This function finds contacts by the start of a phone number
+    or by (part of) a name, even with small typos.
+    Pass an index to reuse it for many searches.
+    """
+    out = OutputBuffer() if out is None else out
+    if index is None:
+        index = SearchIndex(store)
+    results = index.search(query, limit)
+    
+    if not results:
+        out.line(f"No contacts match '{query}'.")
+        return
+    
+    for contact in results:
+        out.line(f"  {contact['name']} - {contact['phone']}")
 
 
 # ===========================================
@@ -203,6 +476,30 @@ def main():
     This is the main function that runs the program.
     It contains the main loop that keeps the program running.
     """
+    # Open the saved contacts (see DEFAULT_STORE)
+    # "global" lets us replace the empty store made at the top of the file
+    global contact_store
+    try:
+        contact_store = open_store(os.environ.get("CONTACT_STORE", DEFAULT_STORE))
+    except (OSError, ValueError) as error:
+        print(f"ERROR: cannot open the saved contacts: {error}")
+        return
+    
+    try:
+        menu_loop()
+    finally:
+        # Runs even after Ctrl+C: close() writes the changes to the file
+        if hasattr(contact_store, "close"):
+            contact_store.close()
+
+
+# ===========================================
+# FUNCTION: The menu loop
+# ===========================================
+def menu_loop():
+    """
+    Shows the menu again and again until the user chooses Exit.
+    """
     # Welcome message
     print("\n" + "="*50)
     print("  Welcome to Emergency Contact Application!")
@@ -250,11 +547,396 @@ def main():
             print("\n⚠ Invalid choice! Please enter a number from 1 to 5.")
 
 
+# ===========================================
+# FUNCTION: Describe the command line
+# ===========================================
+def build_parser():
+    """
+    This function lists the commands the program understands
+    without the menu. A batch file uses the same commands, one per line.
+    """
+    parser = argparse.ArgumentParser(prog="emergency_contact_app.py")
+    parser.add_argument("--store", default=os.environ.get("CONTACT_STORE", DEFAULT_STORE),
+                        help=f"where contacts are saved (default {DEFAULT_STORE}), "
+                             "e.g. snapshot:emergency_contacts.snap for the fast start with big lists, "
+                             "which is not the default")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    add_parser = commands.add_parser("add", help="save one contact")
+    add_parser.add_argument("name")
+    add_parser.add_argument("phone")
+    add_parser.add_argument("--tags", default="", help="comma-separated tags, e.g. family,neighbours")
+    
+    import_parser = commands.add_parser("import", help="add contacts from a CSV or NDJSON file")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--format", choices=FORMATS, help="file format (default: from the file name)")
+    
+    list_parser = commands.add_parser("list", help="show the saved contacts")
+    list_parser.add_argument("--format", choices=LIST_FORMATS, default="text")
+    list_parser.add_argument("--limit", type=int, help="show only the first LIMIT contacts")
+    list_parser.add_argument("--select", metavar="SELECTOR", help="only contacts with these tags, e.g. 'family OR neighbours'")
+    list_parser.add_argument("--pager", action=argparse.BooleanOptionalAction,
+                             help="page the list (default: when it is longer than the screen)")
+    
+    search_parser = commands.add_parser("search", help="find contacts by name or phone prefix")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--limit", type=int, default=10)
+    
+    alert_parser = commands.add_parser("alert", help="send the emergency alert to every contact")
+    alert_parser.add_argument("--message", help="the text to send (default: the standard alert)")
+    alert_parser.add_argument("--select", metavar="SELECTOR",
+                              help="only contacts with these tags, e.g. 'family OR neighbours AND NOT work'")
+    alert_parser.add_argument("--near", nargs=2, metavar=("LAT", "LON"),
+                              help="also list the emergency services nearest to this place")
+    
+    nearby_parser = commands.add_parser("nearby", help="find the emergency services nearest to a place")
+    nearby_parser.add_argument("lat", help="latitude, e.g. 28.6139")
+    nearby_parser.add_argument("lon", help="longitude, e.g. 77.2090")
+    nearby_parser.add_argument("--limit", type=int, default=DEFAULT_NEAREST)
+    nearby_parser.add_argument("--category", help="only this kind, e.g. police, fire, ambulance")
+    nearby_parser.add_argument("--add", action="store_true", help="also save them as contacts")
+    
+    tag_parser = commands.add_parser("tag", help="set the tags of the contact with this phone number")
+    tag_parser.add_argument("phone")
+    tag_parser.add_argument("tags", help="comma-separated tags; \"\" removes them all")
+    
+    commands.add_parser("tags", help="show every tag and how many contacts have it")
+    
+    presets_parser = commands.add_parser("presets", help="show the ready-made contact lists (data/presets.json)")
+    presets_parser.add_argument("--load", metavar="ID", help="save every contact of this list")
+    
+    batch_parser = commands.add_parser("batch", help="run the commands in a file, one per line ('-' reads them typed in or piped)")
+    batch_parser.add_argument("file")
+    return parser
+
+
+# ===========================================
+# FUNCTIONS: One per command
+# ===========================================
+# Each command gets the parsed arguments and a "context" dictionary
+# with the store, the OutputBuffer to write to and (once a search or a
+# selector has run) the search and tag indexes. Each returns True if
+# it worked.
+
+def command_add(args, context):
+    out = context["out"]
+    name = args.name.strip()
+    phone = args.phone.strip()
+    if name == "" or phone == "":
+        out.line("ERROR: Name and phone number cannot be empty!")
+        return False
+    if not normalize_phone(phone):
+        out.line(f"ERROR: {phone} is not a phone number!")
+        return False
+    
+    # add() returns None when the number is already saved
+    if context["store"].add(name, phone, args.tags) is None:
+        out.line(f"  - {name} - {phone} (already saved)")
+    else:
+        out.line(f"  ✓ {name} - {phone}")
+    return True
+
+
+def command_import(args, context):
+    return import_contacts_file(context["store"], args.file, args.format, context["out"])
+
+
+def command_list(args, context):
+    contacts = pick_contacts(args.select, context)
+    if contacts is None:
+        return False
+    write_contacts(contacts, context["out"], args.format, args.limit)
+    return True
+
+
+def pick_contacts(selector, context):
+    """
+    The contacts a command's --select picks (the whole store without
+    one), or None after writing what is wrong with the selector.
+    """
+    out = context["out"]
+    if not selector:
+        return context["store"]
+    # Built once, then kept up to date, like the search index
+    if context["tags"] is None:
+        context["tags"] = TagIndex.for_store(context["store"])
+    try:
+        contacts, total = select_contacts(context["store"], selector, context["tags"])
+    except SelectorError as error:
+        out.line(f"ERROR: {error}")
+        return None
+    unknown = context["tags"].unknown(selector)
+    if unknown:
+        out.line(f"⚠ No contact has the tag(s): {', '.join(unknown)}")
+    return contacts
+
+
+def command_tag(args, context):
+    out = context["out"]
+    store = context["store"]
+    contact = store.find_by_phone(args.phone)
+    if contact is None:
+        out.line(f"ERROR: No contact with phone {args.phone}")
+        return False
+    contact = store.set_tags(contact["id"], args.tags)
+    out.line(f"  ✓ {contact['name']} - {contact['phone']}: {', '.join(contact['tags']) or '(no tags)'}")
+    return True
+
+
+def command_tags(args, context):
+    out = context["out"]
+    if context["tags"] is None:
+        context["tags"] = TagIndex.for_store(context["store"])
+    counts = context["tags"].tags()
+    if not counts:
+        out.line("No contact has tags yet.")
+    for tag, count in counts.items():
+        out.line(f"  {tag}: {count}")
+    return True
+
+
+def command_search(args, context):
+    # The index is built once and then kept up to date, so a batch
+    # file with many searches does not build it again every time
+    if context["index"] is None:
+        context["index"] = SearchIndex.for_store(context["store"])
+    search_contacts(context["store"], args.query, args.limit, context["out"], context["index"])
+    return True
+
+
+def command_alert(args, context):
+    store = context["store"]
+    out = context["out"]
+    if len(store) == 0:
+        out.line("⚠ WARNING: No contacts to notify!")
+        return False
+    recipients = pick_contacts(args.select, context)
+    if recipients is None:
+        return False
+    if len(recipients) == 0:
+        out.line(f"⚠ WARNING: No contacts match '{args.select}'!")
+        return False
+    
+    def show_result(result):
+        contact = result.contact
+        if result.ok:
+            out.line(f"  - {contact['name']} ({contact['phone']})")
+        else:
+            out.line(f"  ⚠ {contact['name']} ({contact['phone']}) - {result.error}")
+    
+    engine = get_alert_engine()
+    if args.message:
+        report = engine.send_alert(recipients, args.message, on_result=show_result)
+    else:
+        report = engine.send_alert(recipients, on_result=show_result)
+    out.line(f"Emergency message sent: {report.sent} notified, {report.failed} could not be reached")
+    
+    # The nearest services are listed so they can be called directly
+    if args.near:
+        out.line("Nearest emergency services:")
+        write_nearby(out, *args.near)
+    return report.failed == 0
+
+
+def command_nearby(args, context):
+    out = context["out"]
+    found = write_nearby(out, args.lat, args.lon, args.limit, args.category)
+    if found is None:
+        return False
+    if args.add:
+        count = context["store"].add_many({"name": service.name, "phone": service.phone}
+                                          for service, _ in found)
+        out.line(f"✓ Added {count} of them ({len(found) - count} already saved)")
+    return True
+
+
+def write_nearby(out, lat, lon, limit=DEFAULT_NEAREST, category=None):
+    """
+    Lists the services nearest to (lat, lon) and returns them as
+    (service, km) pairs, or writes an error and returns None.
+    """
+    try:
+        lat, lon = parse_location(lat, lon)
+        found = load_directory().nearest(lat, lon, limit, category)
+    except ValueError as error:
+        # DirectoryError (the file is missing or broken) is a ValueError too
+        out.line(f"ERROR: {error}")
+        return None
+    if not found:
+        out.line("  No services found.")
+    for service, km in found:
+        out.line(f"  {service.name} - {service.phone} ({km:.1f} km, {service.category})")
+    return found
+
+
+def command_presets(args, context):
+    from preset_catalog import get_catalog, load_pack
+    out = context["out"]
+    try:
+        catalog = get_catalog()
+        if args.load:
+            pack, count = load_pack(context["store"], args.load)
+            out.line(f"✓ Added {count} contacts from {pack.title} ({len(pack) - count} already saved)")
+            return True
+    except KeyError:
+        out.line(f"ERROR: No preset list called {args.load!r}")
+        return False
+    except ValueError as error:
+        # PresetCatalogError (the file is missing or broken) is a ValueError
+        out.line(f"ERROR: {error}")
+        return False
+    
+    out.line(f"Preset lists (version {catalog.version}):")
+    for pack in catalog.packs.values():
+        default = " [default]" if pack.id == catalog.default_pack else ""
+        out.line(f"  {pack.id}: {pack.title}, {len(pack)} numbers{default}")
+        for contact in pack.contacts:
+            out.line(f"    {contact['name']} - {contact['phone']}")
+    return True
+
+
+COMMANDS = {
+    "add": command_add,
+    "import": command_import,
+    "list": command_list,
+    "search": command_search,
+    "alert": command_alert,
+    "nearby": command_nearby,
+    "tag": command_tag,
+    "tags": command_tags,
+    "presets": command_presets,
+}
+
+
+# ===========================================
+# FUNCTION: Run a batch file
+# ===========================================
+def run_batch(parser, store, path, out):
+    """
+    Runs every command in a file, one per line, on the same store:
+        add "Asha Rao" "98765 43210"
+        search asha
+    Empty lines and lines starting with # are skipped.
+    "add" lines that follow each other are saved together, in batches
+    (one transaction each), which is much faster for long files.
+    Returns how many lines failed.
+    """
+    context = {"store": store, "out": out, "index": None, "tags": None}
+    failures = 0
+    pending = []  # (line number, {"name", "phone"}, None) for import_rows()
+    
+    def save_pending():
+        nonlocal failures
+        if not pending:
+            return
+        report = import_rows(store, pending)
+        out.line(f"✓ {report.rows} contact(s): {report.added} added, "
+                 f"{report.duplicates} already saved, {report.error_count} rejected")
+        write_import_errors(report, out)
+        failures += report.error_count
+        pending.clear()
+    
+    # '-' means: read the commands from the keyboard or a pipe
+    try:
+        stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    except OSError as error:
+        out.line(f"ERROR: {error}")
+        return 1
+    try:
+        for number, text in enumerate(stream, start=1):
+            text = text.strip()
+            if text == "" or text.startswith("#"):
+                continue
+            try:
+                # shlex understands quotes like a shell; plain lines
+                # can simply be split on spaces, which is much quicker
+                words = shlex.split(text) if any(c in text for c in "\"'\\") else text.split()
+                # "add NAME PHONE" is by far the most common line in big
+                # files, so it skips the (slow) full argument parsing
+                if len(words) == 3 and words[0] == "add":
+                    pending.append((number, {"name": words[1], "phone": words[2]}, None))
+                    continue
+                args = parser.parse_args(words)
+            except (ValueError, SystemExit):
+                # argparse has already said what is wrong on stderr
+                out.line(f"  line {number}: cannot understand '{text}'")
+                failures += 1
+                continue
+            
+            if args.command == "add":
+                pending.append((number, {"name": args.name, "phone": args.phone, "tags": args.tags}, None))
+                continue
+            save_pending()
+            if args.command == "batch":
+                out.line(f"  line {number}: a batch file cannot run another batch file")
+                failures += 1
+            elif not COMMANDS[args.command](args, context):
+                failures += 1
+        save_pending()
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    return failures
+
+
+# ===========================================
+# FUNCTION: Run a command given on the command line
+# ===========================================
+def run_command(argv):
+    """
+    Runs one command without the menu, for example:
+        python emergency_contact_app.py add "Asha Rao" "98765 43210"
+        python emergency_contact_app.py import staff.csv
+        python emergency_contact_app.py list --format csv > backup.csv
+        python emergency_contact_app.py batch commands.txt
+        python emergency_contact_app.py alert --select "family OR neighbours"
+    Commands work on the same saved contacts as the menu
+    (or the store named with --store / CONTACT_STORE).
+    The output is collected and written at once, not line by line.
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        store = open_store(args.store)
+    except (OSError, ValueError) as error:
+        print(f"ERROR: {error}", file=sys.stderr)
+        return 1
+    
+    try:
+        if args.command == "list":
+            lines = min(len(store), args.limit if args.limit is not None else len(store))
+            if args.format == "text":
+                lines = 5 * lines + 2
+            context = {"store": store, "out": None, "index": None, "tags": None}
+            
+            def write(out):
+                context["out"] = out
+                return command_list(args, context)
+            
+            ok = paged_output(write, lines, args.pager)
+            return 0 if ok else 1
+        
+        out = OutputBuffer()
+        try:
+            if args.command == "batch":
+                return 0 if run_batch(parser, store, args.file, out) == 0 else 1
+            context = {"store": store, "out": out, "index": None, "tags": None}
+            return 0 if COMMANDS[args.command](args, context) else 1
+        finally:
+            out.flush()
+    finally:
+        if hasattr(store, "close"):
+            store.close()
+
+
 # ===========================================
 # PROGRAM ENTRY POINT
 # ===========================================
 # This special line checks if the program is being run directly
-# (not imported as a module), and calls the main() function
+# (not imported as a module). With a command after the file name
+# it runs that command; otherwise it starts the menu.
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_command(sys.argv[1:]))
     # Call the main function to start the program
     main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Emergency Contact Application - Live Event Feed
+===============================================
+Pushes changes to open browsers and dashboards as Server-Sent Events
+(the /events page), so they no longer have to reload to see them.
+
+Events (the data is JSON):
+
+- contact-added      {"id", "name", "phone", "tags"}
+- contact-updated    {"id", "name", "phone", "tags"} - its tags changed
+- contact-removed    {"id", "name", "phone", "tags"}
+- contacts-cleared   {}
+- alert-progress     {"job_id", "state", "total", "sent", "failed", "pending"}
+- resync             {} - the client missed events; reload everything
+
+How it stays cheap with thousands of idle clients:
+
+- Every event is formatted once, when it is published, and kept in ONE
+  shared ring buffer of the last BUFFER_SIZE events. A client is only a cursor
+  (the id of the last event it got), not a queue of its own.
+- Waiting clients sleep on one Condition; publish() wakes them all.
+- A client that falls more than BUFFER_SIZE events behind gets a
+  "resync" event instead of an ever-growing backlog.
+- Alert progress is sent at most every PROGRESS_INTERVAL seconds per
+  job (and always when the job finishes), however fast deliveries go.
+
+Browsers reconnect by themselves and send Last-Event-ID, so a short
+disconnect loses nothing. The feed covers changes made by this server
+process; run a single process (or gevent workers) for a shared feed.
+"""
+
+import collections
+import itertools
+import json
+import threading
+import time
+import uuid
+
+# Events kept for clients that are catching up
+BUFFER_SIZE = 1024
+
+# A comment line is sent this often so proxies keep idle connections open
+# and a closed browser tab is noticed
+HEARTBEAT_SECONDS = 15.0
+
+# Shortest gap between two alert-progress events for the same job
+PROGRESS_INTERVAL = 0.25
+
+# Milliseconds the browser waits before reconnecting
+RETRY_MS = 3000
+
+
+def format_event(event, data, event_id=None):
+    """One Server-Sent Events message; `data` is already JSON text"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {data}')
+    return '\n'.join(lines) + '\n\n'
+
+
+class EventFeed:
+    """A bounded, shared buffer of events that any number of clients can follow"""
+
+    def __init__(self, size=BUFFER_SIZE, heartbeat=HEARTBEAT_SECONDS):
+        # Event ids look like "<epoch>-<number>"; the epoch tells a client
+        # coming back after a restart that its old id means nothing here
+        self.epoch = uuid.uuid4().hex[:8]
+        self.heartbeat = heartbeat
+        self._events = collections.deque(maxlen=size)   # (number, SSE text)
+        self._last = 0
+        self._changed = threading.Condition()
+        self._progress_sent = {}   # job id -> time of its last alert-progress
+        self._progress_lock = threading.Lock()
+        self.clients = 0
+
+    # ---------------------------------------------------------------- publish
+
+    def publish(self, event, data):
+        """Add an event for every client and wake the waiting ones"""
+        payload = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+        with self._changed:
+            self._last += 1
+            number = self._last
+            self._events.append((number, format_event(event, payload, f'{self.epoch}-{number}')))
+            self._changed.notify_all()
+        return number
+
+    def watch_store(self, store):
+        """Publish contact-added / contact-updated / contact-removed / contacts-cleared for `store`"""
+        store.subscribe(self._on_store_change)
+
+    def watch_alerts(self, jobs):
+        """Publish alert-progress for an AlertJobManager or AlertQueue"""
+        jobs.subscribe(self._on_alert_progress)
+
+    def _on_store_change(self, event, contact):
+        if event == 'add':
+            self.publish('contact-added', contact.to_dict())
+        elif event == 'tags':
+            self.publish('contact-updated', contact.to_dict())
+        elif event == 'remove':
+            self.publish('contact-removed', contact.to_dict())
+        elif event == 'clear':
+            self.publish('contacts-cleared', {})
+
+    def _on_alert_progress(self, event, job):
+        now = time.monotonic()
+        with self._progress_lock:
+            if job.done:
+                self._progress_sent.pop(job.id, None)
+            elif now - self._progress_sent.get(job.id, 0.0) < PROGRESS_INTERVAL:
+                return
+            else:
+                self._progress_sent[job.id] = now
+        self.publish('alert-progress', {
+            'job_id': job.id,
+            'state': job.state,
+            'total': job.total,
+            'sent': job.sent,
+            'failed': job.failed,
+            'pending': job.pending,
+        })
+
+    # ------------------------------------------------------------------- read
+
+    @property
+    def last_id(self):
+        """Id of the newest event"""
+        return f'{self.epoch}-{self._last}'
+
+    def _parse_id(self, event_id):
+        """The event number in an id from this feed, or None"""
+        epoch, _, number = (event_id or '').strip().partition('-')
+        if epoch != self.epoch or not number.isdigit():
+            return None
+        return int(number)
+
+    def read(self, after, timeout):
+        """
+        Events numbered after `after` as (number, SSE text) pairs.
+
+        Waits up to `timeout` seconds when there are none yet (then
+        returns []). Returns None when some of the events the client
+        needs have already left the buffer.
+        """
+        with self._changed:
+            if self._last <= after:
+                self._changed.wait_for(lambda: self._last > after, timeout)
+            if after > self._last:
+                return None
+            if not self._events or self._last == after:
+                return []
+            oldest = self._events[0][0]
+            if after < oldest - 1:
+                return None
+            return list(itertools.islice(self._events, after - oldest + 1, None))
+
+    def stream(self, last_event_id=None):
+        """
+        Yield Server-Sent Events text for one client, forever.
+
+        With `last_event_id` (the browser's Last-Event-ID header) the
+        client first gets the events it missed, or a resync.
+        """
+        after = self._last if last_event_id is None else self._parse_id(last_event_id)
+        with self._changed:
+            self.clients += 1
+        try:
+            yield f'retry: {RETRY_MS}\n\n'
+            if after is None:
+                # An id from before a restart: the client must start over
+                after = self._last
+                yield format_event('resync', '{}', self.last_id)
+            while True:
+                events = self.read(after, self.heartbeat)
+                if events is None:
+                    after = self._last
+                    yield format_event('resync', '{}', self.last_id)
+                elif not events:
+                    yield ': keep-alive\n\n'
+                else:
+                    after = events[-1][0]
+                    yield ''.join(text for _, text in events)
+        finally:
+            # Runs when the client disconnects and the server closes the generator
+            with self._changed:
+                self.clients -= 1
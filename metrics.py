@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Emergency Contact Application - Metrics
+=======================================
+Counters, gauges and histograms that a monitoring system such as
+Prometheus can read from the /metrics page (Prometheus text format).
+
+- Counter:   a number that only goes up (requests served, messages sent)
+- Gauge:     a number read when the page is fetched (contacts saved)
+- Histogram: counts of measurements per bucket (request durations), so
+             the monitoring side can work out percentiles
+
+Recording a measurement is a dictionary lookup, a binary search over
+the buckets and a few additions under a lock; the text is only built
+when /metrics is fetched.
+
+instrument_store() and instrument_engine() add timings to an existing
+contact store or AlertEngine without changing their code.
+"""
+
+import bisect
+import functools
+import threading
+import time
+
+# Bucket upper bounds in seconds, from 0.5 ms to 10 s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Alert fan-out takes longer than a web request
+ALERT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Store operations that instrument_store() times
+STORE_OPERATIONS = ('add', 'add_many', 'get', 'find_by_phone', 'set_tags', 'remove', 'page', 'clear')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class: a name, help text and the label names every sample carries"""
+
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    """A value that only goes up, one per combination of label values"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = self.header()
+        for label_values, value in values:
+            lines.append(f'{self.name}{_labels(self.label_names, label_values)} {_number(value)}')
+        return lines
+
+
+class Gauge(Metric):
+    """A value read from a function each time the metrics are collected"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, read):
+        super().__init__(name, help_text)
+        self.read = read
+
+    def collect(self):
+        try:
+            value = self.read()
+        except Exception:
+            # A broken gauge must not take the whole /metrics page down
+            return []
+        return self.header() + [f'{self.name} {_number(value)}']
+
+
+class Histogram(Metric):
+    """Counts observations per bucket, plus their count and sum"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}   # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, *label_values):
+        """Context manager that observes how long its block took"""
+        return _Timer(self, label_values)
+
+    def collect(self):
+        with self._lock:
+            snapshot = sorted((labels, list(series)) for labels, series in self._series.items())
+        lines = self.header()
+        for label_values, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                labels = _labels(self.label_names, label_values, [('le', _number(float(bound)))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _labels(self.label_names, label_values)
+            lines.append(f'{self.name}_sum{labels} {_number(series[-1])}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.started, *self.label_values)
+        return False
+
+
+class Registry:
+    """All metrics of one program, rendered together for /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, read):
+        return self.register(Gauge(name, help_text, read))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        """Every metric in Prometheus text format"""
+        lines = []
+        for metric in list(self._metrics):
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+def instrument_store(store, registry, backend=None):
+    """
+    Time every call to the store's public operations (see STORE_OPERATIONS)
+    and publish a gauge with the number of contacts.
+
+    Calls made by one operation to another (add_many calling add) are
+    counted once, as the outer operation.
+    """
+    backend = backend or type(store).__name__
+    durations = registry.histogram('contact_store_operation_seconds',
+                                   'Time spent in contact store operations',
+                                   ('backend', 'operation'))
+    registry.gauge('contact_store_contacts', 'Contacts currently saved', lambda: len(store))
+    inside = threading.local()
+
+    def timed(operation, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if getattr(inside, 'busy', False):
+                return method(*args, **kwargs)
+            inside.busy = True
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                inside.busy = False
+                durations.observe(time.perf_counter() - started, backend, operation)
+        return wrapper
+
+    # Bound methods stored on the instance take precedence over the class's
+    for operation in STORE_OPERATIONS:
+        setattr(store, operation, timed(operation, getattr(store, operation)))
+    return store
+
+
+def instrument_engine(engine, registry):
+    """Record fan-out duration, time to first/last delivery, delivery outcomes and gateway round trips of an AlertEngine"""
+    fanout = registry.histogram('alert_fanout_seconds',
+                                'Time for one AlertEngine dispatch to try every contact',
+                                buckets=ALERT_BUCKETS)
+    first = registry.histogram('alert_time_to_first_delivery_seconds',
+                               'Time until the first contact of an alert was reached',
+                               buckets=ALERT_BUCKETS)
+    last = registry.histogram('alert_time_to_last_delivery_seconds',
+                              'Time until the last reachable contact of an alert was reached',
+                              buckets=ALERT_BUCKETS)
+    deliveries = registry.counter('alert_deliveries_total', 'Delivery attempts by outcome', ('status',))
+    requests = registry.counter('alert_gateway_requests_total', 'Gateway round trips made by alerts')
+    coalesced = registry.counter('alert_coalesced_total', 'Alert entries that shared a message with the same number')
+    dispatch = engine.dispatch
+
+    @functools.wraps(dispatch)
+    async def timed_dispatch(*args, **kwargs):
+        report = await dispatch(*args, **kwargs)
+        fanout.observe(report.total_seconds)
+        if report.time_to_first is not None:
+            first.observe(report.time_to_first)
+            last.observe(report.time_to_last)
+        statuses = {}
+        for result in report.results:
+            statuses[result.status] = statuses.get(result.status, 0) + 1
+        for status, count in statuses.items():
+            deliveries.inc(status, amount=count)
+        requests.inc(amount=report.requests or 0)
+        coalesced.inc(amount=report.coalesced)
+        return report
+
+    engine.dispatch = timed_dispatch
+    return engine
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Emergency Contact Application - Phone Numbers
+=============================================
+Turns the many ways people write a phone number into ONE canonical key,
+so "+91 98765 43210", "098765 43210" and "9876543210" are recognised as
+the same contact.
+
+Rules (numbers without a country code are taken to be Indian):
+
+- Indian mobile and landline numbers become E.164: "+919876543210"
+- Indian short codes stay as they are dialled: "+91 100", "0100" and
+  "100" all become "100" (the same for 112, 1091, 1098, ...)
+- Numbers from other countries keep their country code: "+447911123456"
+- "00" in front means an international number, like "+"
+- Digits of any script ("९८७६५४३२१०", fullwidth "９８７...") count as
+  the ASCII digits 0-9, so every key is plain ASCII
+
+normalize_phone() remembers recent answers in an LRU cache, and
+normalize_many() handles a whole batch (for example an import file),
+so the same number is never parsed twice.
+"""
+
+import functools
+import unicodedata
+
+COUNTRY_CODE = '91'
+
+# Length of an Indian number without the country code or leading 0
+NATIONAL_NUMBER_LENGTH = 10
+
+# Short codes (100, 112, 1091, 14567, ...) start with 1 and have 3-5 digits
+SHORT_CODE_LENGTHS = range(3, 6)
+
+# How many different numbers normalize_phone() remembers
+CACHE_SIZE = 65536
+
+# Bump when normalize_phone() changes, so stores that save phone keys
+# (sqlite_store.py, contact_snapshot.py) rebuild them
+KEY_VERSION = 2
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def normalize_phone(phone):
+    """Return the canonical key for a phone number ('' if it has no digits)"""
+    phone = str(phone).strip()
+    digits = _ascii_digits(phone)
+    if not digits:
+        return ''
+
+    international = phone.startswith('+')
+    if not international and digits.startswith('00'):
+        international = True
+        digits = digits[2:]
+
+    if international:
+        if not digits.startswith(COUNTRY_CODE):
+            return '+' + digits
+        national = digits[len(COUNTRY_CODE):]
+    elif digits.startswith('0'):
+        # Trunk prefix used for calls inside India: 0100, 098765 43210
+        national = digits[1:]
+    elif (len(digits) == len(COUNTRY_CODE) + NATIONAL_NUMBER_LENGTH
+          and digits.startswith(COUNTRY_CODE)):
+        # Country code written without the '+': 919876543210
+        national = digits[len(COUNTRY_CODE):]
+    else:
+        national = digits
+
+    if is_short_code(national):
+        return national
+    if len(national) == NATIONAL_NUMBER_LENGTH:
+        return '+' + COUNTRY_CODE + national
+    # Not a shape we know; keep the digits so it still dedupes with itself
+    return national
+
+
+def _ascii_digits(text):
+    """The decimal digits in `text`, from any script, as ASCII 0-9"""
+    if text.isascii():
+        return ''.join(ch for ch in text if '0' <= ch <= '9')
+    # unicodedata.decimal() knows every script's 0-9 but not look-alikes
+    # such as superscript "²", which str.isdigit() would also accept
+    return ''.join(str(value) for value in (unicodedata.decimal(ch, None) for ch in text)
+                   if value is not None)
+
+
+def is_short_code(number):
+    """True for emergency and helpline short codes such as 100, 112 or 1091"""
+    return number.startswith('1') and len(number) in SHORT_CODE_LENGTHS and number.isdigit()
+
+
+def normalize_many(phones):
+    """Normalize a batch of numbers, parsing each distinct value only once"""
+    keys = {}
+    result = []
+    for phone in phones:
+        key = keys.get(phone)
+        if key is None:
+            key = keys[phone] = normalize_phone(phone)
+        result.append(key)
+    return result
+
+
+def national_digits(key):
+    """Digits to type-ahead on: the part after +91 for Indian numbers"""
+    if key.startswith('+' + COUNTRY_CODE):
+        return key[len(COUNTRY_CODE) + 1:]
+    return key.lstrip('+')
+
+
+def cache_info():
+    """Hit and miss counts of the normalize_phone() cache"""
+    return normalize_phone.cache_info()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Emergency Contact Application - Preset Catalog
+==============================================
+The ready-made contact lists ("packs") offered by Quick Add, such as the
+Indian Government emergency numbers. They live in ONE file,
+data/presets.json (or the file named by PRESET_CATALOG), shared by the
+Flask app, the Streamlit app and the console program:
+
+    {
+      "version": 2,
+      "default_pack": "india-national",
+      "packs": [
+        {"id": "india-national", "title": "...",
+         "contacts": [{"name": "Police (All India)", "phone": "100"}, ...]}
+      ]
+    }
+
+Raise "version" with every edit of the file.
+
+The file is parsed once into a PresetCatalog that cannot be changed
+(tuples and read-only dictionaries), with every pack indexed by id and
+every contact by phone key, so nothing is scanned per request. Loading
+a pack is one store.add_many() call, a single transaction on SQLite.
+
+get_catalog() notices when the file is edited (its modification time
+or size changed) and reads it again, so running servers pick up a new
+catalog without a restart. A file that cannot be read keeps the last
+good catalog in use.
+"""
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import types
+
+from phone_numbers import normalize_phone
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'presets.json')
+
+# get_catalog() looks at the file's modification time at most this often
+CHECK_INTERVAL = 1.0
+
+log = logging.getLogger(__name__)
+
+
+class PresetCatalogError(ValueError):
+    """The preset file is missing or not a valid catalog"""
+
+
+class PresetPack(collections.namedtuple('PresetPack', 'id title contacts by_key')):
+    """
+    One list of preset contacts.
+
+    contacts: tuple of read-only {"name", "phone"} dictionaries, in file
+              order, ready for store.add_many()
+    by_key:   read-only dictionary, phone key -> contact
+    """
+
+    __slots__ = ()
+
+    def __len__(self):
+        return len(self.contacts)
+
+
+class PresetCatalog(collections.namedtuple('PresetCatalog', 'version revision modified_at packs default_pack')):
+    """
+    Every pack in the preset file.
+
+    version:     the "version" number written in the file
+    revision:    short hash of the file's content (changes with any edit)
+    modified_at: the file's modification time
+    packs:       read-only dictionary, pack id -> PresetPack, in file order
+    """
+
+    __slots__ = ()
+
+    @property
+    def default(self):
+        """The pack offered first (the Indian Government numbers)"""
+        return self.packs[self.default_pack]
+
+    def pack(self, pack_id=None):
+        """The pack with this id (the default pack for None); raises KeyError"""
+        return self.packs[pack_id or self.default_pack]
+
+
+def _read_only(mapping):
+    return types.MappingProxyType(dict(mapping))
+
+
+def parse_catalog(text, modified_at=0.0):
+    """Build a PresetCatalog from the JSON text of a preset file"""
+    try:
+        data = json.loads(text)
+    except ValueError as exc:
+        raise PresetCatalogError(f'Preset file is not valid JSON: {exc}') from exc
+    if not isinstance(data, dict) or not isinstance(data.get('packs'), list):
+        raise PresetCatalogError('Preset file needs a "packs" list')
+
+    packs = {}
+    for number, raw in enumerate(data['packs'], start=1):
+        if not isinstance(raw, dict) or not raw.get('id') or not isinstance(raw.get('contacts'), list):
+            raise PresetCatalogError(f'Pack {number} needs an "id" and a "contacts" list')
+        pack_id = str(raw['id'])
+        if pack_id in packs:
+            raise PresetCatalogError(f'Pack id {pack_id!r} is used twice')
+        contacts = []
+        by_key = {}
+        for contact in raw['contacts']:
+            name = str(contact.get('name') or '').strip() if isinstance(contact, dict) else ''
+            phone = str(contact.get('phone') or '').strip() if isinstance(contact, dict) else ''
+            key = normalize_phone(phone)
+            if not name or not key:
+                raise PresetCatalogError(f'Pack {pack_id!r}: every contact needs a name and a phone number')
+            if key in by_key:
+                raise PresetCatalogError(f'Pack {pack_id!r}: phone {phone} is listed twice')
+            contact = _read_only({'name': name, 'phone': phone})
+            contacts.append(contact)
+            by_key[key] = contact
+        packs[pack_id] = PresetPack(pack_id, str(raw.get('title') or pack_id), tuple(contacts), _read_only(by_key))
+
+    if not packs:
+        raise PresetCatalogError('Preset file has no packs')
+    default_pack = str(data.get('default_pack') or next(iter(packs)))
+    if default_pack not in packs:
+        raise PresetCatalogError(f'default_pack {default_pack!r} is not one of the packs')
+    return PresetCatalog(
+        version=data.get('version', 0),
+        revision=hashlib.sha1(text.encode('utf-8')).hexdigest()[:8],
+        modified_at=modified_at,
+        packs=_read_only(packs),
+        default_pack=default_pack,
+    )
+
+
+def read_catalog(path):
+    """Read and parse a preset file"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            modified_at = os.fstat(f.fileno()).st_mtime
+            text = f.read()
+    except OSError as exc:
+        raise PresetCatalogError(f'Cannot read the preset file: {exc}') from exc
+    return parse_catalog(text, modified_at)
+
+
+class CatalogLoader:
+    """Keeps the parsed catalog of one file and re-reads the file when it changes"""
+
+    def __init__(self, path, check_interval=CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._catalog = None
+        self._signature = None    # (mtime, size) of the file the catalog came from
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        """The current catalog; raises PresetCatalogError only if no good file was ever read"""
+        now = time.monotonic()
+        if self._catalog is not None and now - self._checked_at < self.check_interval:
+            return self._catalog
+        with self._lock:
+            if self._catalog is None or now - self._checked_at >= self.check_interval:
+                self._checked_at = now
+                self._reload_if_changed()
+        return self._catalog
+
+    def _reload_if_changed(self):
+        try:
+            stat = os.stat(self.path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError as exc:
+            signature = None
+            error = exc
+        if signature is not None and signature == self._signature:
+            return
+        try:
+            if signature is None:
+                raise PresetCatalogError(f'Cannot read the preset file: {error}')
+            catalog = read_catalog(self.path)
+        except PresetCatalogError as exc:
+            if self._catalog is None:
+                raise
+            # Keep serving the last good catalog while the file is being fixed
+            log.warning('Keeping preset catalog version %s: %s', self._catalog.version, exc)
+            self._signature = signature
+            return
+        if self._catalog is not None:
+            log.info('Preset catalog reloaded: version %s (%s)', catalog.version, catalog.revision)
+        self._catalog = catalog
+        self._signature = signature
+
+
+_loader = None
+_loader_lock = threading.Lock()
+
+
+def get_catalog():
+    """The shared catalog from PRESET_CATALOG or data/presets.json, re-read after edits"""
+    global _loader
+    if _loader is None:
+        with _loader_lock:
+            if _loader is None:
+                _loader = CatalogLoader(os.environ.get('PRESET_CATALOG') or DEFAULT_PATH)
+    return _loader.get()
+
+
+def load_pack(store, pack_id=None):
+    """
+    Add a pack's contacts to `store` in one bulk call.
+    Returns (pack, number added); numbers already saved are skipped.
+    """
+    pack = get_catalog().pack(pack_id)
+    return pack, store.add_many(pack.contacts)
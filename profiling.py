@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Emergency Contact Application - Request Profiler
+================================================
+Finds out where the time goes in a slow page, on the live server,
+without a redeploy. Nothing is profiled unless PROFILE_DIR is set.
+
+Environment variables:
+
+- PROFILE_DIR          folder for the results (turns the profiler on)
+- PROFILE_SAMPLE_RATE  share of requests profiled at random, e.g. 0.01
+                       for one in a hundred (default 0: none)
+- PROFILE_TOKEN        secret that profiles one request on demand, sent
+                       as the X-Profile-Token header or ?_profile=TOKEN
+
+Each profiled request is run under cProfile and saved as a pstats file
+in a folder per route, named after the time, process id and request
+number: PROFILE_DIR/GET_contacts/20260101-120000-4242-1.prof. The
+response says which file in its X-Profile header. Open the files with
+`python -m pstats`, snakeviz or flameprof (flame graphs), or print a
+summary of all requests to one route:
+
+    python profiling.py PROFILE_DIR GET_contacts
+
+Only one request is profiled at a time; others run normally meanwhile.
+Streamed Server-Sent Events (/events) are never profiled.
+"""
+
+import argparse
+import cProfile
+import hmac
+import itertools
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from urllib.parse import parse_qs
+
+from werkzeug.exceptions import HTTPException
+
+TOKEN_HEADER = 'HTTP_X_PROFILE_TOKEN'
+TOKEN_PARAM = '_profile'
+
+_SLUG_RE = re.compile(r'[^A-Za-z0-9]+')
+
+
+def route_slug(method, rule):
+    """Folder name for a route: ('GET', '/emergency/<job_id>') -> 'GET_emergency_job_id'"""
+    slug = _SLUG_RE.sub('_', rule).strip('_') or 'root'
+    return f'{method}_{slug}'
+
+
+class ProfilerMiddleware:
+    """WSGI middleware that runs chosen requests of a Flask app under cProfile"""
+
+    def __init__(self, flask_app, directory, sample_rate=0.0, token=None):
+        self.flask_app = flask_app
+        self.wsgi_app = flask_app.wsgi_app
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.token = token
+        self._busy = threading.Lock()
+        self._counter = itertools.count(1)
+        self._random = random.Random()
+
+    def _requested(self, environ):
+        """True when the request carries the profile token"""
+        if not self.token:
+            return False
+        sent = environ.get(TOKEN_HEADER)
+        if sent is None:
+            sent = parse_qs(environ.get('QUERY_STRING', '')).get(TOKEN_PARAM, [None])[0]
+        return sent is not None and hmac.compare_digest(sent.encode(), self.token.encode())
+
+    def _route(self, environ):
+        try:
+            rule, _ = self.flask_app.url_map.bind_to_environ(environ).match(return_rule=True)
+            return rule.rule
+        except HTTPException:
+            return 'unmatched'
+
+    def __call__(self, environ, start_response):
+        wanted = self._requested(environ) or (
+            self.sample_rate > 0 and self._random.random() < self.sample_rate)
+        # Only one profile at a time: cProfile is costly and, from Python 3.12
+        # on, only one can be active in the whole process
+        if not wanted or not self._busy.acquire(blocking=False):
+            return self.wsgi_app(environ, start_response)
+        try:
+            return self._profile(environ, start_response)
+        finally:
+            self._busy.release()
+
+    def _profile(self, environ, start_response):
+        method = environ.get('REQUEST_METHOD', 'GET')
+        folder = os.path.join(self.directory, route_slug(method, self._route(environ)))
+        name = f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{next(self._counter)}.prof'
+        path = os.path.join(folder, name)
+        streaming = []
+
+        def profiled_start_response(status, headers, exc_info=None):
+            content_type = next((value for key, value in headers if key.lower() == 'content-type'), '')
+            if content_type.startswith('text/event-stream'):
+                streaming.append(True)
+            else:
+                headers = list(headers) + [('X-Profile', os.path.join(os.path.basename(folder), name))]
+            return start_response(status, headers, exc_info)
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            app_iter = self.wsgi_app(environ, profiled_start_response)
+            if streaming:
+                # An endless event stream: hand it over unprofiled
+                profiler.disable()
+                return app_iter
+            # Produce the whole body now, so rendering is part of the profile
+            try:
+                body = list(app_iter)
+            finally:
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+        finally:
+            profiler.disable()
+        os.makedirs(folder, exist_ok=True)
+        profiler.dump_stats(path)
+        return body
+
+
+def install(flask_app, environ=os.environ):
+    """Wrap `flask_app` with the profiler if PROFILE_DIR is set; return True if it was"""
+    directory = environ.get('PROFILE_DIR')
+    if not directory:
+        return False
+    flask_app.wsgi_app = ProfilerMiddleware(
+        flask_app,
+        directory,
+        sample_rate=float(environ.get('PROFILE_SAMPLE_RATE', '0') or 0),
+        token=environ.get('PROFILE_TOKEN') or None,
+    )
+    return True
+
+
+def summarize(directory, route=None, top=25, sort='cumulative', out=sys.stdout):
+    """Merge the saved profiles of each route (or only `route`) and print the top functions"""
+    routes = sorted(os.listdir(directory)) if route is None else [route]
+    for name in routes:
+        folder = os.path.join(directory, name)
+        files = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.endswith('.prof'))
+        if not files:
+            continue
+        stats = pstats.Stats(*files, stream=out)
+        print(f'\n=== {name}: {len(files)} request(s) ===', file=out)
+        stats.sort_stats(sort).print_stats(top)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Summarize request profiles written by the profiler')
+    parser.add_argument('directory', help='the PROFILE_DIR folder')
+    parser.add_argument('route', nargs='?', help='one route folder, e.g. GET_contacts')
+    parser.add_argument('--top', type=int, default=25, help='functions to list (default 25)')
+    parser.add_argument('--sort', default='cumulative', help='pstats sort key (default cumulative)')
+    args = parser.parse_args(argv)
+    summarize(args.directory, args.route, args.top, args.sort)
+
+
+if __name__ == '__main__':
+    main()
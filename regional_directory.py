@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Emergency Contact Application - Regional Directory
+==================================================
+State, district and city helplines, hospitals and police stations, with
+a "nearest N services to this place" lookup for Quick Add and alerts.
+
+The directory is read from a CSV file (data/regional_directory.csv, or
+the file named by REGIONAL_DIRECTORY) with the columns
+
+    name, phone, category, state, district, city, lat, lon
+
+The file shipped here is a small sample. For each state capital and
+large city it has a control room, fire station, ambulance and district
+disaster room at the city centre, with the national short codes (100,
+101, 102, 1077) that work anywhere in India. It also has a district
+hospital and a police station a kilometre or two away, each with its
+own local number. Those local numbers are placeholders: their
+subscriber part starts with 0000, which no Indian line uses, so the
+sample never points at a real phone. A full directory of tens of
+thousands of real entries in the same format can replace it.
+
+How the lookup stays fast:
+
+- Each place is turned into a point on the unit sphere (x, y, z), so
+  the straight-line distance between two points grows with the real
+  distance along the Earth, with no special cases at the poles or the
+  date line.
+- The points go into a k-d tree, built once when the file is loaded;
+  one per category too, so "nearest hospitals" never scans police
+  stations. A query visits a few dozen points out of tens of thousands
+  and takes tens of microseconds.
+"""
+
+import collections
+import csv
+import heapq
+import math
+import os
+import threading
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'regional_directory.csv')
+
+EARTH_RADIUS_KM = 6371.0
+
+# Services returned by nearest() unless asked otherwise, and the most it returns
+DEFAULT_NEAREST = 5
+MAX_NEAREST = 50
+
+# A k-d tree range this small is scanned instead of split further
+LEAF_SIZE = 8
+
+COLUMNS = ('name', 'phone', 'category', 'state', 'district', 'city', 'lat', 'lon')
+
+Service = collections.namedtuple('Service', COLUMNS)
+
+
+class DirectoryError(ValueError):
+    """The directory file cannot be read"""
+
+
+def unit_vector(lat, lon):
+    """The point on the unit sphere for a latitude and longitude in degrees"""
+    lat = math.radians(lat)
+    lon = math.radians(lon)
+    cos_lat = math.cos(lat)
+    return cos_lat * math.cos(lon), cos_lat * math.sin(lon), math.sin(lat)
+
+
+def chord_to_km(squared_chord):
+    """Distance along the Earth for a squared straight-line distance between unit vectors"""
+    return 2 * EARTH_RADIUS_KM * math.asin(min(math.sqrt(squared_chord) / 2, 1.0))
+
+
+def parse_location(lat, lon):
+    """Read a latitude and longitude from text; raise ValueError if they make no sense"""
+    try:
+        lat = float(lat)
+        lon = float(lon)
+    except (TypeError, ValueError):
+        raise ValueError('Latitude and longitude must be numbers') from None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError('Latitude must be between -90 and 90, longitude between -180 and 180')
+    return lat, lon
+
+
+class KDTree:
+    """
+    A k-d tree over 3-D points, stored in flat lists.
+
+    The tree is implicit: the point in the middle of a range of positions
+    splits it, along x, y and z in turn, and ranges of LEAF_SIZE or
+    fewer points are leaves. After building, the coordinates are kept
+    in tree order, so a leaf is a run of neighbouring list items.
+    """
+
+    def __init__(self, points):
+        order = list(range(len(points)))
+        self._build(order, points, 0, len(points), 0)
+        self.index = order                      # position -> point number
+        self.xs = [points[i][0] for i in order]
+        self.ys = [points[i][1] for i in order]
+        self.zs = [points[i][2] for i in order]
+
+    def __len__(self):
+        return len(self.index)
+
+    def _build(self, order, points, lo, hi, depth):
+        if hi - lo <= LEAF_SIZE:
+            return
+        axis = depth % 3
+        order[lo:hi] = sorted(order[lo:hi], key=lambda i: points[i][axis])
+        middle = (lo + hi) // 2
+        self._build(order, points, lo, middle, depth + 1)
+        self._build(order, points, middle + 1, hi, depth + 1)
+
+    def nearest(self, point, count):
+        """[(squared distance, point number)] of the `count` points closest to `point`, closest first"""
+        if count <= 0 or not self.index:
+            return []
+        qx, qy, qz = point
+        xs, ys, zs = self.xs, self.ys, self.zs
+        axes = (xs, ys, zs)
+        best = []              # max-heap of (-squared distance, position)
+        bound = float('inf')   # squared distance of the worst point in `best` once it is full
+        # Ranges still to look at: (lo, hi, depth, squared distance to its splitting plane)
+        stack = [(0, len(xs), 0, 0.0)]
+        while stack:
+            lo, hi, depth, gap = stack.pop()
+            if gap >= bound:
+                continue   # the whole range is farther away than what we have
+            if hi - lo <= LEAF_SIZE:
+                scan = range(lo, hi)
+            else:
+                middle = (lo + hi) // 2
+                axis = depth % 3
+                diff = point[axis] - axes[axis][middle]
+                # Push the far side first, so the near side is looked at first
+                if diff < 0:
+                    stack.append((middle + 1, hi, depth + 1, diff * diff))
+                    stack.append((lo, middle, depth + 1, 0.0))
+                else:
+                    stack.append((lo, middle, depth + 1, diff * diff))
+                    stack.append((middle + 1, hi, depth + 1, 0.0))
+                scan = (middle,)
+            for position in scan:
+                dx = xs[position] - qx
+                dy = ys[position] - qy
+                dz = zs[position] - qz
+                d = dx * dx + dy * dy + dz * dz
+                if d < bound:
+                    if len(best) < count:
+                        heapq.heappush(best, (-d, position))
+                        if len(best) == count:
+                            bound = -best[0][0]
+                    else:
+                        heapq.heapreplace(best, (-d, position))
+                        bound = -best[0][0]
+        index = self.index
+        return sorted((-d, index[position]) for d, position in best)
+
+
+class RegionalDirectory:
+    """Services with a k-d tree for all of them and one per category"""
+
+    def __init__(self, services):
+        self.services = tuple(services)
+        points = [unit_vector(s.lat, s.lon) for s in self.services]
+        by_category = collections.defaultdict(list)
+        for index, service in enumerate(self.services):
+            by_category[service.category].append(index)
+        # Each tree keeps a list that maps its own point numbers back to services
+        self._trees = {None: (KDTree(points), range(len(self.services)))}
+        for category, indexes in by_category.items():
+            self._trees[category] = (KDTree([points[i] for i in indexes]), indexes)
+        self.categories = tuple(sorted(by_category))
+
+    @classmethod
+    def from_csv(cls, path):
+        """Read a directory file; rows with a bad position are skipped"""
+        services = []
+        try:
+            with open(path, encoding='utf-8', newline='') as f:
+                reader = csv.DictReader(f)
+                missing = set(COLUMNS) - set(reader.fieldnames or ())
+                if missing:
+                    raise DirectoryError(f'{path} is missing the column(s): {", ".join(sorted(missing))}')
+                for row in reader:
+                    try:
+                        lat, lon = parse_location(row['lat'], row['lon'])
+                    except ValueError:
+                        continue
+                    services.append(Service(row['name'].strip(), row['phone'].strip(),
+                                            row['category'].strip().lower(), row['state'].strip(),
+                                            row['district'].strip(), row['city'].strip(), lat, lon))
+        except OSError as exc:
+            raise DirectoryError(f'Cannot read the regional directory: {exc}') from exc
+        return cls(services)
+
+    def __len__(self):
+        return len(self.services)
+
+    def nearest(self, lat, lon, limit=DEFAULT_NEAREST, category=None):
+        """
+        The `limit` services closest to (lat, lon), closest first, as
+        (service, distance in km) pairs. `category` picks one kind only.
+        """
+        tree = self._trees.get(category)
+        if tree is None:
+            return []
+        tree, indexes = tree
+        found = tree.nearest(unit_vector(lat, lon), min(limit, MAX_NEAREST))
+        return [(self.services[indexes[i]], chord_to_km(d)) for d, i in found]
+
+
+def service_dict(service, distance_km=None):
+    """A service as a JSON-friendly dictionary"""
+    data = service._asdict()
+    if distance_km is not None:
+        data['distance_km'] = round(distance_km, 2)
+    return data
+
+
+_directory = None
+_directory_lock = threading.Lock()
+
+
+def load_directory(path=None):
+    """The shared directory, read on first use from `path`, REGIONAL_DIRECTORY or the sample file"""
+    global _directory
+    if path is not None:
+        return RegionalDirectory.from_csv(path)
+    if _directory is None:
+        with _directory_lock:
+            if _directory is None:
+                _directory = RegionalDirectory.from_csv(os.environ.get('REGIONAL_DIRECTORY') or DEFAULT_PATH)
+    return _directory
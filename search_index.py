@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Emergency Contact Application - Search Index
+============================================
+Type-ahead search over contact names and phone numbers.
+
+- Phone numbers: a sorted list of (digits, id). All numbers starting
+  with "9876" sit next to each other, so a prefix search is one binary
+  search plus a short walk.
+- Name words: a sorted list of (word, id) for "starts with" matches,
+  so "as" finds "Asha".
+- Fuzzy names: an index from every 3-letter piece of a name (trigram)
+  to the contacts containing it, so "ashaa" or "asah" still finds
+  "Asha". Only the rarest trigrams of the query are looked up, which
+  keeps common pieces like "an" from touching every contact.
+
+The index follows the store through StoreEvents, so every add, delete
+and change of tags made through the store updates it straight away.
+"""
+
+import bisect
+import re
+import threading
+
+from phone_numbers import national_digits, normalize_phone
+
+# Results returned when no limit is given
+DEFAULT_LIMIT = 10
+
+# Candidates scored for a fuzzy name match, taken from the rarest trigrams
+MAX_FUZZY_CANDIDATES = 200
+
+# Share of the query's trigrams a name must contain to count as a match
+MIN_FUZZY_SCORE = 0.4
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def _words(name):
+    return _WORD_RE.findall(name.lower())
+
+
+def _trigrams(text):
+    """Three-letter pieces of each word, padded so word starts count too"""
+    grams = set()
+    for word in _words(text):
+        if word.isdigit():
+            # Numbers are found through the phone and word-prefix indexes
+            continue
+        padded = f'  {word} '
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def _prefix_trigrams(word):
+    """Trigrams every word starting with `word` contains"""
+    padded = f'  {word}'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def phone_digits(phone):
+    """The digits used for prefix search (the national number for Indian phones)"""
+    return national_digits(normalize_phone(phone))
+
+
+class SearchIndex:
+    """In-memory prefix and fuzzy index over a contact store"""
+
+    def __init__(self, contacts=()):
+        self._lock = threading.Lock()
+        self._contacts = {}
+        self._phones = []     # sorted (digits, id)
+        self._words = []      # sorted (word, id)
+        self._grams = {}      # trigram -> set of ids
+        self._build(contacts)
+
+    @classmethod
+    def for_store(cls, store):
+        """Build an index of `store` and keep it up to date as the store changes"""
+        index = cls(store)
+        store.subscribe(index.on_change)
+        return index
+
+    def _build(self, contacts):
+        phones = []
+        words = []
+        grams = self._grams
+        for contact in contacts:
+            contact_id = contact['id']
+            self._contacts[contact_id] = contact
+            phones.append((phone_digits(contact['phone']), contact_id))
+            for word in _words(contact['name']):
+                words.append((word, contact_id))
+            for gram in _trigrams(contact['name']):
+                ids = grams.get(gram)
+                if ids is None:
+                    grams[gram] = ids = set()
+                ids.add(contact_id)
+        # One sort at the end is much faster than inserting in order
+        phones.sort()
+        words.sort()
+        self._phones = phones
+        self._words = words
+
+    def on_change(self, event, contact):
+        """StoreEvents callback"""
+        if event == 'add':
+            self.add(contact)
+        elif event == 'remove':
+            self.remove(contact)
+        elif event == 'tags':
+            # Same name and phone, but search results hand out the new Contact
+            self.remove(contact)
+            self.add(contact)
+        elif event == 'clear':
+            self.clear()
+
+    def add(self, contact):
+        """Index one new contact"""
+        contact_id = contact['id']
+        with self._lock:
+            self._contacts[contact_id] = contact
+            bisect.insort(self._phones, (phone_digits(contact['phone']), contact_id))
+            for word in _words(contact['name']):
+                bisect.insort(self._words, (word, contact_id))
+            for gram in _trigrams(contact['name']):
+                self._grams.setdefault(gram, set()).add(contact_id)
+
+    def remove(self, contact):
+        """Forget one contact"""
+        contact_id = contact['id']
+        with self._lock:
+            if self._contacts.pop(contact_id, None) is None:
+                return
+            _remove_sorted(self._phones, (phone_digits(contact['phone']), contact_id))
+            for word in _words(contact['name']):
+                _remove_sorted(self._words, (word, contact_id))
+            for gram in _trigrams(contact['name']):
+                ids = self._grams.get(gram)
+                if ids is not None:
+                    ids.discard(contact_id)
+                    if not ids:
+                        del self._grams[gram]
+
+    def clear(self):
+        """Forget every contact"""
+        with self._lock:
+            self._contacts.clear()
+            self._phones = []
+            self._words = []
+            self._grams.clear()
+
+    def __len__(self):
+        return len(self._contacts)
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """
+        Return up to `limit` contacts matching `query`, best first.
+
+        Phone prefix matches come first, then names with a word starting
+        with the query, then fuzzy name matches.
+        """
+        query = query.strip()
+        if not query or limit <= 0:
+            return []
+        with self._lock:
+            return self._search(query, limit)
+
+    def _search(self, query, limit):
+        found = []
+        seen = set()
+
+        def take(contact_ids):
+            for contact_id in contact_ids:
+                if contact_id not in seen:
+                    contact = self._contacts.get(contact_id)
+                    if contact is not None:
+                        seen.add(contact_id)
+                        found.append(contact)
+                        if len(found) >= limit:
+                            return True
+            return False
+
+        digits = phone_digits(query)
+        typed_digits = sum(ch.isdigit() for ch in query)
+        if digits and typed_digits * 2 >= len(query.replace(' ', '')):
+            if take(self.phone_prefix(digits, limit)):
+                return found
+        words = _words(query)
+        if words and take(self.name_prefix(words[-1], limit * 2, words[:-1])):
+            return found
+        take(self.fuzzy(query, limit))
+        return found
+
+    def phone_prefix(self, digits, limit):
+        """Ids of contacts whose number starts with `digits`"""
+        phones = self._phones
+        start = bisect.bisect_left(phones, (digits,))
+        ids = []
+        for number, contact_id in phones[start:start + limit]:
+            if not number.startswith(digits):
+                break
+            ids.append(contact_id)
+        return ids
+
+    def name_prefix(self, prefix, limit, other_words=()):
+        """Ids of contacts with a name word starting with `prefix` (and containing `other_words`)"""
+        words = self._words
+        start = bisect.bisect_left(words, (prefix,))
+        ids = []
+        # Look a little further when other words must match too
+        window = limit * 20 if other_words else limit
+        # Every trigram at the start of an other word must be in the name;
+        # checking those sets first skips most non-matching names cheaply
+        other_grams = [self._grams.get(gram, ()) for word in other_words
+                       for gram in _prefix_trigrams(word)]
+        if not all(other_grams):
+            return []
+        for word, contact_id in words[start:start + window]:
+            if not word.startswith(prefix):
+                break
+            if other_words:
+                if not all(contact_id in ids for ids in other_grams):
+                    continue
+                contact = self._contacts.get(contact_id)
+                if contact is None:
+                    continue
+                name_words = _words(contact['name'])
+                if not all(any(w.startswith(o) for w in name_words) for o in other_words):
+                    continue
+            ids.append(contact_id)
+            if len(ids) >= limit:
+                break
+        return ids
+
+    def fuzzy(self, query, limit):
+        """Ids of contacts whose name shares most trigrams with `query`, best first"""
+        query_grams = _trigrams(query)
+        if not query_grams:
+            return []
+        postings = sorted((ids for ids in map(self._grams.get, query_grams) if ids), key=len)
+        candidates = set()
+        for ids in postings:
+            if len(candidates) + len(ids) > MAX_FUZZY_CANDIDATES:
+                # Sample from a common trigram instead of taking all of it
+                for contact_id in ids:
+                    candidates.add(contact_id)
+                    if len(candidates) >= MAX_FUZZY_CANDIDATES:
+                        break
+                break
+            candidates.update(ids)
+
+        # Score = share of the query's trigrams found in the name, counted
+        # with set lookups instead of re-splitting every candidate's name
+        needed = MIN_FUZZY_SCORE * len(query_grams)
+        scored = []
+        for contact_id in candidates:
+            hits = 0
+            for ids in postings:
+                if contact_id in ids:
+                    hits += 1
+            if hits >= needed:
+                scored.append((-hits, contact_id))
+        scored.sort()
+        return [contact_id for _, contact_id in scored[:limit]]
+
+
+def _remove_sorted(items, item):
+    i = bisect.bisect_left(items, item)
+    if i < len(items) and items[i] == item:
+        del items[i]
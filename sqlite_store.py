@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Emergency Contact Application - SQLite Contact Store
+====================================================
+Keeps contacts in a SQLite database file so they survive a restart
+and every web worker process sees the same list.
+
+- The database runs in WAL (write-ahead log) mode, so readers never
+  wait for the writer and the writer never waits for readers.
+- Each thread gets its own connection, opened once and reused
+  (a small per-thread connection pool).
+- All SQL is kept in constants so sqlite3's statement cache can reuse
+  the prepared statements between calls.
+- Phone keys have a UNIQUE index (fast dedupe and lookup) and names
+  have an ordinary index.
+- Tags are kept in one text column, joined with commas
+  (see contact_tags.py); older databases get the column on open.
+- Every write transaction that changes contacts also bumps a version
+  row, so all worker processes agree on the store's version().
+"""
+
+import sqlite3
+import threading
+import time
+
+from contact_store import Contact, StoreEvents, StoreVersion, new_epoch
+from contact_tags import join_tags, normalize_tags, split_tags
+from phone_numbers import KEY_VERSION, normalize_phone
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS contacts (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    name      TEXT NOT NULL,
+    phone     TEXT NOT NULL,
+    phone_key TEXT NOT NULL,
+    tags      TEXT NOT NULL DEFAULT ''
+);
+CREATE UNIQUE INDEX IF NOT EXISTS contacts_phone_key ON contacts (phone_key);
+CREATE INDEX IF NOT EXISTS contacts_name ON contacts (name);
+CREATE TABLE IF NOT EXISTS store_version (
+    id          INTEGER PRIMARY KEY CHECK (id = 1),
+    epoch       TEXT NOT NULL,
+    number      INTEGER NOT NULL,
+    modified_at REAL NOT NULL
+);
+'''
+
+INSERT_SQL = 'INSERT OR IGNORE INTO contacts (name, phone, phone_key, tags) VALUES (?, ?, ?, ?)'
+SELECT_BY_ID_SQL = 'SELECT id, name, phone, tags FROM contacts WHERE id = ?'
+SELECT_BY_PHONE_SQL = 'SELECT id, name, phone, tags FROM contacts WHERE phone_key = ?'
+SELECT_ALL_SQL = 'SELECT id, name, phone, tags FROM contacts ORDER BY id'
+SELECT_PAGE_SQL = 'SELECT id, name, phone, tags FROM contacts WHERE id > ? ORDER BY id LIMIT ?'
+UPDATE_TAGS_SQL = 'UPDATE contacts SET tags = ? WHERE id = ?'
+DELETE_SQL = 'DELETE FROM contacts WHERE id = ?'
+COUNT_SQL = 'SELECT COUNT(*) FROM contacts'
+ANY_SQL = 'SELECT 1 FROM contacts LIMIT 1'
+INIT_VERSION_SQL = 'INSERT OR IGNORE INTO store_version (id, epoch, number, modified_at) VALUES (1, ?, 0, ?)'
+BUMP_VERSION_SQL = 'UPDATE store_version SET number = number + 1, modified_at = ? WHERE id = 1'
+SELECT_VERSION_SQL = 'SELECT epoch, number, modified_at FROM store_version WHERE id = 1'
+
+# How many rows to pull from SQLite at a time while iterating
+FETCH_SIZE = 500
+
+
+def _row_to_contact(row):
+    return Contact(row[0], row[1], row[2], split_tags(row[3]))
+
+
+class ConnectionPool:
+    """One reusable SQLite connection per thread, all in WAL mode"""
+
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+    def connect(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # isolation_level=None lets us manage transactions ourselves
+            conn = sqlite3.connect(self.path, timeout=self.timeout,
+                                   isolation_level=None, check_same_thread=False,
+                                   cached_statements=64)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA busy_timeout={int(self.timeout * 1000)}')
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def write(self):
+        """Context manager for a write transaction on this thread's connection"""
+        return _WriteTransaction(self.connect())
+
+    def close(self):
+        """Close every pooled connection"""
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+class SqliteContactStore(StoreEvents):
+    """Contact store backed by a SQLite database in WAL mode"""
+
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.pool = ConnectionPool(path, timeout)
+        self._connect = self.pool.connect
+        self._write = self.pool.write
+        conn = self._connect()
+        # Databases made before tags existed get the column first, since
+        # CREATE TABLE IF NOT EXISTS leaves an existing table as it is
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'contacts'").fetchone():
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(contacts)')]
+            if 'tags' not in columns:
+                conn.execute("ALTER TABLE contacts ADD COLUMN tags TEXT NOT NULL DEFAULT ''")
+        conn.executescript(SCHEMA)
+        with self._write() as conn:
+            conn.execute(INIT_VERSION_SQL, (new_epoch(), time.time()))
+        self._upgrade_keys()
+
+    def _upgrade_keys(self):
+        """Recompute phone keys saved under older phone rules, dropping new duplicates"""
+        with self._write() as conn:
+            if conn.execute('PRAGMA user_version').fetchone()[0] >= KEY_VERSION:
+                return
+            seen = set()
+            updates = []
+            duplicates = []
+            for contact_id, phone in conn.execute('SELECT id, phone FROM contacts ORDER BY id'):
+                key = normalize_phone(phone)
+                if not key or key in seen:
+                    duplicates.append((contact_id,))
+                else:
+                    seen.add(key)
+                    updates.append((key, contact_id))
+            # Keys may swap between rows, so lift the unique index while updating
+            conn.execute('DROP INDEX IF EXISTS contacts_phone_key')
+            conn.executemany(DELETE_SQL, duplicates)
+            conn.executemany('UPDATE contacts SET phone_key = ? WHERE id = ?', updates)
+            conn.execute('CREATE UNIQUE INDEX contacts_phone_key ON contacts (phone_key)')
+            conn.execute(f'PRAGMA user_version = {KEY_VERSION}')
+            if duplicates:
+                _bump_version(conn)
+
+    def version(self):
+        """Return the StoreVersion; its number changes whenever the contacts do"""
+        return StoreVersion(*self._connect().execute(SELECT_VERSION_SQL).fetchone())
+
+    def close(self):
+        """Close every pooled connection"""
+        self.pool.close()
+
+    def add(self, name, phone, tags=()):
+        """Add a contact and return it, or return None if the phone is already saved"""
+        key = normalize_phone(phone)
+        if not key:
+            return None
+        tags = normalize_tags(tags)
+        with self._write() as conn:
+            cursor = conn.execute(INSERT_SQL, (name, phone, key, join_tags(tags)))
+            if cursor.rowcount == 0:
+                return None
+            contact = Contact(cursor.lastrowid, name, phone, tags)
+            _bump_version(conn)
+        self._notify('add', contact)
+        return contact
+
+    def add_many(self, contacts):
+        """Add several {"name", "phone"} dictionaries (with optional "tags") in one transaction, return how many were new"""
+        rows = []
+        for contact in contacts:
+            key = normalize_phone(contact['phone'])
+            if key:
+                rows.append((contact['name'], contact['phone'], key, join_tags(normalize_tags(contact.get('tags')))))
+        if not rows:
+            return 0
+        if getattr(self, '_listeners', ()):
+            # Listeners need the new ids, so insert row by row (still one transaction)
+            added = []
+            with self._write() as conn:
+                for row in rows:
+                    cursor = conn.execute(INSERT_SQL, row)
+                    if cursor.rowcount:
+                        added.append(Contact(cursor.lastrowid, row[0], row[1], split_tags(row[3])))
+                if added:
+                    _bump_version(conn)
+            for contact in added:
+                self._notify('add', contact)
+            return len(added)
+        with self._write() as conn:
+            before = conn.total_changes
+            conn.executemany(INSERT_SQL, rows)
+            added = conn.total_changes - before
+            if added:
+                _bump_version(conn)
+            return added
+
+    def get(self, contact_id):
+        """Return the contact with this id, or None"""
+        row = self._connect().execute(SELECT_BY_ID_SQL, (contact_id,)).fetchone()
+        return _row_to_contact(row) if row else None
+
+    def find_by_phone(self, phone):
+        """Return the contact saved under this phone number, or None"""
+        row = self._connect().execute(SELECT_BY_PHONE_SQL, (normalize_phone(phone),)).fetchone()
+        return _row_to_contact(row) if row else None
+
+    def set_tags(self, contact_id, tags):
+        """Replace a contact's tags; return the updated contact, or None if there is no such contact"""
+        tags = normalize_tags(tags)
+        with self._write() as conn:
+            row = conn.execute(SELECT_BY_ID_SQL, (contact_id,)).fetchone()
+            if row is None:
+                return None
+            contact = Contact(row[0], row[1], row[2], tags)
+            if join_tags(tags) == row[3]:
+                return contact
+            conn.execute(UPDATE_TAGS_SQL, (join_tags(tags), contact_id))
+            _bump_version(conn)
+        self._notify('tags', contact)
+        return contact
+
+    def remove(self, contact_id):
+        """Delete a contact by id, return the removed contact or None"""
+        with self._write() as conn:
+            row = conn.execute(SELECT_BY_ID_SQL, (contact_id,)).fetchone()
+            if row is None:
+                return None
+            conn.execute(DELETE_SQL, (contact_id,))
+            _bump_version(conn)
+        contact = _row_to_contact(row)
+        self._notify('remove', contact)
+        return contact
+
+    def page(self, after=0, limit=100):
+        """Return up to `limit` contacts whose id is greater than `after`, in id order"""
+        rows = self._connect().execute(SELECT_PAGE_SQL, (after, limit)).fetchall()
+        return [_row_to_contact(row) for row in rows]
+
+    def clear(self):
+        """Delete every contact"""
+        with self._write() as conn:
+            conn.execute('DELETE FROM contacts')
+            _bump_version(conn)
+        self._notify('clear')
+
+    def __contains__(self, phone):
+        return self.find_by_phone(phone) is not None
+
+    def __len__(self):
+        return self._connect().execute(COUNT_SQL).fetchone()[0]
+
+    def __bool__(self):
+        return self._connect().execute(ANY_SQL).fetchone() is not None
+
+    def __iter__(self):
+        cursor = self._connect().cursor()
+        cursor.execute(SELECT_ALL_SQL)
+        try:
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    yield _row_to_contact(row)
+        finally:
+            cursor.close()
+
+
+def _bump_version(conn):
+    # One bump per transaction, however many rows it changed
+    conn.execute(BUMP_VERSION_SQL, (time.time(),))
+
+
+class _WriteTransaction:
+    """BEGIN IMMEDIATE ... COMMIT, rolled back if an error escapes"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        # IMMEDIATE takes the write lock up front, so two writers queue
+        # on busy_timeout instead of failing halfway through
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute('COMMIT')
+        else:
+            self.conn.execute('ROLLBACK')
+        return False
@@ -11,6 +11,13 @@ To run:
 
 import streamlit as st
 
+from alerts import AlertEngine, StubGateway
+from contact_store import ContactStore
+from contact_tags import SelectorError, TagIndex
+from phone_numbers import normalize_phone
+from preset_catalog import get_catalog, load_pack
+from regional_directory import DEFAULT_NEAREST, DirectoryError, load_directory, parse_location
+
 # Page configuration
 st.set_page_config(
     page_title="🚨 Emergency Contact App",
@@ -19,22 +26,11 @@ st.set_page_config(
 )
 
 # Data storage - using session state to persist data
-if 'contacts_list' not in st.session_state:
-    st.session_state.contacts_list = []
+if 'contact_store' not in st.session_state:
+    st.session_state.contact_store = ContactStore()
 
-# Indian Government Emergency Contacts
-indian_emergency_contacts = [
-    {"name": "Police (All India)", "phone": "100"},
-    {"name": "Fire Service", "phone": "101"},
-    {"name": "Ambulance", "phone": "102"},
-    {"name": "Women Helpline", "phone": "1091"},
-    {"name": "Child Helpline", "phone": "1098"},
-    {"name": "Disaster Management", "phone": "1070"},
-    {"name": "National Emergency", "phone": "112"},
-    {"name": "Railway Police", "phone": "1512"},
-    {"name": "Road Safety", "phone": "1033"},
-    {"name": "Anti Terrorist Helpline", "phone": "1930"},
-]
+# Alert delivery - swap StubGateway for a real Notifier (SMS, voice, ...)
+alert_engine = AlertEngine(StubGateway())
 
 # Custom CSS
 st.markdown("""
@@ -88,45 +84,82 @@ if menu == "🏠 Home":
             name = st.text_input("Contact Name", placeholder="Enter name")
         with col2:
             phone = st.text_input("Phone Number", placeholder="Enter phone number")
+        tags = st.text_input("Tags (optional)", placeholder="e.g. family, neighbours")
         
         submit = st.form_submit_button("➕ Add Contact")
         
         if submit:
-            if name and phone:
-                st.session_state.contacts_list.append({"name": name, "phone": phone})
+            if not name or not phone:
+                st.error("⚠ ERROR: Name and phone cannot be empty!")
+            elif not normalize_phone(phone):
+                st.error(f"⚠ ERROR: {phone} is not a phone number!")
+            elif st.session_state.contact_store.add(name, phone, tags) is not None:
                 st.success(f"✓ SUCCESS: Contact '{name}' added with phone {phone}!")
             else:
-                st.error("⚠ ERROR: Name and phone cannot be empty!")
+                st.warning(f"⚠ Phone {phone} is already saved!")
     
     st.markdown("---")
     st.markdown("## 🇮🇳 Quick Add Indian Emergency Contacts")
     
-    if st.button("🇮🇳 Load Indian Emergency Contacts"):
-        count = 0
-        for contact in indian_emergency_contacts:
-            if contact not in st.session_state.contacts_list:
-                st.session_state.contacts_list.append(contact)
-                count += 1
-        st.success(f"✓ Added {count} Indian emergency contacts!")
+    # The preset lists come from data/presets.json, re-read when it changes
+    for pack in get_catalog().packs.values():
+        if st.button(f"🇮🇳 Load {pack.title}", key=f"preset-{pack.id}"):
+            _, count = load_pack(st.session_state.contact_store, pack.id)
+            st.success(f"✓ Added {count} contacts from {pack.title}!")
+        
+        # Show the numbers in this list
+        with st.expander(f"📱 {pack.title} ({len(pack)})"):
+            for contact in pack.contacts:
+                st.markdown(f"**{contact['name']}**: {contact['phone']}")
+    
+    st.markdown("---")
+    st.markdown("## 📍 Quick Add Nearby Helplines")
     
-    # Show available Indian contacts
-    with st.expander("📱 Available Indian Emergency Numbers"):
-        for contact in indian_emergency_contacts:
-            st.markdown(f"**{contact['name']}**: {contact['phone']}")
+    try:
+        directory = load_directory()
+    except DirectoryError as error:
+        # Same as the web app: the rest of the page works without the directory
+        directory = None
+        st.warning(f"⚠ Nearby helplines are not available: {error}")
+    if directory is not None:
+        col1, col2 = st.columns(2)
+        with col1:
+            lat = st.text_input("Latitude", placeholder="e.g. 28.6139")
+            category = st.selectbox("Service", ["Any"] + list(directory.categories))
+        with col2:
+            lon = st.text_input("Longitude", placeholder="e.g. 77.2090")
+            limit = st.slider("How many", 1, 10, DEFAULT_NEAREST)
+    
+        if lat and lon:
+            try:
+                location = parse_location(lat, lon)
+            except ValueError as error:
+                st.error(f"⚠ {error}")
+            else:
+                # Remembered for the Emergency Alert page
+                st.session_state.location = location
+                nearby = directory.nearest(*location, limit, None if category == "Any" else category)
+                for service, km in nearby:
+                    st.markdown(f"**{service.name}**: {service.phone} ({km:.1f} km)")
+                if nearby and st.button("➕ Add Nearest Services"):
+                    count = st.session_state.contact_store.add_many(
+                        {"name": service.name, "phone": service.phone} for service, _ in nearby)
+                    st.success(f"✓ Added {count} nearby services!")
 
 elif menu == "📋 View Contacts":
     st.markdown("## 📋 Saved Contacts")
     
-    if st.session_state.contacts_list:
-        st.info(f"Total contacts: **{len(st.session_state.contacts_list)}**")
+    if st.session_state.contact_store:
+        st.info(f"Total contacts: **{len(st.session_state.contact_store)}**")
         
         # Create a table
-        for i, contact in enumerate(st.session_state.contacts_list, 1):
+        for i, contact in enumerate(st.session_state.contact_store, 1):
             st.markdown(f"""
             <div class="card">
                 <h4>Contact #{i}</h4>
                 <p><strong>Name:</strong> {contact['name']}</p>
                 <p><strong>Phone:</strong> {contact['phone']}</p>
+                <p><strong>Tags:</strong> {', '.join(contact['tags']) or '-'}</p>
             </div>
             """, unsafe_allow_html=True)
     else:
@@ -136,25 +169,65 @@ elif menu == "📋 View Contacts":
 elif menu == "🚨 Emergency Alert":
     st.markdown("## 🚨 EMERGENCY ALERT 🚨")
     
-    if st.session_state.contacts_list:
-        st.markdown(f"""
-        <div class="emergency-alert">
-            <h2>🚨 EMERGENCY ALERT 🚨</h2>
-            <p>Notifying **{len(st.session_state.contacts_list)}** contact(s)...</p>
-        </div>
-        """, unsafe_allow_html=True)
+    if st.session_state.contact_store:
+        # Everyone, or only the contacts a tag selector picks
+        selector = st.text_input("Who to alert (leave empty for everyone)",
+                                 placeholder="e.g. family OR neighbours AND NOT work")
+        recipients = st.session_state.contact_store
+        if selector.strip():
+            try:
+                recipients = TagIndex(recipients).select(selector)
+            except SelectorError as exc:
+                st.error(f"⚠ {exc}")
+                recipients = []
+            else:
+                if not recipients:
+                    st.warning(f"⚠ No contacts match \"{selector}\"!")
+        if recipients:
+            # Nothing is sent until the button is pressed: Streamlit runs this
+            # script again on every change, so sending here would page people
+            # while the selector is still being typed
+            st.markdown(f"""
+            <div class="emergency-alert">
+                <h2>🚨 EMERGENCY ALERT 🚨</h2>
+                <p>This will notify <strong>{len(recipients)}</strong> contact(s).</p>
+            </div>
+            """, unsafe_allow_html=True)
+            if st.button("🚨 Send alert"):
+                st.markdown("### 📱 Contacts being notified:")
+                report = alert_engine.send_alert(recipients)
+                for result in report.results:
+                    contact = result.contact
+                    if result.ok:
+                        st.write(f"📱 {contact['name']} - {contact['phone']}")
+                    else:
+                        st.write(f"⚠️ {contact['name']} - {contact['phone']} ({result.error})")
         
-        st.markdown("### 📱 Contacts being notified:")
-        for contact in st.session_state.contacts_list:
-            st.write(f"📱 {contact['name']} - {contact['phone']}")
+                st.markdown("---")
+                if report.failed:
+                    summary = f"{report.sent} notified, {report.failed} could not be reached!"
+                else:
+                    summary = "All contacts have been notified!"
+                st.markdown(f"""
+                <div style="background: #28a745; color: white; padding: 20px; border-radius: 10px; text-align: center;">
+                    <h2>✅ Emergency message sent</h2>
+                    <p>{summary}</p>
+                </div>
+                """, unsafe_allow_html=True)
+                if report.time_to_last is not None:
+                    st.caption(f"First contact reached in {report.time_to_first:.3f}s, "
+                               f"last in {report.time_to_last:.3f}s")
         
-        st.markdown("---")
-        st.markdown("""
-        <div style="background: #28a745; color: white; padding: 20px; border-radius: 10px; text-align: center;">
-            <h2>✅ Emergency message sent</h2>
-            <p>All contacts have been notified!</p>
-        </div>
-        """, unsafe_allow_html=True)
+                # With a location from the Home page, list the services to call directly
+                if st.session_state.get("location"):
+                    try:
+                        nearest = load_directory().nearest(*st.session_state.location)
+                    except DirectoryError:
+                        nearest = []
+                    if nearest:
+                        st.markdown("### 📍 Nearest emergency services - call them directly:")
+                    for service, km in nearest:
+                        st.write(f"📞 {service.name} - {service.phone} ({km:.1f} km)")
     else:
         st.error("⚠️ No contacts to notify!")
         st.warning("Please add emergency contacts first.")
@@ -162,13 +235,13 @@ elif menu == "🚨 Emergency Alert":
 elif menu == "🗑️ Clear All":
     st.markdown("## 🗑️ Clear All Contacts")
     
-    if st.session_state.contacts_list:
+    if st.session_state.contact_store:
         if st.button("Confirm Clear All"):
-            st.session_state.contacts_list = []
+            st.session_state.contact_store.clear()
             st.success("✓ All contacts cleared!")
     else:
         st.info("No contacts to clear.")
 
 # Footer
 st.markdown("---")
-st.markdown(f"📊 **Total contacts saved:** {len(st.session_state.contacts_list)}")
+st.markdown(f"📊 **Total contacts saved:** {len(st.session_state.contact_store)}")
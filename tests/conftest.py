@@ -0,0 +1,18 @@
+"""Shared fixtures: the Flask app runs on in-memory stores"""
+
+import os
+
+import pytest
+
+# app.py opens its stores when it is imported
+os.environ.setdefault('CONTACT_STORE', 'memory')
+os.environ.setdefault('ALERT_QUEUE', 'memory')
+
+
+@pytest.fixture
+def client():
+    import app
+
+    app.contact_store.clear()
+    app.app.config['TESTING'] = True
+    return app.app.test_client()
@@ -0,0 +1,74 @@
+"""Tests for alert_queue.AlertQueue"""
+
+import time
+
+import pytest
+
+from alert_queue import AlertQueue
+from alerts import AlertEngine, StubGateway
+from phone_numbers import normalize_phone
+
+
+def wait_until_done(queue, job_id, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    job = queue.get(job_id)
+    while not job.done and time.monotonic() < deadline:
+        time.sleep(0.02)
+        job = queue.get(job_id)
+    return job
+
+
+@pytest.fixture
+def gateway():
+    return StubGateway(latency=(0, 0.001), seed=1)
+
+
+def test_repeated_numbers_are_sent_once_and_every_entry_gets_a_result(tmp_path, gateway):
+    queue = AlertQueue(str(tmp_path / 'queue.db'), AlertEngine(gateway), batch_size=3)
+    entries = [{'name': f'Contact {i}', 'phone': f'98765{i:05d}'} for i in range(8)]
+    entries += [{'name': 'Contact 0 (work)', 'phone': '+91 98765 00000'},
+                {'name': 'Nobody', 'phone': 'abc'}, {'name': 'Nobody either', 'phone': 'abc'}]
+    job = wait_until_done(queue, queue.submit(entries).id)
+    queue.stop()
+
+    assert (job.total, job.sent, job.failed) == (11, 11, 0)
+    deliveries = job.deliveries()
+    assert [result.contact['name'] for result in deliveries] == [entry['name'] for entry in entries]
+    assert [result.shared for result in deliveries].count(True) == 1
+    assert len(gateway.sent) == 10
+    assert [normalize_phone(phone) for phone, _ in gateway.sent].count('+919876500000') == 1
+
+
+def test_shared_rows_follow_a_dead_letter(tmp_path):
+    engine = AlertEngine(StubGateway(latency=(0, 0.001), failure_rate=1.0, seed=1))
+    queue = AlertQueue(str(tmp_path / 'queue.db'), engine, max_attempts=1)
+    job = queue.submit([{'name': 'Asha', 'phone': '9876543210'}, {'name': 'Asha (work)', 'phone': '+919876543210'}])
+    job = wait_until_done(queue, job.id)
+    queue.stop()
+    assert (job.sent, job.failed) == (0, 2)
+    assert [entry['name'] for entry in queue.dead_letters()] == ['Asha (work)', 'Asha']
+
+
+def test_rows_of_a_crashed_worker_are_recovered(tmp_path, gateway):
+    # No workers yet: the rows are claimed by hand, as by a worker that then dies
+    queue = AlertQueue(str(tmp_path / 'queue.db'), AlertEngine(gateway), workers=0, lease_seconds=0.05)
+    job = queue.submit([{'name': f'Contact {i}', 'phone': f'98765{i:05d}'} for i in range(5)])
+    assert len(queue._claim()) == 5
+    time.sleep(0.1)
+
+    queue.workers = 2
+    queue.start()
+    job = wait_until_done(queue, job.id)
+    queue.stop()
+    assert (job.sent, queue.recovered) == (5, 5)
+    assert len(gateway.sent) == 5
+
+
+def test_an_idempotency_key_returns_the_first_job(tmp_path, gateway):
+    queue = AlertQueue(str(tmp_path / 'queue.db'), AlertEngine(gateway))
+    first = queue.submit([{'name': 'Asha', 'phone': '9876543210'}], idempotency_key='drill-1')
+    again = queue.submit([{'name': 'Asha', 'phone': '9876543210'}], idempotency_key='drill-1')
+    assert again.id == first.id
+    wait_until_done(queue, first.id)
+    queue.stop()
+    assert len(gateway.sent) == 1
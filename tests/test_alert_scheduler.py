@@ -0,0 +1,50 @@
+"""Tests for alert_scheduler"""
+
+from alert_scheduler import CRITICAL, HIGH, NORMAL, AlertScheduler, tier_of
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_tiers():
+    assert tier_of({'phone': '112'}) == CRITICAL
+    assert tier_of({'phone': '1091'}) == HIGH
+    assert tier_of({'phone': '9876543210', 'tags': ('priority',)}) == HIGH
+    assert tier_of({'phone': '9876543210'}) == NORMAL
+    assert tier_of({'phone': '112', 'tier': NORMAL}) == NORMAL
+
+
+def test_higher_tiers_go_first_then_deadline_order():
+    clock = Clock()
+    contacts = [{'name': f'Contact {i}', 'phone': f'98765{i:05d}'} for i in range(3)]
+    contacts += [{'name': 'Women helpline', 'phone': '1091'}, {'name': 'Police', 'phone': '100'},
+                 {'name': 'Early', 'phone': '9876599999', 'deadline': 1.0}]
+    scheduler = AlertScheduler.for_contacts(contacts, clock=clock)
+    assert scheduler.waiting() == [1, 1, 4]
+    order = [scheduler.pop()[0]['name'] for _ in range(len(contacts))]
+    assert order == ['Police', 'Women helpline', 'Early', 'Contact 0', 'Contact 1', 'Contact 2']
+    assert scheduler.pop() is None
+
+
+def test_an_overdue_contact_is_not_kept_waiting():
+    clock = Clock()
+    scheduler = AlertScheduler(clock=clock)
+    scheduler.push({'name': 'Late'}, NORMAL, deadline=0.5)
+    for i in range(3):
+        scheduler.push({'name': f'Helpline {i}'}, HIGH)
+    assert scheduler.pop()[0]['name'] == 'Helpline 0'
+    clock.now = 1.0
+    assert scheduler.pop()[0]['name'] == 'Late'
+
+
+def test_a_batch_stays_in_one_tier():
+    scheduler = AlertScheduler.for_contacts(
+        [{'phone': '112'}, {'phone': '100'}, {'phone': '9876543210'}, {'phone': '9876500000'}])
+    assert [tier for _, tier, _ in scheduler.pop_batch(10)] == [CRITICAL, CRITICAL]
+    assert [tier for _, tier, _ in scheduler.pop_batch(10)] == [NORMAL, NORMAL]
+    assert scheduler.pop_batch(10) == []
@@ -0,0 +1,65 @@
+"""Tests for alerts.AlertEngine"""
+
+import asyncio
+import threading
+
+from alerts import AlertEngine, Notifier, StubGateway
+from phone_numbers import normalize_phone
+
+
+class CountingGateway(Notifier):
+    """Answers every batch after a short wait and records the most requests in flight"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+
+    async def send_bulk(self, contacts, message, channel='sms'):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.005)
+        with self.lock:
+            self.in_flight -= 1
+        return [None] * len(contacts)
+
+
+def contacts(count, start=0):
+    return [{'name': f'Contact {i}', 'phone': f'98765{i:05d}', 'channel': ('sms', 'voice', 'push')[i % 3]}
+            for i in range(start, start + count)]
+
+
+def test_concurrency_caps_requests_across_channels_and_threads():
+    gateway = CountingGateway()
+    engine = AlertEngine(gateway, concurrency=3, batch_size=10)
+    reports = []
+    threads = [threading.Thread(target=lambda n=n: reports.append(engine.send_alert(contacts(300, n * 1000))))
+               for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert gateway.peak <= 3
+    assert sorted(len(report.results) for report in reports) == [300] * 4
+
+
+def test_repeated_numbers_are_messaged_once_and_every_entry_gets_a_result():
+    gateway = StubGateway(seed=1)
+    entries = [{'name': 'Asha', 'phone': '9876543210'}, {'name': 'Asha (work)', 'phone': '+91 98765 43210'},
+               {'name': 'Ravi', 'phone': '9876500000'}, {'name': 'Nobody', 'phone': 'abc'},
+               {'name': 'Nobody either', 'phone': 'abc'}]
+    report = AlertEngine(gateway, batch_size=1).send_alert(entries)
+    assert len(report.results) == 5
+    assert all(result.ok for result in report.results)
+    assert report.coalesced == 1
+    assert report.messages == 4
+    assert [normalize_phone(phone) for phone, _ in gateway.sent].count('+919876543210') == 1
+
+
+def test_critical_numbers_go_first():
+    gateway = StubGateway(seed=1)
+    entries = [{'name': f'Contact {i}', 'phone': f'98765{i:05d}'} for i in range(50)] + \
+              [{'name': 'Police', 'phone': '100'}, {'name': 'Emergency', 'phone': '112'}]
+    AlertEngine(gateway, concurrency=1, batch_size=1).send_alert(entries)
+    assert sorted(phone for phone, _ in gateway.sent[:2]) == ['100', '112']
@@ -0,0 +1,81 @@
+"""Tests for the Flask app (app.py)"""
+
+import app
+from sqlite_store import SqliteContactStore
+
+
+def test_add_tells_invalid_from_duplicate(client):
+    page = client.post('/add', data={'name': 'Asha', 'phone': '9876543210'}, follow_redirects=True)
+    assert 'added with phone 9876543210' in page.get_data(as_text=True)
+
+    page = client.post('/add', data={'name': 'Asha', 'phone': '98765 43210'}, follow_redirects=True)
+    assert 'is already saved' in page.get_data(as_text=True)
+
+    page = client.post('/add', data={'name': 'Nobody', 'phone': 'abc'}, follow_redirects=True)
+    text = page.get_data(as_text=True)
+    assert 'abc is not a phone number' in text
+    assert 'already saved' not in text
+
+
+def test_indexes_notice_a_write_from_another_process(client, tmp_path, monkeypatch):
+    path = str(tmp_path / 'contacts.db')
+    store, other = SqliteContactStore(path), SqliteContactStore(path)
+    monkeypatch.setattr(app, 'contact_store', store)
+    monkeypatch.setattr(app, 'search_index', None)
+    monkeypatch.setattr(app, 'tag_index', None)
+
+    # Another worker writes between this worker's write and the moment
+    # its indexes look at the version they reached
+    writes = []
+
+    def other_worker_writes(event, contact):
+        if not writes:
+            writes.append(other.add('Zoya', '9876500000', 'family'))
+
+    store.subscribe(other_worker_writes)
+    app.get_search_index()
+    app.get_tag_index()
+    store.add('Asha', '9876543210', 'family')
+
+    assert [contact.name for contact in app.get_search_index().search('zoya')] == ['Zoya']
+    assert sorted(contact.name for contact in app.get_tag_index().select('family')) == ['Asha', 'Zoya']
+    store.close()
+    other.close()
+
+
+def test_add_nearby_adds_local_services_after_the_presets(client):
+    client.post('/add_indian')
+    page = client.post('/add_nearby', data={'lat': '28.6139', 'lon': '77.2090', 'limit': '6'},
+                       follow_redirects=True)
+    assert 'Added 0 of' not in page.get_data(as_text=True)
+    assert app.contact_store.find_by_phone('020 0000 0001') is not None
+
+
+def test_pages_answer_304_until_the_contacts_change(client):
+    page = client.get('/contacts')
+    etag = page.headers['ETag']
+    assert page.status_code == 200 and etag
+
+    assert client.get('/contacts', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/contacts', headers={'If-Modified-Since': page.headers['Last-Modified']}).status_code == 304
+
+    app.contact_store.add('Asha', '9876543210')
+    page = client.get('/contacts', headers={'If-None-Match': etag})
+    assert page.status_code == 200
+    assert page.headers['ETag'] != etag
+    assert 'Asha' in page.get_data(as_text=True)
+
+
+def test_alert_selectors_are_checked(client):
+    app.contact_store.add('Asha', '9876543210', 'family')
+
+    answer = client.post('/api/alerts', json={'select': 'family AND'})
+    assert answer.status_code == 400
+    assert 'at the end' in answer.json['error']
+
+    answer = client.post('/api/alerts', json={'select': 'famly'})
+    assert answer.status_code == 400
+    assert answer.json['unknown_tags'] == ['famly']
+
+    answer = client.post('/api/alerts', json={'select': 'family'})
+    assert answer.status_code == 202
@@ -0,0 +1,18 @@
+"""Small runs of the stress test and the /events harness, which check their own results"""
+
+import os
+
+from benchmarks import sse_subscribers, stress_store
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_stress_store_finds_no_lost_or_duplicate_contacts():
+    assert stress_store.main(['--threads', '4', '--readers', '1', '--shared', '100', '--own', '100']) == 0
+
+
+def test_every_events_subscriber_gets_every_event_in_order(monkeypatch):
+    # The harness starts the app with "python -m benchmarks.sse_subscribers"
+    monkeypatch.chdir(PROJECT)
+    assert sse_subscribers.main(['--subscribers', '10', '--events', '5', '--interval', '0',
+                                 '--timeout', '20']) == 0
@@ -0,0 +1,51 @@
+"""Tests for bitmap.Bitmap, checked against Python sets"""
+
+import random
+
+import pytest
+
+from bitmap import ARRAY_MAX, Bitmap
+
+
+def random_ids(rng, count, spread):
+    return set(rng.sample(range(spread), count))
+
+
+# Few ids per chunk (array containers), many (bitmap containers), and a mix
+@pytest.mark.parametrize('count, spread', [(500, 10 ** 6), (20000, 70000), (6000, 200000)])
+def test_set_operations_match_python_sets(count, spread):
+    rng = random.Random(count)
+    a_ids, b_ids = random_ids(rng, count, spread), random_ids(rng, count, spread)
+    a, b = Bitmap(sorted(a_ids)), Bitmap(sorted(b_ids))
+
+    assert list(a) == sorted(a_ids)
+    assert len(a) == len(a_ids)
+    assert set(a & b) == a_ids & b_ids
+    assert set(a | b) == a_ids | b_ids
+    assert set(a - b) == a_ids - b_ids
+    assert set(b - a) == b_ids - a_ids
+
+
+def test_add_and_discard_switch_containers():
+    bitmap = Bitmap()
+    ids = list(range(0, 3 * (ARRAY_MAX + 10), 3))   # one chunk, past ARRAY_MAX
+    for value in ids:
+        bitmap.add(value)
+    assert len(bitmap) == len(ids) and ids[-1] in bitmap and 1 not in bitmap
+    for value in ids[:-5]:
+        bitmap.discard(value)
+    bitmap.discard(1)   # not there: nothing happens
+    assert list(bitmap) == ids[-5:]
+    for value in ids[-5:]:
+        bitmap.discard(value)
+    assert not bitmap and list(bitmap) == []
+
+
+def test_copy_is_independent():
+    original = Bitmap([1, 2, 70000])
+    copy = original.copy()
+    copy.add(3)
+    copy.discard(70000)
+    assert list(original) == [1, 2, 70000]
+    assert list(copy) == [1, 2, 3]
+    assert original == Bitmap([70000, 2, 1])
@@ -0,0 +1,11 @@
+"""Tests for contact_import"""
+
+import pytest
+
+from contact_import import clean_row
+
+
+def test_clean_row_rejects_a_phone_without_digits():
+    assert clean_row({'name': ' Asha ', 'phone': '98765 43210'})['name'] == 'Asha'
+    with pytest.raises(ValueError, match='not a phone number'):
+        clean_row({'name': 'Nobody', 'phone': 'abc'})
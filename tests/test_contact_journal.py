@@ -0,0 +1,46 @@
+"""Tests for contact_journal.JournaledContactStore"""
+
+import os
+
+import pytest
+
+from contact_journal import JournaledContactStore
+
+
+def _failing_fsync(fd):
+    raise OSError(5, 'Input/output error')
+
+
+def test_add_many_keeps_nothing_that_missed_the_disk(tmp_path, monkeypatch):
+    store = JournaledContactStore(tmp_path, commit_window=0)
+    store.add('Asha', '9876543210')
+    with monkeypatch.context() as patch:
+        patch.setattr(os, 'fsync', _failing_fsync)
+        with pytest.raises(OSError):
+            store.add_many([{'name': 'Ravi', 'phone': '9876500000'},
+                            {'name': 'Meena', 'phone': '9876511111'}])
+    assert [contact['name'] for contact in store] == ['Asha']
+    assert store.add_many([{'name': 'Ravi', 'phone': '9876500000'}]) == 1
+    store.close()
+
+    reopened = JournaledContactStore(tmp_path)
+    assert sorted(contact['name'] for contact in reopened) == ['Asha', 'Ravi']
+    reopened.close()
+
+
+def test_failed_fsync_is_not_replayed(tmp_path, monkeypatch):
+    store = JournaledContactStore(tmp_path, commit_window=0)
+    store.add('Asha', '9876543210')
+    with monkeypatch.context() as patch:
+        patch.setattr(os, 'fsync', _failing_fsync)
+        with pytest.raises(OSError):
+            store.add('Ghost', '9876500000')
+    assert store.find_by_phone('9876500000') is None
+
+    # The next write goes after Asha, not after the failed line
+    store.add('Ravi', '9876511111')
+    store.close()
+
+    reopened = JournaledContactStore(tmp_path)
+    assert sorted(contact['name'] for contact in reopened) == ['Asha', 'Ravi']
+    reopened.close()
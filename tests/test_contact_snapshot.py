@@ -0,0 +1,51 @@
+"""Tests for contact_snapshot.SnapshotContactStore"""
+
+import contact_snapshot
+from contact_snapshot import SnapshotContactStore, SnapshotFile, encode_record, write_snapshot
+from phone_numbers import KEY_VERSION
+
+
+def test_changes_survive_save_and_compaction(tmp_path):
+    path = str(tmp_path / 'contacts.snap')
+    store = SnapshotContactStore(path, compact_after=3)
+    asha = store.add('Asha', '9876543210', 'family')
+    store.add('Ravi', '98765 00000')
+    store.add('Zoë', '+91 98765 11111')
+    assert store.add('Asha again', '09876543210') is None
+    store.close()
+
+    store = SnapshotContactStore(path, compact_after=3)
+    store.set_tags(asha.id, 'family, priority')
+    store.remove(store.find_by_phone('9876500000').id)
+    store.save()          # goes to the log
+    store.close()
+
+    store = SnapshotContactStore(path, compact_after=3)
+    assert [(contact.name, contact.tags) for contact in store] == [
+        ('Asha', ('family', 'priority')), ('Zoë', ())]
+    assert store.find_by_phone('9876511111').name == 'Zoë'
+    store.compact()
+    assert [contact.id for contact in store.page(after=asha.id)] == [3]
+    store.close()
+
+
+def test_keys_from_older_phone_rules_are_rebuilt(tmp_path, monkeypatch):
+    path = str(tmp_path / 'old.snap')
+    # Written when "9876543210" was its own key, so "+91 98765 43210" was not a duplicate
+    records = [(1, encode_record(1, 'Asha', '9876543210')),
+               (2, encode_record(2, 'Asha (work)', '+91 98765 43210')),
+               (3, encode_record(3, 'Ravi', '9876500000'))]
+    keys = sorted([('9876543210', 0), ('+919876543210', 1), ('9876500000', 2)])
+    monkeypatch.setattr(contact_snapshot, 'KEY_VERSION', KEY_VERSION - 1)
+    write_snapshot(path, records, keys, 4)
+    monkeypatch.undo()
+
+    store = SnapshotContactStore(path)
+    assert [contact.name for contact in store] == ['Asha', 'Ravi']
+    assert store.find_by_phone('098765 43210').name == 'Asha'
+    assert store.find_by_phone('+91 98765 00000').name == 'Ravi'
+    assert store.add('Asha (home)', '919876543210') is None
+    store.close()
+    snapshot = SnapshotFile(path)
+    assert snapshot.key_version == KEY_VERSION
+    snapshot.close()
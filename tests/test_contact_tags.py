@@ -0,0 +1,72 @@
+"""Tests for contact_tags: tag names, the selector language and TagIndex"""
+
+import pytest
+
+from contact_store import ContactStore
+from contact_tags import SelectorError, TagIndex, normalize_tags, parse_selector
+
+
+def test_tags_are_normalized():
+    assert normalize_tags('Family; Night Shift, family, and') == ('family', 'night-shift')
+    assert normalize_tags(['On Call!', '']) == ('on-call',)
+
+
+def test_not_binds_tightest_then_and_then_or():
+    assert parse_selector('family OR neighbours AND NOT work') == (
+        'or', ('tag', 'family'), ('and', ('tag', 'neighbours'), ('not', ('tag', 'work'))))
+    assert parse_selector('(family, neighbours) & !work') == (
+        'and', ('or', ('tag', 'family'), ('tag', 'neighbours')), ('not', ('tag', 'work')))
+    assert parse_selector('all & -work') == parse_selector('all AND NOT work')
+
+
+@pytest.mark.parametrize('selector, message', [
+    ('', 'empty'),
+    ('family AND', 'at the end'),
+    ('(family OR work', r"'\)'"),
+    ('family work', 'position 8'),
+    ('| family', 'position 1'),
+])
+def test_bad_selectors_say_what_is_wrong(selector, message):
+    with pytest.raises(SelectorError, match=message):
+        parse_selector(selector)
+
+
+def make_index():
+    store = ContactStore()
+    for name, phone, tags in (('Asha', '9876543210', 'family'),
+                              ('Ravi', '9876500000', 'family, work'),
+                              ('Meena', '9876511111', 'neighbours'),
+                              ('Joseph', '9876522222', 'work, on-call')):
+        store.add(name, phone, tags)
+    return store, TagIndex.for_store(store)
+
+
+def test_selectors_pick_the_right_contacts():
+    _, index = make_index()
+
+    def names(selector):
+        return [contact.name for contact in index.select(selector)]
+
+    assert names('family') == ['Asha', 'Ravi']
+    assert names('family OR neighbours AND NOT work') == ['Asha', 'Ravi', 'Meena']
+    assert names('(family, neighbours) & !work') == ['Asha', 'Meena']
+    assert names('NOT family') == ['Meena', 'Joseph']
+    assert names('all AND NOT (work OR family)') == ['Meena']
+    assert names('doctors') == []
+    assert index.count('work') == 2
+    assert index.unknown('family OR doctors') == ['doctors']
+    assert index.tags() == {'family': 2, 'neighbours': 1, 'on-call': 1, 'work': 2}
+
+
+def test_index_follows_the_store():
+    store, index = make_index()
+    ravi = store.find_by_phone('9876500000')
+    store.set_tags(ravi.id, 'neighbours')
+    store.remove(store.find_by_phone('9876543210').id)
+    store.add('Tara', '9876533333', 'family')
+
+    assert [contact.name for contact in index.select('family')] == ['Tara']
+    assert [contact.name for contact in index.select('neighbours')] == ['Ravi', 'Meena']
+    assert 'family' in index.tags() and len(index) == 4
+    store.clear()
+    assert len(index) == 0 and index.tags() == {}
@@ -0,0 +1,60 @@
+"""Tests for event_feed.EventFeed"""
+
+from contact_store import ContactStore
+from event_feed import EventFeed
+
+
+def events_in(text):
+    return [line.split(': ', 1)[1] for line in text.split('\n') if line.startswith('event: ')]
+
+
+def test_store_changes_become_events():
+    feed = EventFeed()
+    store = ContactStore()
+    feed.watch_store(store)
+    asha = store.add('Asha', '9876543210')
+    store.set_tags(asha.id, 'family')
+    store.remove(asha.id)
+    store.clear()
+    events = feed.read(0, timeout=0)
+    assert [events_in(text)[0] for _, text in events] == [
+        'contact-added', 'contact-updated', 'contact-removed', 'contacts-cleared']
+    assert feed.last_id == f'{feed.epoch}-4'
+
+
+def test_a_client_coming_back_gets_what_it_missed():
+    feed = EventFeed(heartbeat=0)
+    feed.publish('contact-added', {'id': 1})
+    seen = feed.last_id
+    feed.publish('contact-added', {'id': 2})
+    feed.publish('contact-removed', {'id': 1})
+
+    stream = feed.stream(seen)
+    assert next(stream).startswith('retry: ')
+    missed = next(stream)
+    assert events_in(missed) == ['contact-added', 'contact-removed']
+    assert f'id: {feed.epoch}-3' in missed
+    assert next(stream) == ': keep-alive\n\n'
+    stream.close()
+    assert feed.clients == 0
+
+
+def test_resync_when_the_missed_events_are_gone():
+    feed = EventFeed(size=2, heartbeat=0)
+    feed.publish('contact-added', {'id': 1})
+    seen = feed.last_id
+    for contact_id in range(2, 6):
+        feed.publish('contact-added', {'id': contact_id})
+    assert feed.read(1, timeout=0) is None
+
+    stream = feed.stream(seen)
+    next(stream)
+    assert events_in(next(stream)) == ['resync']
+    stream.close()
+
+
+def test_resync_after_a_restart():
+    stream = EventFeed(heartbeat=0).stream('0123abcd-42')
+    next(stream)
+    assert events_in(next(stream)) == ['resync']
+    stream.close()
@@ -0,0 +1,19 @@
+"""Tests for phone_numbers.normalize_phone()"""
+
+from phone_numbers import normalize_phone
+
+
+def test_non_ascii_digits_give_the_ascii_key():
+    assert normalize_phone('९८७६५४३२१०') == '+919876543210'
+    assert normalize_phone('+९१ ९८७६५ ४३२१०') == '+919876543210'
+    assert normalize_phone('９８７６５４３２１０') == '+919876543210'
+    assert normalize_phone('१००') == '100'
+
+
+def test_keys_are_ascii():
+    for phone in ('९८७६५४३२१०', '٠٩٨٧٦٥٤٣٢١٠', '+44 ７９１１ １２３４５６'):
+        assert normalize_phone(phone).isascii()
+
+
+def test_digit_look_alikes_are_not_digits():
+    assert normalize_phone('²³') == ''
@@ -0,0 +1,26 @@
+"""Tests for regional_directory"""
+
+from contact_store import ContactStore
+from preset_catalog import load_pack
+from regional_directory import load_directory
+
+NEW_DELHI = (28.6139, 77.2090)
+
+
+def test_nearest_local_services_can_be_added_after_the_presets():
+    store = ContactStore()
+    load_pack(store)
+    found = load_directory().nearest(*NEW_DELHI, 6)
+    assert [service.city for service, _ in found] == ['New Delhi'] * 6
+    assert {service.category for service, _ in found} >= {'hospital', 'police'}
+
+    added = store.add_many({'name': service.name, 'phone': service.phone} for service, _ in found)
+    assert added >= 2
+    assert store.find_by_phone('020 0000 0001')['name'] == 'District Hospital, New Delhi'
+
+
+def test_nearest_by_category():
+    found = load_directory().nearest(*NEW_DELHI, 3, 'hospital')
+    assert [service.category for service, _ in found] == ['hospital'] * 3
+    assert found[0][0].name == 'District Hospital, New Delhi'
+    assert found[0][1] < found[1][1] < found[2][1]
@@ -0,0 +1,16 @@
+"""Tests for search_index.SearchIndex"""
+
+from contact_store import ContactStore
+from search_index import SearchIndex
+
+
+def test_search_follows_tag_changes():
+    store = ContactStore()
+    asha = store.add('Asha', '9876543210')
+    index = SearchIndex.for_store(store)
+    store.set_tags(asha.id, 'family')
+
+    found = index.search('asha')
+    assert [contact.tags for contact in found] == [('family',)]
+    assert index.search('98765') == found
+    assert len(index) == 1
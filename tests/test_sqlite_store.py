@@ -0,0 +1,55 @@
+"""Tests for sqlite_store.SqliteContactStore"""
+
+import sqlite3
+
+from sqlite_store import SqliteContactStore
+
+
+def test_contacts_are_shared_through_the_file(tmp_path):
+    path = str(tmp_path / 'contacts.db')
+    store, other = SqliteContactStore(path), SqliteContactStore(path)
+    asha = store.add('Asha', '9876543210', 'family')
+    assert other.add('Asha again', '+91 98765 43210') is None
+    assert other.add_many([{'name': 'Ravi', 'phone': '9876500000'},
+                           {'name': 'Ravi again', 'phone': '09876500000'}]) == 1
+
+    assert [contact.name for contact in store] == ['Asha', 'Ravi']
+    assert store.find_by_phone('98765 00000').name == 'Ravi'
+    assert other.set_tags(asha.id, 'family, on-call').tags == ('family', 'on-call')
+    assert store.get(asha.id).tags == ('family', 'on-call')
+    assert [contact.name for contact in store.page(after=asha.id, limit=10)] == ['Ravi']
+    store.close()
+    other.close()
+
+
+def test_version_changes_with_every_write_from_any_store(tmp_path):
+    path = str(tmp_path / 'contacts.db')
+    store, other = SqliteContactStore(path), SqliteContactStore(path)
+    before = store.version()
+    other.add('Asha', '9876543210')
+    after_add = store.version()
+    assert after_add.epoch == before.epoch and after_add.number == before.number + 1
+    assert other.add('Asha', '9876543210') is None
+    assert store.version() == after_add        # nothing changed
+    store.remove(store.find_by_phone('9876543210').id)
+    assert other.version().number == after_add.number + 1
+    assert len(other) == 0 and not other
+    store.close()
+    other.close()
+
+
+def test_keys_from_older_phone_rules_are_rebuilt(tmp_path):
+    path = str(tmp_path / 'old.db')
+    SqliteContactStore(path).close()
+    # As saved before "9876543210" and "+91 98765 43210" were the same key
+    conn = sqlite3.connect(path)
+    conn.executemany('INSERT INTO contacts (name, phone, phone_key) VALUES (?, ?, ?)',
+                     [('Asha', '9876543210', '9876543210'), ('Asha (work)', '+91 98765 43210', '+919876543210')])
+    conn.execute('PRAGMA user_version = 1')
+    conn.commit()
+    conn.close()
+
+    store = SqliteContactStore(path)
+    assert [contact.name for contact in store] == ['Asha']
+    assert store.find_by_phone('+919876543210').name == 'Asha'
+    store.close()